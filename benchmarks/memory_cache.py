@@ -0,0 +1,144 @@
+"""
+In-memory stand-ins for Redis, implementing the commands the service
+uses, so benchmarks can run without a Redis server.
+"""
+import time
+from typing import Any, Optional
+
+from src.tools.cache import RELEASE_LOCK_SCRIPT
+
+
+class MemoryStore:
+    def __init__(self):
+        self._values: dict[str, tuple[Optional[float], Any]] = {}
+
+    def get(self, key: str) -> Any:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    def set(
+            self,
+            key: str,
+            value: Any,
+            ttl: Optional[float] = None,
+            nx: bool = False,
+            xx: bool = False
+    ) -> bool:
+        exists = self.get(key) is not None
+        if (nx and exists) or (xx and not exists):
+            return False
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._values[key] = (expires_at, value)
+        return True
+
+    def delete(self, *keys: str) -> int:
+        return sum(self._values.pop(key, None) is not None for key in keys)
+
+
+class MemoryCacheBackend:
+    """
+    Stand-in for ``fastapi_cache.backends.redis.RedisCacheBackend``.
+    """
+
+    def __init__(self, store: MemoryStore):
+        self._store = store
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        value = self._store.get(key)
+        return default if value is None else value
+
+    async def set(
+            self,
+            key: str,
+            value: Any,
+            expire: int = 0,
+            exist: Optional[str] = None
+    ) -> bool:
+        return self._store.set(
+            key,
+            value,
+            ttl=expire,
+            nx=exist == 'SET_IF_NOT_EXIST',
+            xx=exist == 'SET_IF_EXIST'
+        )
+
+    async def delete(self, key: str) -> int:
+        return self._store.delete(key)
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryPipeline:
+    def __init__(self, client: 'MemoryRedis'):
+        self._client = client
+        self._commands = []
+
+    async def __aenter__(self) -> 'MemoryPipeline':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._commands.clear()
+
+    def set(self, *args, **kwargs) -> 'MemoryPipeline':
+        self._commands.append((args, kwargs))
+        return self
+
+    async def execute(self) -> list:
+        results = [
+            await self._client.set(*args, **kwargs)
+            for args, kwargs in self._commands
+        ]
+        self._commands.clear()
+        return results
+
+
+class MemoryRedis:
+    """
+    Stand-in for the ``redis.asyncio`` client used by ``src.tools.cache``.
+    Published invalidations have no subscribers.
+    """
+
+    def __init__(self, store: MemoryStore):
+        self._store = store
+
+    async def get(self, key: str) -> Any:
+        return self._store.get(key)
+
+    async def set(
+            self,
+            key: str,
+            value: Any,
+            ex: Optional[float] = None,
+            px: Optional[int] = None,
+            nx: bool = False,
+            xx: bool = False
+    ) -> Optional[bool]:
+        ttl = ex if px is None else px / 1000
+        return self._store.set(key, value, ttl=ttl, nx=nx, xx=xx) or None
+
+    async def delete(self, *keys: str) -> int:
+        return self._store.delete(*keys)
+
+    async def publish(self, channel: str, message: str) -> int:
+        return 0
+
+    def pipeline(self, transaction: bool = True) -> MemoryPipeline:
+        return MemoryPipeline(self)
+
+    async def eval(self, script: str, numkeys: int, *args) -> int:
+        if script != RELEASE_LOCK_SCRIPT:
+            raise NotImplementedError('Only the cache lock release script is supported.')
+        key, token = args
+        if self._store.get(key) == token:
+            return self._store.delete(key)
+        return 0
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,365 @@
+"""
+End-to-end HTTP benchmarks of the service. The app runs in-process
+behind ``httpx.AsyncClient``, on SQLite or Postgres, with Redis or an
+in-memory stand-in, and every workload reports its throughput and
+latency percentiles as JSON:
+
+    python -m benchmarks.run --concurrency 16 --requests 500 \\
+        --output results.json --compare baseline.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+WORK_DIR = tempfile.mkdtemp(prefix='files-benchmark-')
+
+# The storage folders are read from the environment by the app and by
+# the spawned compression workers, so they are set before any import.
+for env_name, folder in (
+        ('FILES_BASE_DIR', 'files'),
+        ('BLOBS_BASE_DIR', 'blobs'),
+        ('MULTIPART_BASE_DIR', 'multipart'),
+        ('ARCHIVE_CACHE_DIR', 'archives'),
+):
+    os.environ.setdefault(env_name, os.path.join(WORK_DIR, folder))
+
+from fastapi_cache.backends.redis import RedisCacheBackend  # noqa: E402
+from httpx import AsyncClient, Response  # noqa: E402
+from sqlalchemy.ext.asyncio import (  # noqa: E402
+    AsyncSession,
+    create_async_engine
+)
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from src.core.config import app_settings  # noqa: E402
+from src.db.db import Base, get_session  # noqa: E402
+from src.main import app  # noqa: E402
+from src.tools import cache as cache_tools  # noqa: E402
+from src.tools.workers import shutdown_workers  # noqa: E402
+
+from .memory_cache import (  # noqa: E402
+    MemoryCacheBackend,
+    MemoryRedis,
+    MemoryStore
+)
+
+BASE_URL = 'http://benchmark/api/v1'
+SEED_DIR = '/bench/seed'
+SEED_FILES = 100
+PERCENTILES = (50, 95, 99)
+
+
+class Workload(NamedTuple):
+    request: Callable[[AsyncClient, int], Awaitable[Response]]
+    status: int
+
+
+async def upload(client: AsyncClient, path: str, size: int) -> Response:
+    return await client.post(
+        '/files/upload',
+        params={'path': path},
+        files={'file': ('payload.bin', os.urandom(size))}
+    )
+
+
+async def download(client: AsyncClient, params: dict) -> Response:
+    async with client.stream('GET', '/files/download', params=params) as response:
+        async for _ in response.aiter_raw():
+            pass
+    return response
+
+
+def get_workloads(args: argparse.Namespace) -> dict[str, Workload]:
+    run_id = uuid.uuid4().hex[:8]
+    far_future = datetime(9999, 1, 1)
+    workloads = {
+        'upload_small': Workload(
+            lambda client, index: upload(
+                client, f'/bench/{run_id}/small/{index}', args.small_size
+            ),
+            201
+        ),
+        'upload_large': Workload(
+            lambda client, index: upload(
+                client, f'/bench/{run_id}/large/{index}', args.large_size
+            ),
+            201
+        ),
+        'list_cached': Workload(
+            lambda client, index: client.get(
+                '/files/list',
+                params={'path_prefix': SEED_DIR}
+            ),
+            200
+        ),
+        # Every request has its own query and so its own cache entry.
+        'list_uncached': Workload(
+            lambda client, index: client.get(
+                '/files/list',
+                params={
+                    'path_prefix': SEED_DIR,
+                    'created_before': (
+                        far_future + timedelta(microseconds=index)
+                    ).isoformat()
+                }
+            ),
+            200
+        ),
+        'download_redirect': Workload(
+            lambda client, index: client.get(
+                '/files/download',
+                params={'path': f'{SEED_DIR}/{index % SEED_FILES}.bin'}
+            ),
+            307
+        ),
+    }
+    for compression_type in ('zip', 'tar', '7z'):
+        workloads[f'archive_{compression_type}'] = Workload(
+            lambda client, index, compression_type=compression_type: download(
+                client,
+                {'path': SEED_DIR, 'compression_type': compression_type}
+            ),
+            200
+        )
+    return workloads
+
+
+def get_percentile(latencies: list[float], percentile: float) -> float:
+    """
+    Nearest-rank percentile of sorted ``latencies``.
+    """
+    rank = math.ceil(percentile / 100 * len(latencies))
+    return latencies[max(rank, 1) - 1]
+
+
+async def run_workload(
+        client: AsyncClient,
+        workload: Workload,
+        requests: int,
+        concurrency: int,
+        start_index: int = 0
+) -> dict:
+    latencies = []
+    errors = 0
+    indexes = iter(range(start_index, start_index + requests))
+
+    async def worker():
+        nonlocal errors
+        for index in indexes:
+            started_at = time.perf_counter()
+            try:
+                response = await workload.request(client, index)
+                failed = response.status_code != workload.status
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - started_at)
+            errors += failed
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started_at
+    latencies.sort()
+    result = {
+        'requests': requests,
+        'errors': errors,
+        'duration_s': round(duration, 4),
+        'throughput_rps': round(requests / duration, 2) if duration else None,
+        'latency_ms': {
+            f'p{percentile}': round(get_percentile(latencies, percentile) * 1000, 3)
+            for percentile in PERCENTILES
+        }
+    }
+    result['latency_ms']['mean'] = round(sum(latencies) / len(latencies) * 1000, 3)
+    result['latency_ms']['max'] = round(latencies[-1] * 1000, 3)
+    return result
+
+
+async def setup_database(database_url: str) -> None:
+    engine = create_async_engine(database_url, future=True)
+    async with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            await conn.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async def get_benchmark_session() -> AsyncSession:
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_benchmark_session
+
+
+def setup_cache(redis_url: Optional[str]) -> None:
+    if redis_url:
+        app_settings.redis_url = redis_url
+        backend = RedisCacheBackend(redis_url)
+    else:
+        store = MemoryStore()
+        backend = MemoryCacheBackend(store)
+        cache_tools._redis_client = MemoryRedis(store)
+    app.dependency_overrides[cache_tools.redis_cache] = lambda: backend
+
+
+async def login(client: AsyncClient) -> None:
+    credentials = {
+        'username': f'benchmark-{uuid.uuid4().hex}',
+        'password': uuid.uuid4().hex
+    }
+    await client.post('/register/', json=credentials)
+    response = await client.post('/authorization/auth', json=credentials)
+    response.raise_for_status()
+    client.headers['Authorization'] = 'Bearer ' + response.json()['access_token']
+
+
+async def seed_files(client: AsyncClient, size: int) -> None:
+    response = await client.post(
+        '/files/upload/batch',
+        params={'path': SEED_DIR},
+        files=[
+            ('files', (f'{index}.bin', io.BytesIO(os.urandom(size))))
+            for index in range(SEED_FILES)
+        ]
+    )
+    response.raise_for_status()
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict) -> dict:
+    """
+    Relative change of every workload metric against ``baseline``,
+    positive when the metric grew.
+    """
+    changes = {}
+    for name, result in results['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        metrics = {'throughput_rps': (result, before)}
+        metrics.update(
+            (key, (result['latency_ms'], before['latency_ms']))
+            for key in result['latency_ms']
+        )
+        changes[name] = {
+            key: round(new[key] / old[key] - 1, 4) if old.get(key) else None
+            for key, (new, old) in metrics.items()
+        }
+    return changes
+
+
+async def run(args: argparse.Namespace) -> dict:
+    app_settings.archive_cache = args.archive_cache
+    await setup_database(args.database_url)
+    setup_cache(args.redis_url)
+    workloads = get_workloads(args)
+    names = args.workloads.split(',') if args.workloads else list(workloads)
+    unknown = set(names) - set(workloads)
+    if unknown:
+        raise SystemExit(f'Unknown workloads: {", ".join(sorted(unknown))}')
+    results = {}
+    async with AsyncClient(app=app, base_url=BASE_URL, timeout=None) as client:
+        await login(client)
+        await seed_files(client, args.small_size)
+        for name in names:
+            await run_workload(client, workloads[name], args.warmup, args.concurrency)
+            results[name] = await run_workload(
+                client,
+                workloads[name],
+                args.requests,
+                args.concurrency,
+                start_index=args.warmup
+            )
+            print(name, json.dumps(results[name]), file=sys.stderr)
+    return {
+        'meta': {
+            'commit': get_commit(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': args.database_url.split(':', 1)[0],
+            'cache': 'redis' if args.redis_url else 'memory',
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'small_size': args.small_size,
+            'large_size': args.large_size,
+            'archive_cache': args.archive_cache
+        },
+        'results': results
+    }
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--database-url',
+        default=f'sqlite+aiosqlite:///{WORK_DIR}/benchmark.db',
+        help='SQLAlchemy async URL, a temporary SQLite file by default.'
+    )
+    parser.add_argument(
+        '--redis-url',
+        help='Redis to cache in, an in-memory stand-in by default.'
+    )
+    parser.add_argument(
+        '--workloads',
+        help='Comma separated workloads, all by default.'
+    )
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--small-size', type=int, default=4 * 1024)
+    parser.add_argument('--large-size', type=int, default=8 * 1024 * 1024)
+    parser.add_argument(
+        '--archive-cache',
+        action='store_true',
+        help='Serve repeated archives from the disk cache.'
+    )
+    parser.add_argument('--output', help='JSON file, stdout by default.')
+    parser.add_argument('--compare', help='Results JSON of a previous run.')
+    return parser
+
+
+def main() -> None:
+    args = get_parser().parse_args()
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        shutdown_workers()
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            results['changes'] = compare(results, json.load(baseline_file))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from .endpoints import authorization, files, ping, register
+from .endpoints import authorization, files, metrics, multipart, ping, register
 
 
 api_router = APIRouter()
@@ -18,6 +18,12 @@ api_router.include_router(
     tags=['authorization']
 )
 
+api_router.include_router(
+    multipart.router,
+    prefix='/files/multipart',
+    tags=['multipart_upload']
+)
+
 api_router.include_router(
     files.router,
     prefix='/files',
@@ -29,3 +35,9 @@ api_router.include_router(
     prefix='/ping',
     tags=['ping']
 )
+
+api_router.include_router(
+    metrics.router,
+    prefix='/metrics',
+    tags=['metrics']
+)
@@ -7,6 +7,8 @@ from fastapi import (
     File,
     HTTPException,
     Query,
+    Request,
+    Response,
     UploadFile,
     status
 )
@@ -19,18 +21,30 @@ from src.db.db import get_session
 from src.schemas import file as file_schema
 from src.schemas import user as user_schema
 from src.services.auth import get_current_user
-from src.services.base import file_crud
-from src.tools.cache import (
-    get_cache,
-    get_cache_or_data,
-    redis_cache,
-    set_cache
+from src.services.base import file_crud, user_crud
+from src.tools.batch import create_staging_dir, get_batch_entries
+from src.tools.cache import get_cache_or_data, redis_cache
+from src.tools.download import (
+    get_content_disposition,
+    get_range,
+    get_validators,
+    is_not_modified,
+    iter_content
 )
 from src.tools.files import (
     get_file_info,
+    get_file_info_key,
+    get_files_list,
+    get_files_list_key,
+    get_tree,
+    invalidate_file_cache,
+    invalidate_files_cache,
     is_downloadable,
-    get_compressed_file_with_media_type
+    get_compressed_file_with_media_type,
+    verify_file
 )
+from src.tools.backends import get_storage
+from src.tools.storage import rmtree
 
 router = APIRouter()
 
@@ -40,28 +54,88 @@ logger = logging.getLogger('files')
 @router.get(
     '/list',
     response_model=file_schema.FilesList,
-    description='Get files list of current user.'
+    description='Get a page of files of current user, pass next_cursor '
+                'as cursor to get the next page.'
 )
 async def get_list(
         *,
         db: AsyncSession = Depends(get_session),
         current_user: user_schema.CurrentUser = Depends(get_current_user),
-        cache: RedisCacheBackend = Depends(redis_cache)
+        cache: RedisCacheBackend = Depends(redis_cache),
+        query: file_schema.FilesListQuery = Depends()
 ) -> Any:
-    redis_key = f'files_list_for_{str(current_user.id)}'
-    data = await get_cache(cache, redis_key)
-    if not data:
-        files = await file_crud.get_list_by_user_object(db=db, user_obj=current_user)
-        files_lst = [file_schema.File.from_orm(file).dict() for file in files]
-        data = {
-            'account_id': current_user.id,
-            'files': files_lst
-        }
-        await set_cache(cache, data, redis_key)
+    data = await get_cache_or_data(
+        redis_key=await get_files_list_key(current_user.id, query),
+        cache=cache,
+        db_func_obj=get_files_list,
+        db_func_args=(db, current_user, query),
+        cache_expire=app_settings.metadata_cache_ttl
+    )
     logger.info('Send list of files of %s', current_user.id)
     return data
 
 
+@router.get(
+    '/search',
+    response_model=file_schema.FilesList,
+    description='Search files of current user by path prefix, path glob, '
+                'path substring and name glob, pass next_cursor as cursor '
+                'to get the next page.'
+)
+async def search_files(
+        *,
+        db: AsyncSession = Depends(get_session),
+        current_user: user_schema.CurrentUser = Depends(get_current_user),
+        cache: RedisCacheBackend = Depends(redis_cache),
+        query: file_schema.FilesSearchQuery = Depends()
+) -> Any:
+    data = await get_cache_or_data(
+        redis_key=await get_files_list_key(current_user.id, query),
+        cache=cache,
+        db_func_obj=get_files_list,
+        db_func_args=(db, current_user, query),
+        cache_expire=app_settings.metadata_cache_ttl
+    )
+    logger.info('Send search results of %s', current_user.id)
+    return data
+
+
+@router.get(
+    '/tree',
+    response_model=file_schema.DirectoryTree,
+    description='Get direct subdirectories and files of a directory.'
+)
+async def get_directory_tree(
+        *,
+        path: str = Query(default='/', description='Directory path, starts with /'),
+        db: AsyncSession = Depends(get_session),
+        current_user: user_schema.CurrentUser = Depends(get_current_user)
+) -> Any:
+    if not path.startswith('/'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Path must starts with / .'
+        )
+    tree = await get_tree(db=db, path=path, user_obj=current_user)
+    logger.info('Send tree of %s to %s', path, current_user.id)
+    return tree
+
+
+@router.get(
+    '/usage',
+    response_model=user_schema.UserUsage,
+    description='Get storage used by current user and its quota.'
+)
+async def get_usage(
+        *,
+        db: AsyncSession = Depends(get_session),
+        current_user: user_schema.CurrentUser = Depends(get_current_user)
+) -> Any:
+    usage = await user_crud.get_usage(db=db, user_id=current_user.id)
+    logger.info('Send usage of %s', current_user.id)
+    return usage
+
+
 @router.post(
     '/upload',
     response_model=file_schema.FileInDB,
@@ -91,10 +165,57 @@ async def upload_file(
         file_obj=file,
         file_path=full_path
     )
+    await invalidate_file_cache(file_obj=file_obj)
     logger.info('Upload/put file %s from %s', full_path, current_user.id)
     return file_obj
 
 
+@router.post(
+    '/upload/batch',
+    response_model=list[file_schema.FileInDB],
+    status_code=status.HTTP_201_CREATED,
+    description='Upload many files, as multipart files and/or a tar archive, '
+                'into a directory.'
+)
+async def upload_files(
+        *,
+        path: str = Query(description='Enter path to directory, starts with /'),
+        db: AsyncSession = Depends(get_session),
+        current_user: user_schema.CurrentUser = Depends(get_current_user),
+        files: Optional[list[UploadFile]] = File(
+            default=None,
+            description='File names may contain subdirectories.'
+        ),
+        archive: Optional[UploadFile] = File(
+            default=None,
+            description='Tar archive (optionally gzip, bz2 or xz compressed).'
+        )
+) -> Any:
+    if not path.startswith('/'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Path must starts with / .'
+        )
+    staging_dir = await create_staging_dir()
+    try:
+        entries = await get_batch_entries(
+            directory=path,
+            files=files,
+            archive=archive,
+            staging_dir=staging_dir
+        )
+        files_obj, overwritten = await file_crud.create_or_put_files(
+            db=db,
+            user_obj=current_user,
+            entries=entries
+        )
+    finally:
+        await rmtree(staging_dir)
+    await invalidate_files_cache(user_id=current_user.id, files=overwritten)
+    logger.info('Upload %s files to %s from %s', len(files_obj), path, current_user.id)
+    return files_obj
+
+
 @router.get(
     '/download',
     status_code=status.HTTP_200_OK,
@@ -102,6 +223,7 @@ async def upload_file(
 )
 async def download_file_by_path_or_id(
         *,
+        request: Request,
         db: AsyncSession = Depends(get_session),
         current_user: user_schema.CurrentUser = Depends(get_current_user),
         path: str = Query(description='Query of file path (starts with /) OR file id, '
@@ -113,23 +235,50 @@ async def download_file_by_path_or_id(
         cache: RedisCacheBackend = Depends(redis_cache)
 ) -> Any:
     if not compression_type:
-        file_info_redis_key = f'file_info_for_{path}'
         file_info = await get_cache_or_data(
-            redis_key=file_info_redis_key,
+            redis_key=await get_file_info_key(path),
             cache=cache,
             db_func_obj=get_file_info,
-            data_schema=file_schema.File,
-            db_func_args=(db, path)
+            data_schema=file_schema.FileStorage,
+            db_func_args=(db, path),
+            cache_expire=app_settings.metadata_cache_ttl
         )
         is_downloadable(file_info=file_info)
-        file_url = app_settings.static_url + file_info.get('path')
-        return RedirectResponse(file_url)
+        validators = get_validators(file_info)
+        if is_not_modified(request.headers, file_info):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers=validators
+            )
+        byte_range = get_range(request.headers, file_info)
+        if (app_settings.download_redirect and byte_range is None
+                and not file_info.get('manifest')):
+            file_url = get_storage().get_download_url(file_info.get('path'))
+            return RedirectResponse(file_url, headers=validators)
+        start, end = byte_range or (0, file_info['size'] - 1)
+        headers = {
+            **validators,
+            'Accept-Ranges': 'bytes',
+            'Content-Disposition': get_content_disposition(file_info['name']),
+            'Content-Length': str(end - start + 1)
+        }
+        status_code = status.HTTP_200_OK
+        if byte_range:
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            headers['Content-Range'] = f'bytes {start}-{end}/{file_info["size"]}'
+        logger.info('User %s download file %s', current_user.id, path)
+        return StreamingResponse(
+            iter_content(file_info, start, end - start + 1),
+            status_code=status_code,
+            media_type='application/octet-stream',
+            headers=headers
+        )
     if compression_type not in app_settings.compression_types:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail='Specified compression type is not supported.'
         )
-    refreshed_io, media_type = await get_compressed_file_with_media_type(
+    chunks, media_type = await get_compressed_file_with_media_type(
         db=db,
         cache=cache,
         path=path,
@@ -138,7 +287,29 @@ async def download_file_by_path_or_id(
     file_name = 'archive' + '.' + compression_type
     logger.info('User %s download file %s', current_user.id, path)
     return StreamingResponse(
-        iter([refreshed_io.getvalue()]),
+        chunks,
         media_type=media_type,
-        headers={"Content-Disposition": f'attachment;filename={file_name}'}
+        headers={'Content-Disposition': get_content_disposition(file_name)}
+    )
+
+
+@router.post(
+    '/verify',
+    response_model=file_schema.FileVerification,
+    description='Re-read a file and check it against the checksum '
+                'computed on upload.'
+)
+async def verify_file_by_path_or_id(
+        *,
+        path: str = Query(description='Query of file path (starts with /) OR file id'),
+        db: AsyncSession = Depends(get_session),
+        current_user: user_schema.CurrentUser = Depends(get_current_user)
+) -> Any:
+    verification = await verify_file(db=db, path=path)
+    logger.info(
+        'User %s verify file %s: %s',
+        current_user.id,
+        path,
+        verification['valid']
     )
+    return verification
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, status
+from fastapi.responses import PlainTextResponse
+
+from src.tools.metrics import render_metrics
+
+
+router = APIRouter()
+
+
+@router.get(
+    '/',
+    response_class=PlainTextResponse,
+    description='Metrics in Prometheus text format.',
+    status_code=status.HTTP_200_OK,
+)
+async def get_metrics():
+    return PlainTextResponse(
+        render_metrics(),
+        media_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,208 @@
+import logging.config
+import os
+from typing import Any
+from uuid import UUID
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Path,
+    Query,
+    UploadFile,
+    status
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import app_settings
+from src.db.db import get_session
+from src.models.models import MultipartUpload
+from src.schemas import file as file_schema
+from src.schemas import multipart as multipart_schema
+from src.schemas import user as user_schema
+from src.services.auth import get_current_user
+from src.services.base import file_crud, multipart_crud
+from src.tools.base import check_quota
+from src.tools.files import invalidate_file_cache
+from src.tools.multipart import (
+    create_parts,
+    discard_parts,
+    get_backend_upload,
+    get_staging_path,
+    get_upload_checksum,
+    get_upload_size,
+    write_part
+)
+from src.tools.storage import open_async, run_io
+from src.tools.usage import get_remaining_bytes
+
+router = APIRouter()
+
+logger = logging.getLogger('multipart')
+
+
+async def get_upload_or_404(
+        db: AsyncSession,
+        upload_id: UUID,
+        current_user: user_schema.CurrentUser
+) -> MultipartUpload:
+    upload_obj = await multipart_crud.get_upload(
+        db=db,
+        upload_id=upload_id,
+        user_obj=current_user
+    )
+    if not upload_obj:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Upload not found'
+        )
+    return upload_obj
+
+
+@router.post(
+    '/initiate',
+    response_model=multipart_schema.MultipartUpload,
+    status_code=status.HTTP_201_CREATED,
+    description='Start multipart upload of a file.'
+)
+async def initiate_upload(
+        *,
+        path: str = Query(description='Enter full path to file, starts with /'),
+        part_size: int = Query(
+            ge=app_settings.multipart_min_part_size,
+            le=app_settings.multipart_max_part_size,
+            description='Size of every part except the last one.'
+        ),
+        size: int = Query(ge=1, description='Total size of the file in bytes.'),
+        db: AsyncSession = Depends(get_session),
+        current_user: user_schema.CurrentUser = Depends(get_current_user)
+) -> Any:
+    if not path.startswith('/') or path.endswith('/'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Path must starts with / and end with file name.'
+        )
+    if -(-size // part_size) > app_settings.multipart_max_parts:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Upload needs more than {app_settings.multipart_max_parts} parts.'
+        )
+    remaining = await get_remaining_bytes(db, current_user.id)
+    if remaining is not None:
+        pending = await multipart_crud.get_pending_bytes(db=db, user_obj=current_user)
+        check_quota(size, max(remaining - pending, 0))
+    upload_obj = await multipart_crud.create_upload(
+        db=db,
+        user_obj=current_user,
+        path=path,
+        part_size=part_size,
+        size=size,
+        storage_upload_id=await create_parts(path, part_size, size)
+    )
+    logger.info('Start multipart upload %s of %s', upload_obj.id, path)
+    return upload_obj
+
+
+@router.get(
+    '/{upload_id}',
+    response_model=multipart_schema.MultipartUpload,
+    description='Get multipart upload with received parts.'
+)
+async def get_upload(
+        *,
+        upload_id: UUID,
+        db: AsyncSession = Depends(get_session),
+        current_user: user_schema.CurrentUser = Depends(get_current_user)
+) -> Any:
+    return await get_upload_or_404(db, upload_id, current_user)
+
+
+@router.put(
+    '/{upload_id}/parts/{part_number}',
+    response_model=multipart_schema.MultipartPart,
+    description='Upload one part, parts can be sent concurrently and in any order.'
+)
+async def upload_part(
+        *,
+        upload_id: UUID,
+        part_number: int = Path(ge=1, le=app_settings.multipart_max_parts),
+        db: AsyncSession = Depends(get_session),
+        current_user: user_schema.CurrentUser = Depends(get_current_user),
+        file: UploadFile = File(...)
+) -> Any:
+    upload_obj = await get_upload_or_404(db, upload_id, current_user)
+    checksum, etag = await write_part(
+        file_obj=file,
+        upload_obj=upload_obj,
+        part_number=part_number
+    )
+    return await multipart_crud.put_part(
+        db=db,
+        upload_obj=upload_obj,
+        part_number=part_number,
+        size=checksum.size,
+        sha256=checksum.sha256,
+        etag=etag
+    )
+
+
+@router.post(
+    '/{upload_id}/complete',
+    response_model=file_schema.FileInDB,
+    status_code=status.HTTP_201_CREATED,
+    description='Assemble uploaded parts into the file.'
+)
+async def complete_upload(
+        *,
+        upload_id: UUID,
+        db: AsyncSession = Depends(get_session),
+        current_user: user_schema.CurrentUser = Depends(get_current_user)
+) -> Any:
+    upload_obj = await get_upload_or_404(db, upload_id, current_user)
+    size = get_upload_size(upload_obj)
+    checksum = await get_upload_checksum(upload_obj)
+    filename = upload_obj.path.split('/')[-1]
+    upload = get_backend_upload(upload_obj)
+    if upload is not None:
+        file_obj = await file_crud.create_or_put_file(
+            db=db,
+            user_obj=current_user,
+            file_obj=UploadFile(filename=filename),
+            file_path=upload_obj.path,
+            checksum=checksum,
+            upload=upload
+        )
+    else:
+        staging_path = get_staging_path(upload_obj)
+        await run_io(os.truncate, staging_path, size)
+        with await open_async(staging_path) as staging_file:
+            file_obj = await file_crud.create_or_put_file(
+                db=db,
+                user_obj=current_user,
+                file_obj=UploadFile(filename=filename, file=staging_file),
+                file_path=upload_obj.path,
+                source_path=staging_path,
+                checksum=checksum
+            )
+    await invalidate_file_cache(file_obj=file_obj)
+    await multipart_crud.delete_upload(db=db, upload_obj=upload_obj)
+    logger.info('Complete multipart upload %s of %s', upload_id, upload_obj.path)
+    return file_obj
+
+
+@router.delete(
+    '/{upload_id}',
+    status_code=status.HTTP_204_NO_CONTENT,
+    description='Abort multipart upload and drop received parts.'
+)
+async def abort_upload(
+        *,
+        upload_id: UUID,
+        db: AsyncSession = Depends(get_session),
+        current_user: user_schema.CurrentUser = Depends(get_current_user)
+) -> None:
+    upload_obj = await get_upload_or_404(db, upload_id, current_user)
+    await discard_parts(upload_obj)
+    await multipart_crud.delete_upload(db=db, upload_obj=upload_obj)
+    logger.info('Abort multipart upload %s', upload_id)
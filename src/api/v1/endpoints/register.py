@@ -2,11 +2,14 @@ import logging.config
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi_cache.backends.redis import RedisCacheBackend
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.db.db import get_session
 from src.schemas import user as user_schema
+from src.services.auth import invalidate_principal
 from src.services.base import user_crud
+from src.tools.cache import redis_cache
 
 
 router = APIRouter()
@@ -23,6 +26,7 @@ logger = logging.getLogger('register')
 async def create_user(
         *,
         db: AsyncSession = Depends(get_session),
+        cache: RedisCacheBackend = Depends(redis_cache),
         user_in: user_schema.UserRegister
 ) -> Any:
     """
@@ -35,5 +39,6 @@ async def create_user(
             detail='User with this username exists.'
         )
     user = await user_crud.create(db=db, obj_in=user_in)
+    await invalidate_principal(cache=cache, username=user.username)
     logger.info('Create user - %s', user.username)
     return user
@@ -38,6 +38,142 @@ class AppSettings(BaseSettings):
         ['zip', '7z', 'tar'],
         env='COMPRESSION_TYPES'
     )
+    archive_chunk_size: int = Field(64 * 1024, env='ARCHIVE_CHUNK_SIZE')
+    archive_queue_size: int = Field(16, env='ARCHIVE_QUEUE_SIZE')
+    compression_workers: int = Field(
+        os.cpu_count() or 1,
+        env='COMPRESSION_WORKERS'
+    )
+    compression_max_jobs: int = Field(32, env='COMPRESSION_MAX_JOBS')
+    compression_threads: int = Field(
+        os.cpu_count() or 1,
+        env='COMPRESSION_THREADS'
+    )
+    parallel_member_size: int = Field(
+        1024 * 1024,
+        env='PARALLEL_MEMBER_SIZE'
+    )
+    gzip_block_size: int = Field(1024 * 1024, env='GZIP_BLOCK_SIZE')
+    dedup_storage: bool = Field(False, env='DEDUP_STORAGE')
+    blobs_folder_path: str = Field(
+        os.path.join(
+            BASE_DIR,
+            'blobs'
+        ),
+        env='BLOBS_BASE_DIR'
+    )
+    chunk_min_size: int = Field(16 * 1024, env='CHUNK_MIN_SIZE')
+    chunk_avg_size: int = Field(64 * 1024, env='CHUNK_AVG_SIZE')
+    chunk_max_size: int = Field(256 * 1024, env='CHUNK_MAX_SIZE')
+    blob_read_size: int = Field(1024 * 1024, env='BLOB_READ_SIZE')
+    multipart_folder_path: str = Field(
+        os.path.join(
+            BASE_DIR,
+            'multipart'
+        ),
+        env='MULTIPART_BASE_DIR'
+    )
+    multipart_min_part_size: int = Field(
+        1024 * 1024,
+        env='MULTIPART_MIN_PART_SIZE'
+    )
+    multipart_max_part_size: int = Field(
+        1024 * 1024 * 1024,
+        env='MULTIPART_MAX_PART_SIZE'
+    )
+    multipart_max_parts: int = Field(10000, env='MULTIPART_MAX_PARTS')
+    multipart_upload_ttl: int = Field(24 * 60 * 60, env='MULTIPART_UPLOAD_TTL')
+    multipart_cleanup_interval: int = Field(60 * 60, env='MULTIPART_CLEANUP_INTERVAL')
+    download_redirect: bool = Field(True, env='DOWNLOAD_REDIRECT')
+    download_chunk_size: int = Field(
+        1024 * 1024,
+        env='DOWNLOAD_CHUNK_SIZE'
+    )
+    archive_cache: bool = Field(True, env='ARCHIVE_CACHE')
+    archive_cache_folder_path: str = Field(
+        os.path.join(
+            BASE_DIR,
+            'archives'
+        ),
+        env='ARCHIVE_CACHE_DIR'
+    )
+    archive_cache_max_size: int = Field(
+        1024 * 1024 * 1024,
+        env='ARCHIVE_CACHE_MAX_SIZE'
+    )
+    archive_cache_lock_timeout: int = Field(
+        600,
+        env='ARCHIVE_CACHE_LOCK_TIMEOUT'
+    )
+    local_cache: bool = Field(True, env='LOCAL_CACHE')
+    local_cache_max_entries: int = Field(
+        10000,
+        env='LOCAL_CACHE_MAX_ENTRIES'
+    )
+    local_cache_ttl: float = Field(5, env='LOCAL_CACHE_TTL')
+    cache_invalidation_channel: str = Field(
+        'cache-invalidation',
+        env='CACHE_INVALIDATION_CHANNEL'
+    )
+    cache_lock: bool = Field(False, env='CACHE_LOCK')
+    cache_lock_timeout: float = Field(5, env='CACHE_LOCK_TIMEOUT')
+    cache_lock_poll_interval: float = Field(
+        0.05,
+        env='CACHE_LOCK_POLL_INTERVAL'
+    )
+    cache_early_refresh_beta: float = Field(
+        1,
+        env='CACHE_EARLY_REFRESH_BETA'
+    )
+    principal_cache_ttl: int = Field(300, env='PRINCIPAL_CACHE_TTL')
+    metadata_cache_ttl: int = Field(6 * 3600, env='METADATA_CACHE_TTL')
+    batch_upload_concurrency: int = Field(
+        32,
+        env='BATCH_UPLOAD_CONCURRENCY'
+    )
+    batch_upload_max_files: int = Field(
+        100000,
+        env='BATCH_UPLOAD_MAX_FILES'
+    )
+    known_dirs_max_entries: int = Field(
+        100000,
+        env='KNOWN_DIRS_MAX_ENTRIES'
+    )
+    db_echo: bool = Field(False, env='DB_ECHO')
+    db_pool_size: int = Field(20, env='DB_POOL_SIZE')
+    db_max_overflow: int = Field(10, env='DB_MAX_OVERFLOW')
+    db_pool_timeout: float = Field(30, env='DB_POOL_TIMEOUT')
+    db_pool_recycle: int = Field(1800, env='DB_POOL_RECYCLE')
+    db_pool_pre_ping: bool = Field(True, env='DB_POOL_PRE_PING')
+    db_statement_cache_size: int = Field(
+        500,
+        env='DB_STATEMENT_CACHE_SIZE'
+    )
+    password_workers: int = Field(
+        os.cpu_count() or 1,
+        env='PASSWORD_WORKERS'
+    )
+    password_max_pending: int = Field(64, env='PASSWORD_MAX_PENDING')
+    files_page_size: int = Field(100, env='FILES_PAGE_SIZE')
+    files_page_max_size: int = Field(1000, env='FILES_PAGE_MAX_SIZE')
+    user_quota: int = Field(0, env='USER_QUOTA')
+    upload_chunk_size: int = Field(1024 * 1024, env='UPLOAD_CHUNK_SIZE')
+    ping_interval: float = Field(5, env='PING_INTERVAL')
+    ping_timeout: float = Field(2, env='PING_TIMEOUT')
+    ping_window: int = Field(120, env='PING_WINDOW')
+    io_workers: int = Field(32, env='IO_WORKERS')
+    io_buffer_size: int = Field(256 * 1024, env='IO_BUFFER_SIZE')
+    storage_backend: str = Field('local', env='STORAGE_BACKEND')
+    s3_endpoint_url: str = Field('http://localhost:9000', env='S3_ENDPOINT_URL')
+    s3_bucket: str = Field('files', env='S3_BUCKET')
+    s3_access_key: str = Field('', env='S3_ACCESS_KEY')
+    s3_secret_key: str = Field('', env='S3_SECRET_KEY')
+    s3_region: str = Field('us-east-1', env='S3_REGION')
+    s3_part_size: int = Field(8 * 1024 * 1024, env='S3_PART_SIZE')
+    s3_min_part_size: int = Field(5 * 1024 * 1024, env='S3_MIN_PART_SIZE')
+    s3_max_part_size: int = Field(64 * 1024 * 1024, env='S3_MAX_PART_SIZE')
+    s3_presign_ttl: int = Field(3600, env='S3_PRESIGN_TTL')
+    checksum_crc32: bool = Field(True, env='CHECKSUM_CRC32')
 
     class Config:
         env_file = os.path.dirname(BASE_DIR) + '/.env'
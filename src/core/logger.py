@@ -56,10 +56,38 @@ LOGGING = {
             'handlers': ['console'],
             'level': 'INFO',
         },
+        'multipart': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
         'tools-files': {
             'handlers': ['console'],
             'level': 'INFO',
         },
+        'tools-compression': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'tools-password': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'tools-cache': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'tools-archive-cache': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'tools-ping': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'tools-multipart': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
         'auth': {
             'handlers': ['console'],
             'level': 'INFO',
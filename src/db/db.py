@@ -1,11 +1,73 @@
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.core.config import app_settings
+from src.tools.metrics import (
+    db_pool_timeouts,
+    db_pool_wait_seconds,
+    db_statement_seconds
+)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool recording how long each checkout waited for a connection.
+    """
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            db_pool_timeouts.inc()
+            raise
+        finally:
+            db_pool_wait_seconds.observe(time.perf_counter() - started_at)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.statement_started_at = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def observe_statement(conn, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, 'statement_started_at', None)
+    if started_at is None:
+        return
+    db_statement_seconds.observe(
+        time.perf_counter() - started_at,
+        operation=(statement.split(None, 1) or ['UNKNOWN'])[0].upper()
+    )
+
+
+def get_database_url():
+    url = make_url(app_settings.database_dsn)
+    if url.get_driver_name() == 'asyncpg':
+        url = url.update_query_dict({
+            'prepared_statement_cache_size': str(app_settings.db_statement_cache_size)
+        })
+    return url
 
 
 Base = declarative_base()
-engine = create_async_engine(app_settings.database_dsn, echo=True, future=True)
+engine = create_async_engine(
+    get_database_url(),
+    echo=app_settings.db_echo,
+    future=True,
+    poolclass=TimedQueuePool,
+    pool_size=app_settings.db_pool_size,
+    max_overflow=app_settings.db_max_overflow,
+    pool_timeout=app_settings.db_pool_timeout,
+    pool_recycle=app_settings.db_pool_recycle,
+    pool_pre_ping=app_settings.db_pool_pre_ping
+)
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
@@ -10,7 +10,13 @@ from alembic import context
 
 from src.db.db import Base
 from src.core.config import app_settings
-from src.models.models import File, User, Directory
+from src.models.models import (
+    Directory,
+    File,
+    MultipartUpload,
+    MultipartUploadPart,
+    User
+)
 
 
 # this is the Alembic Config object, which provides
@@ -0,0 +1,45 @@
+"""05_relative-directory-paths
+
+Revision ID: ce0bf33d38a6
+Revises: e8d59278183e
+Create Date: 2026-10-18 13:27:52.904117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from src.core.config import app_settings
+
+# revision identifiers, used by Alembic.
+revision = 'ce0bf33d38a6'
+down_revision = 'e8d59278183e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Directory rows used to store absolute filesystem paths.
+    op.execute(
+        sa.text(
+            'UPDATE directories SET path = substr(path, :start) '
+            'WHERE substr(path, 1, :length) = :prefix'
+        ).bindparams(
+            start=len(app_settings.files_folder_path) + 1,
+            length=len(app_settings.files_folder_path) + 1,
+            prefix=app_settings.files_folder_path + '/'
+        )
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        sa.text(
+            "UPDATE directories SET path = :folder || path "
+            "WHERE substr(path, 1, 1) = '/' "
+            "AND substr(path, 1, :length) != :prefix"
+        ).bindparams(
+            folder=app_settings.files_folder_path,
+            length=len(app_settings.files_folder_path) + 1,
+            prefix=app_settings.files_folder_path + '/'
+        )
+    )
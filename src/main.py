@@ -7,6 +7,15 @@ from fastapi.staticfiles import StaticFiles
 
 from src.api.v1 import base
 from src.core.config import app_settings
+from src.tools.backends import close_storage
+from src.tools.cache import (
+    start_invalidation_listener,
+    stop_invalidation_listener
+)
+from src.tools.middleware import MetricsMiddleware
+from src.tools.multipart import start_multipart_cleaner, stop_multipart_cleaner
+from src.tools.ping import start_ping_sampler, stop_ping_sampler
+from src.tools.workers import shutdown_workers
 
 
 app = FastAPI(
@@ -17,6 +26,7 @@ app = FastAPI(
     swagger_ui_oauth2_redirect_url='/authorization/token'
 )
 
+app.add_middleware(MetricsMiddleware)
 app.include_router(base.api_router, prefix='/api/v1')
 app.mount('/files', StaticFiles(directory=app_settings.base_dir + '/files'), name='files')
 
@@ -25,11 +35,19 @@ app.mount('/files', StaticFiles(directory=app_settings.base_dir + '/files'), nam
 async def on_startup() -> None:
     rc = RedisCacheBackend(app_settings.redis_url)
     caches.set(CACHE_KEY, rc)
+    start_invalidation_listener()
+    start_ping_sampler()
+    start_multipart_cleaner()
 
 
 @app.on_event('shutdown')
 async def on_shutdown() -> None:
+    await stop_ping_sampler()
+    await stop_multipart_cleaner()
     await close_caches()
+    await stop_invalidation_listener()
+    await close_storage()
+    shutdown_workers()
 
 
 if __name__ == '__main__':
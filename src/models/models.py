@@ -1,7 +1,16 @@
 from datetime import datetime
 import uuid
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy_utils import UUIDType
 
@@ -15,20 +24,102 @@ class User(Base):
     hashed_password = Column(String(125), nullable=False)
     files = relationship('File', backref='user', cascade='CASCADE')
     created_at = Column(DateTime, index=True, default=datetime.utcnow)
+    used_bytes = Column(BigInteger, nullable=False, default=0, server_default='0')
+    files_count = Column(Integer, nullable=False, default=0, server_default='0')
+    quota_bytes = Column(BigInteger, nullable=True)
 
 
 class File(Base):
     __tablename__ = 'files'
     id = Column(UUIDType(binary=False), primary_key=True, default=uuid.uuid1)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    user_id = Column(UUIDType(binary=False), ForeignKey('users.id'), nullable=False, index=True)
     name = Column(String(125), nullable=False)
     created_at = Column(DateTime, index=True, default=datetime.utcnow)
     path = Column(String(255), nullable=False, unique=True)
-    size = Column(Integer, nullable=False)
+    size = Column(BigInteger, nullable=False)
     is_downloadable = Column(Boolean, default=False)
+    manifest = Column(String(64), nullable=True)
+    sha256 = Column(String(64), nullable=True)
+    crc32 = Column(BigInteger, nullable=True)
+    directory_id = Column(UUIDType(binary=False), ForeignKey('directories.id'), nullable=True)
+
+    __table_args__ = (
+        Index('ix_files_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        Index('ix_files_user_id_name_id', 'user_id', 'name', 'id'),
+        Index('ix_files_user_id_size_id', 'user_id', 'size', 'id'),
+        Index('ix_files_user_id_path_id', 'user_id', 'path', 'id'),
+        Index('ix_files_directory_id_name', 'directory_id', 'name'),
+        Index(
+            'ix_files_user_id_path_pattern', 'user_id', 'path',
+            postgresql_ops={'path': 'text_pattern_ops'}
+        ),
+        Index(
+            'ix_files_user_id_name_pattern', 'user_id', 'name',
+            postgresql_ops={'name': 'text_pattern_ops'}
+        ),
+        Index(
+            'ix_files_user_id_path_trgm', 'user_id', 'path',
+            postgresql_using='gin',
+            postgresql_ops={'path': 'gin_trgm_ops'}
+        ),
+        Index(
+            'ix_files_user_id_name_trgm', 'user_id', 'name',
+            postgresql_using='gin',
+            postgresql_ops={'name': 'gin_trgm_ops'}
+        ),
+    )
 
 
 class Directory(Base):
     __tablename__ = 'directories'
     id = Column(UUIDType(binary=False), primary_key=True, default=uuid.uuid1)
     path = Column(String(255), nullable=False, unique=True)
+    parent_id = Column(UUIDType(binary=False), ForeignKey('directories.id'), nullable=True)
+    name = Column(String(125), nullable=False, server_default='')
+
+    __table_args__ = (
+        Index('ix_directories_parent_id_name', 'parent_id', 'name'),
+    )
+
+
+class DirectoryUsage(Base):
+    __tablename__ = 'directory_usage'
+    user_id = Column(UUIDType(binary=False), ForeignKey('users.id'), primary_key=True)
+    directory_id = Column(UUIDType(binary=False), ForeignKey('directories.id'), primary_key=True)
+    parent_id = Column(UUIDType(binary=False), ForeignKey('directories.id'), nullable=True)
+    size = Column(BigInteger, nullable=False, default=0, server_default='0')
+    files_count = Column(Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        Index('ix_directory_usage_user_id_parent_id', 'user_id', 'parent_id'),
+    )
+
+
+class MultipartUpload(Base):
+    __tablename__ = 'multipart_uploads'
+    id = Column(UUIDType(binary=False), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUIDType(binary=False), ForeignKey('users.id'), nullable=False, index=True)
+    path = Column(String(255), nullable=False)
+    part_size = Column(BigInteger, nullable=False)
+    size = Column(BigInteger, nullable=False, server_default='0')
+    storage_upload_id = Column(String(255), nullable=True)
+    created_at = Column(DateTime, index=True, default=datetime.utcnow)
+    parts = relationship(
+        'MultipartUploadPart',
+        cascade='all, delete-orphan',
+        order_by='MultipartUploadPart.part_number',
+        lazy='selectin'
+    )
+
+
+class MultipartUploadPart(Base):
+    __tablename__ = 'multipart_upload_parts'
+    upload_id = Column(
+        UUIDType(binary=False),
+        ForeignKey('multipart_uploads.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    part_number = Column(Integer, primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    sha256 = Column(String(64), nullable=True)
+    etag = Column(String(255), nullable=True)
@@ -1,8 +1,10 @@
 from datetime import datetime
-from typing import List
+from typing import List, Literal, Optional
 from uuid import UUID
 
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, Field, validator
+
+from src.core.config import app_settings
 
 
 class ORM(BaseModel):
@@ -17,6 +19,8 @@ class FileBase(ORM):
     path: str
     size: int
     is_downloadable: bool
+    sha256: Optional[str] = None
+    crc32: Optional[int] = None
 
 
 class FileInDB(FileBase):
@@ -39,9 +43,68 @@ class File(FileBase):
             return value
 
 
+class FileStorage(File):
+    manifest: Optional[str] = None
+
+
+class FileVerification(ORM):
+    id: UUID
+    path: str
+    size: int
+    sha256: str
+    crc32: Optional[int] = None
+    valid: Optional[bool] = Field(
+        None,
+        description='None when the file had no stored checksum yet.'
+    )
+
+
 class FilesList(ORM):
     account_id: UUID
     files: List
+    next_cursor: Optional[str] = None
+
+
+class FilesListQuery(BaseModel):
+    limit: int = Field(
+        app_settings.files_page_size,
+        ge=1,
+        le=app_settings.files_page_max_size
+    )
+    cursor: Optional[str] = None
+    path_prefix: Optional[str] = None
+    name: Optional[str] = Field(None, description='Glob, * and ? wildcards.')
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    sort_by: Literal['created_at', 'name', 'size', 'path'] = 'created_at'
+    order: Literal['asc', 'desc'] = 'asc'
+
+
+class FilesSearchQuery(FilesListQuery):
+    path: Optional[str] = Field(
+        None,
+        description='Glob matched against the whole path, * and ? wildcards.'
+    )
+    contains: Optional[str] = Field(None, description='Substring of the path.')
+    sort_by: Literal['created_at', 'name', 'size', 'path'] = 'path'
+
+
+class DirectoryInfo(ORM):
+    id: UUID
+    name: str
+    path: str
+    size: int
+    files_count: int
+
+
+class DirectoryTree(ORM):
+    path: str
+    size: int
+    files_count: int
+    directories: List[DirectoryInfo]
+    files: List[File]
 
 
 class ObjPath(ORM):
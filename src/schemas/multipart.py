@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class ORM(BaseModel):
+    class Config:
+        orm_mode = True
+
+
+class MultipartPart(ORM):
+    part_number: int
+    size: int
+    sha256: Optional[str] = None
+
+
+class MultipartUpload(ORM):
+    id: UUID
+    path: str
+    part_size: int
+    size: int
+    created_at: datetime
+    parts: List[MultipartPart] = []
@@ -1,6 +1,19 @@
+from datetime import datetime
+from typing import Optional
+
 from pydantic import BaseModel
 
 
+class ServiceLatency(BaseModel):
+    last: Optional[float] = None
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+    samples: int = 0
+    last_error: Optional[str] = None
+    last_error_at: Optional[datetime] = None
+
+
 class Ping(BaseModel):
-    db: float
-    redis: float
+    db: ServiceLatency
+    redis: ServiceLatency
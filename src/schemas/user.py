@@ -48,6 +48,15 @@ class CurrentUser(User):
     def datetime_to_str(cls, value):
         if isinstance(value, str):
             return datetime.fromisoformat(value)
+        else:
+            return value
+
+
+class UserUsage(ORM):
+    account_id: UUID
+    used_bytes: int
+    files_count: int
+    quota_bytes: Optional[int] = None
 
 
 class UserInDB(CurrentUser):
@@ -1,9 +1,11 @@
 import logging
+import time
 from datetime import datetime, timedelta
 from typing import Union
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from fastapi_cache.backends.redis import RedisCacheBackend
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -11,7 +13,8 @@ from sqlalchemy.future import select
 from src.db.db import get_session
 from src.models.models import User
 from src.schemas import user as user_schema
-from src.tools.password import verify_password
+from src.tools.cache import delete_cache, get_cache_or_data, redis_cache
+from src.tools.password import check_password
 from src.core.config import app_settings
 
 logging.getLogger('services_auth')
@@ -29,11 +32,19 @@ async def get_user(db: AsyncSession, username: str):
     return results.scalar_one_or_none()
 
 
+def get_principal_key(username: str) -> str:
+    return f'principal_for_{username}'
+
+
+async def invalidate_principal(cache: RedisCacheBackend, username: str):
+    await delete_cache(cache, get_principal_key(username))
+
+
 async def authenticate_user(db: AsyncSession, username: str, password: str):
     user = await get_user(db=db, username=username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await check_password(password, user.hashed_password):
         return False
     return user
 
@@ -53,7 +64,11 @@ def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None
     return encoded_jwt
 
 
-async def get_current_user(db: AsyncSession = Depends(get_session), token: str = Depends(oauth2_scheme)):
+async def get_current_user(
+        db: AsyncSession = Depends(get_session),
+        token: str = Depends(oauth2_scheme),
+        cache: RedisCacheBackend = Depends(redis_cache)
+) -> user_schema.CurrentUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -72,10 +87,21 @@ async def get_current_user(db: AsyncSession = Depends(get_session), token: str =
     except JWTError:
         logging.exception('Exception at get_current func for token %s', token)
         raise credentials_exception
-    user = await get_user(db=db, username=token_data.username)
+    # The cached principal must not outlive the token it was loaded for.
+    cache_expire = app_settings.principal_cache_ttl
+    if payload.get('exp'):
+        cache_expire = min(cache_expire, int(payload['exp'] - time.time()))
+    user = await get_cache_or_data(
+        redis_key=get_principal_key(token_data.username),
+        cache=cache,
+        db_func_obj=get_user,
+        data_schema=user_schema.CurrentUser,
+        db_func_args=(db, token_data.username),
+        cache_expire=max(cache_expire, 1)
+    )
     if user is None:
         raise credentials_exception
-    return user
+    return user_schema.CurrentUser(**user)
 
 
 async def get_token(db: AsyncSession, username: str, password: str):
@@ -1,10 +1,12 @@
 from src.models.models import Directory as DirectoryModel
 from src.models.models import File as FileModel
+from src.models.models import MultipartUpload as MultipartUploadModel
 from src.models.models import User as UserModel
 from src.schemas.user import UserRegister
 
 from .directory import RepositoryDirectoryDB
 from .file import RepositoryFileDB
+from .multipart import RepositoryMultipartUploadDB
 from .user import RepositoryUserDB
 
 
@@ -33,6 +35,15 @@ class RepositoryDirectory(
     pass
 
 
+class RepositoryMultipartUpload(
+    RepositoryMultipartUploadDB[
+        MultipartUploadModel
+    ]
+):
+    pass
+
+
 user_crud = RepositoryUser(UserModel)
 file_crud = RepositoryFile(FileModel)
 directory_crud = RepositoryDirectory(DirectoryModel)
+multipart_crud = RepositoryMultipartUpload(MultipartUploadModel)
@@ -5,6 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from src.db.db import Base
+from src.models.models import DirectoryUsage
 
 
 class Repository:
@@ -14,7 +15,10 @@ class Repository:
     def get_dir_info_by_id(self, *args, **kwargs):
         raise NotImplementedError
 
-    def create_dir_info(self, *args, **kwargs):
+    def get_usage(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def get_children_usage(self, *args, **kwargs):
         raise NotImplementedError
 
 
@@ -53,15 +57,48 @@ class RepositoryDirectoryDB(
         result = await db.execute(statement=statement)
         return result.scalar_one_or_none()
 
-    async def create_dir_info(
+    async def get_usage(
             self,
             db: AsyncSession,
-            path: str
-    ) -> ModelType:
-        dir_info_obj = self._model(
-            path=path
+            dir_id: uuid.UUID,
+            user_id: uuid.UUID
+    ) -> Optional[tuple[int, int]]:
+        """
+        Total size and count of the files of ``user_id`` in the tree
+        under ``dir_id``, None when the user never stored any there.
+        """
+        statement = select(
+            DirectoryUsage.size,
+            DirectoryUsage.files_count
+        ).where(
+            DirectoryUsage.user_id == user_id,
+            DirectoryUsage.directory_id == dir_id
         )
-        db.add(dir_info_obj)
-        await db.commit()
-        await db.refresh(dir_info_obj)
-        return dir_info_obj
+        result = (await db.execute(statement=statement)).one_or_none()
+        return result and tuple(result)
+
+    async def get_children_usage(
+            self,
+            db: AsyncSession,
+            dir_id: Optional[uuid.UUID],
+            user_id: uuid.UUID
+    ) -> list[tuple[ModelType, int, int]]:
+        """
+        Direct subdirectories of ``dir_id``, or of the root when None,
+        holding files of ``user_id``, with the total size and count of
+        those files.
+        """
+        statement = select(
+            self._model,
+            DirectoryUsage.size,
+            DirectoryUsage.files_count
+        ).join(
+            DirectoryUsage,
+            DirectoryUsage.directory_id == self._model.id
+        ).where(
+            DirectoryUsage.user_id == user_id,
+            DirectoryUsage.parent_id == dir_id,
+            DirectoryUsage.files_count > 0
+        ).order_by(self._model.name)
+        results = await db.execute(statement=statement)
+        return results.all()
@@ -1,13 +1,80 @@
 from typing import Generic, Optional, Type, TypeVar
+from uuid import UUID
 
 from fastapi import File as FileObj
+from sqlalchemy import literal, or_, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.sql import Select
 
 from src.db.db import Base
-from src.tools.base import get_full_path
-from src.tools.directory import create_dir_info
-from src.tools.file_create import put_file, create_file
+from src.schemas.file import FilesListQuery, FilesSearchQuery
+from src.tools.backends import BackendUpload
+from src.tools.base import glob_to_like
+from src.tools.checksum import Checksum
+from src.tools.directory import create_dirs_info
+from src.tools.file_create import (
+    BatchEntry,
+    create_file,
+    create_or_put_files,
+    put_file
+)
+from src.tools.usage import get_remaining_bytes
+
+# Upper bound of values bound into one IN clause.
+IN_CLAUSE_SIZE = 500
+
+
+def filter_search(statement: Select, model: Type[Base], query: FilesSearchQuery) -> Select:
+    if query.path:
+        statement = statement.where(model.path.like(glob_to_like(query.path), escape='\\'))
+    if query.contains:
+        statement = statement.where(model.path.contains(query.contains, autoescape=True))
+    return statement
+
+
+def filter_files(statement: Select, model: Type[Base], query: FilesListQuery) -> Select:
+    if query.path_prefix:
+        statement = statement.where(model.path.startswith(query.path_prefix, autoescape=True))
+    if query.name:
+        statement = statement.where(model.name.like(glob_to_like(query.name), escape='\\'))
+    if isinstance(query, FilesSearchQuery):
+        statement = filter_search(statement, model, query)
+    if query.min_size is not None:
+        statement = statement.where(model.size >= query.min_size)
+    if query.max_size is not None:
+        statement = statement.where(model.size <= query.max_size)
+    if query.created_after is not None:
+        statement = statement.where(model.created_at >= query.created_after)
+    if query.created_before is not None:
+        statement = statement.where(model.created_at < query.created_before)
+    return statement
+
+
+def order_files(
+        statement: Select,
+        model: Type[Base],
+        query: FilesListQuery,
+        after: Optional[tuple] = None
+) -> Select:
+    """
+    Orders by ``query.sort_by`` and id, starting after the (sort value,
+    id) keyset ``after``.
+    """
+    sort_column = getattr(model, query.sort_by)
+    keyset = tuple_(sort_column, model.id)
+    if after is not None:
+        after = (
+            literal(after[0], sort_column.type),
+            literal(after[1], model.id.type)
+        )
+    if query.order == 'desc':
+        if after is not None:
+            statement = statement.where(keyset < tuple_(*after))
+        return statement.order_by(sort_column.desc(), model.id.desc())
+    if after is not None:
+        statement = statement.where(keyset > tuple_(*after))
+    return statement.order_by(sort_column, model.id)
 
 
 class Repository:
@@ -20,9 +87,21 @@ class Repository:
     def get_list_by_user_object(self, *args, **kwargs):
         raise NotImplementedError
 
+    def get_list_by_path(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def get_list_by_directory(self, *args, **kwargs):
+        raise NotImplementedError
+
     def create_or_put_file(self, *args, **kwargs):
         raise NotImplementedError
 
+    def get_files_by_paths(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def create_or_put_files(self, *args, **kwargs):
+        raise NotImplementedError
+
 
 ModelType = TypeVar("ModelType", bound=Base)
 
@@ -63,8 +142,55 @@ class RepositoryFileDB(
             self,
             db: AsyncSession,
             user_obj: ModelType,
+            query: Optional[FilesListQuery] = None,
+            after: Optional[tuple] = None
     ) -> list[ModelType]:
+        """
+        Files of the user matching ``query``, ordered by ``query.sort_by``
+        and id. ``after`` is the (sort value, id) keyset of the last row
+        of the previous page. At most ``query.limit + 1`` rows are
+        returned, so the caller can tell whether another page exists.
+        """
         statement = select(self._model).where(self._model.user_id == user_obj.id)
+        if query is None:
+            results = await db.execute(statement=statement)
+            return results.scalars().all()
+        statement = filter_files(statement, self._model, query)
+        statement = order_files(statement, self._model, query, after)
+        results = await db.execute(statement=statement.limit(query.limit + 1))
+        return results.scalars().all()
+
+    async def get_list_by_path(
+            self,
+            db: AsyncSession,
+            path: str
+    ) -> list[ModelType]:
+        """
+        The file stored at ``path`` or every file in the tree under it.
+        """
+        path = path.rstrip('/')
+        statement = select(self._model).where(
+            or_(
+                self._model.path == path,
+                self._model.path.startswith(path + '/', autoescape=True)
+            )
+        ).order_by(self._model.path)
+        results = await db.execute(statement=statement)
+        return results.scalars().all()
+
+    async def get_list_by_directory(
+            self,
+            db: AsyncSession,
+            dir_id: Optional[UUID],
+            user_obj: ModelType
+    ) -> list[ModelType]:
+        """
+        Files of the user directly in ``dir_id``, or in the root when None.
+        """
+        statement = select(self._model).where(
+            self._model.directory_id == dir_id,
+            self._model.user_id == user_obj.id
+        ).order_by(self._model.name)
         results = await db.execute(statement=statement)
         return results.scalars().all()
 
@@ -73,27 +199,74 @@ class RepositoryFileDB(
             db: AsyncSession,
             user_obj: ModelType,
             file_obj: FileObj,
-            file_path: str
+            file_path: str,
+            source_path: Optional[str] = None,
+            checksum: Optional[Checksum] = None,
+            upload: Optional[BackendUpload] = None
     ) -> Optional[ModelType]:
         file_in_storage = await self.get_file_info_by_path(
             db=db,
             file_path=file_path
         )
-        full_file_path = get_full_path(file_path)
         if file_in_storage:
+            limit = await get_remaining_bytes(db, file_in_storage.user_id)
             return await put_file(
                 db=db,
-                full_file_path=full_file_path,
                 file_info=file_in_storage,
-                file_obj=file_obj
+                file_obj=file_obj,
+                source_path=source_path,
+                limit=None if limit is None else limit + file_in_storage.size,
+                checksum=checksum,
+                upload=upload
             )
         else:
             return await create_file(
                 db=db,
                 file_path=file_path,
-                full_file_path=full_file_path,
-                create_dir_info=create_dir_info,
+                create_dirs_info=create_dirs_info,
                 file_obj=file_obj,
                 model=self._model,
-                user_obj=user_obj
+                user_obj=user_obj,
+                source_path=source_path,
+                limit=await get_remaining_bytes(db, user_obj.id),
+                checksum=checksum,
+                upload=upload
             )
+
+    async def get_files_by_paths(
+            self,
+            db: AsyncSession,
+            paths: list[str]
+    ) -> dict[str, ModelType]:
+        files = {}
+        for index in range(0, len(paths), IN_CLAUSE_SIZE):
+            statement = select(self._model).where(
+                self._model.path.in_(paths[index:index + IN_CLAUSE_SIZE])
+            )
+            results = await db.execute(statement=statement)
+            files.update((file.path, file) for file in results.scalars().all())
+        return files
+
+    async def create_or_put_files(
+            self,
+            db: AsyncSession,
+            user_obj: ModelType,
+            entries: list[BatchEntry]
+    ) -> tuple[list[ModelType], list[ModelType]]:
+        """
+        Returns all written files and, among them, the overwritten ones.
+        """
+        files_in_storage = await self.get_files_by_paths(
+            db=db,
+            paths=[entry.file_path for entry in entries]
+        )
+        files = await create_or_put_files(
+            db=db,
+            entries=entries,
+            files_in_storage=files_in_storage,
+            create_dirs_info=create_dirs_info,
+            model=self._model,
+            user_obj=user_obj,
+            limit=await get_remaining_bytes(db, user_obj.id)
+        )
+        return files, list(files_in_storage.values())
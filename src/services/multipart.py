@@ -0,0 +1,154 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Generic, Optional, Type, TypeVar
+
+from sqlalchemy import delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from src.core.config import app_settings
+from src.db.db import Base
+from src.models.models import MultipartUploadPart
+
+
+class Repository:
+    def create_upload(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def get_upload(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def put_part(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def delete_upload(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def get_pending_bytes(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def delete_expired_uploads(self, *args, **kwargs):
+        raise NotImplementedError
+
+
+def get_expiry_cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=app_settings.multipart_upload_ttl)
+
+
+ModelType = TypeVar("ModelType", bound=Base)
+
+
+class RepositoryMultipartUploadDB(
+    Repository,
+    Generic[
+        ModelType
+    ]
+):
+    def __init__(
+            self,
+            model: Type[ModelType]
+    ):
+        self._model = model
+
+    async def create_upload(
+            self,
+            db: AsyncSession,
+            user_obj: Base,
+            path: str,
+            part_size: int,
+            size: int,
+            storage_upload_id: Optional[str] = None
+    ) -> ModelType:
+        upload_obj = self._model(
+            user_id=user_obj.id,
+            path=path,
+            part_size=part_size,
+            size=size,
+            storage_upload_id=storage_upload_id
+        )
+        db.add(upload_obj)
+        await db.commit()
+        await db.refresh(upload_obj)
+        return upload_obj
+
+    async def get_upload(
+            self,
+            db: AsyncSession,
+            upload_id: uuid.UUID,
+            user_obj: Base
+    ) -> Optional[ModelType]:
+        statement = select(self._model).where(
+            self._model.id == upload_id,
+            self._model.user_id == user_obj.id,
+            self._model.created_at >= get_expiry_cutoff()
+        )
+        result = await db.execute(statement=statement)
+        return result.scalar_one_or_none()
+
+    async def put_part(
+            self,
+            db: AsyncSession,
+            upload_obj: ModelType,
+            part_number: int,
+            size: int,
+            sha256: str,
+            etag: Optional[str] = None
+    ) -> MultipartUploadPart:
+        part_obj = await db.merge(
+            MultipartUploadPart(
+                upload_id=upload_obj.id,
+                part_number=part_number,
+                size=size,
+                sha256=sha256,
+                etag=etag
+            )
+        )
+        await db.commit()
+        return part_obj
+
+    async def delete_upload(
+            self,
+            db: AsyncSession,
+            upload_obj: ModelType
+    ) -> None:
+        await db.delete(upload_obj)
+        await db.commit()
+
+    async def get_pending_bytes(
+            self,
+            db: AsyncSession,
+            user_obj: Base
+    ) -> int:
+        """
+        Declared size of the unexpired uploads of ``user_obj``.
+        """
+        statement = select(func.coalesce(func.sum(self._model.size), 0)).where(
+            self._model.user_id == user_obj.id,
+            self._model.created_at >= get_expiry_cutoff()
+        )
+        return (await db.execute(statement=statement)).scalar_one()
+
+    async def delete_expired_uploads(
+            self,
+            db: AsyncSession
+    ) -> list[ModelType]:
+        """
+        Deletes uploads started more than ``multipart_upload_ttl`` seconds
+        ago along with their parts and returns them.
+        """
+        statement = select(self._model).where(
+            self._model.created_at < get_expiry_cutoff()
+        )
+        uploads = (await db.execute(statement=statement)).scalars().all()
+        upload_ids = [upload_obj.id for upload_obj in uploads]
+        if upload_ids:
+            await db.execute(
+                delete(MultipartUploadPart).where(
+                    MultipartUploadPart.upload_id.in_(upload_ids)
+                )
+            )
+            await db.execute(
+                delete(self._model).where(self._model.id.in_(upload_ids))
+            )
+            await db.commit()
+        return uploads
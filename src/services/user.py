@@ -1,5 +1,5 @@
 from typing import Generic, Optional, Type, TypeVar
-from uuid import uuid1
+from uuid import UUID, uuid1
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
@@ -7,7 +7,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from src.db.db import Base
-from src.tools.password import get_password_hash
+from src.tools.password import hash_password
+from src.tools.usage import get_quota
 
 
 class Repository:
@@ -17,6 +18,9 @@ class Repository:
     def create(self, *args, **kwargs):
         raise NotImplementedError
 
+    def get_usage(self, *args, **kwargs):
+        raise NotImplementedError
+
 
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
@@ -53,8 +57,6 @@ class RepositoryUserDB(
         extra_obj_info = {}
         user_id = str(uuid1())
         extra_obj_info['id'] = user_id
-        password = obj_in_data.pop('password')
-        extra_obj_info['hashed_password'] = get_password_hash(password)
         obj_in_data.update(extra_obj_info)
         return self._model(**obj_in_data)
 
@@ -65,8 +67,35 @@ class RepositoryUserDB(
             obj_in: CreateSchemaType
     ) -> ModelType:
         obj_in_data = jsonable_encoder(obj_in)
+        obj_in_data['hashed_password'] = await hash_password(
+            obj_in_data.pop('password')
+        )
         db_obj = self.create_obj(obj_in_data)
         db.add(db_obj)
         await db.commit()
         await db.refresh(db_obj)
         return db_obj
+
+    async def get_usage(
+            self,
+            db: AsyncSession,
+            user_id: UUID
+    ) -> dict:
+        """
+        Reads the materialized usage counters of a user.
+        """
+        statement = select(
+            self._model.used_bytes,
+            self._model.files_count,
+            self._model.quota_bytes
+        ).where(
+            self._model.id == user_id
+        )
+        results = await db.execute(statement=statement)
+        used_bytes, files_count, quota_bytes = results.one()
+        return {
+            'account_id': user_id,
+            'used_bytes': used_bytes,
+            'files_count': files_count,
+            'quota_bytes': get_quota(quota_bytes)
+        }
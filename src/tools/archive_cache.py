@@ -0,0 +1,170 @@
+import hashlib
+import logging.config
+import os
+import time
+import uuid
+from typing import AsyncIterator, Iterable, Optional
+
+import anyio
+
+from src.core.config import app_settings
+from src.core.logger import LOGGING
+
+from .compression import ArchiveMember
+from .storage import open_async, remove, run_io
+
+logging.config.dictConfig(LOGGING)
+logger = logging.getLogger('tools-archive-cache')
+
+LOCK_SUFFIX = '.lock'
+TEMP_SUFFIX = '.tmp'
+
+
+def get_archive_version(
+        path: str,
+        compression_type: str,
+        members: Iterable[ArchiveMember]
+) -> str:
+    """
+    Hash of the archive parameters and of the name, size and mtime of
+    every member, so any change in the tree yields a new cache entry.
+    """
+    version = hashlib.sha256(f'{path}\0{compression_type}\0'.encode())
+    for member in members:
+        version.update(
+            f'{member.arcname}\0{member.size}\0{member.mtime!r}\0'
+            f'{member.manifest or ""}\n'.encode()
+        )
+    return version.hexdigest()
+
+
+def get_cached_archive_path(version: str, compression_type: str) -> str:
+    return os.path.join(
+        app_settings.archive_cache_folder_path,
+        f'{version}.{compression_type}'
+    )
+
+
+def open_cached_archive(archive_path: str) -> Optional[int]:
+    """
+    Returns the size of a cached archive and marks it as recently used,
+    or None when it is not cached.
+    """
+    try:
+        os.utime(archive_path)
+        return os.path.getsize(archive_path)
+    except FileNotFoundError:
+        return None
+
+
+def acquire_fill_lock(archive_path: str) -> bool:
+    lock_path = archive_path + LOCK_SUFFIX
+    os.makedirs(app_settings.archive_cache_folder_path, exist_ok=True)
+    for _ in range(2):
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                lock_age = time.time() - os.path.getmtime(lock_path)
+            except FileNotFoundError:
+                continue
+            if lock_age < app_settings.archive_cache_lock_timeout:
+                return False
+            # The process filling this entry died, take the lock over.
+            logger.warning('Remove stale archive cache lock %s', lock_path)
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+    return False
+
+
+def release_fill_lock(archive_path: str) -> None:
+    try:
+        os.remove(archive_path + LOCK_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+
+def remove_cache_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def scan_archives() -> list[tuple[float, int, str]]:
+    """
+    The (mtime, size, path) of every cached archive. Partial archives
+    and locks left for longer than ``archive_cache_lock_timeout`` by
+    fills that never finished are removed on the way.
+    """
+    entries = []
+    stale_time = time.time() - app_settings.archive_cache_lock_timeout
+    with os.scandir(app_settings.archive_cache_folder_path) as scan:
+        for entry in scan:
+            try:
+                entry_stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if not entry.name.endswith((LOCK_SUFFIX, TEMP_SUFFIX)):
+                entries.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+            elif entry_stat.st_mtime < stale_time:
+                logger.warning('Remove stale archive cache file %s', entry.path)
+                remove_cache_file(entry.path)
+    return entries
+
+
+def evict_archives() -> None:
+    """
+    Removes the least recently used archives until the cache fits into
+    its byte budget.
+    """
+    entries = scan_archives()
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= app_settings.archive_cache_max_size:
+            break
+        logger.info('Evict cached archive %s', path)
+        remove_cache_file(path)
+        total_size -= size
+
+
+async def fill_archive_cache(
+        chunks: AsyncIterator[bytes],
+        archive_path: str
+) -> AsyncIterator[bytes]:
+    """
+    Passes archive chunks through while writing them to a temporary
+    file, which becomes the cache entry once the archive is complete.
+    When another request is already filling the same entry the chunks
+    are passed through only. Cleanup is shielded from the cancellation
+    of a disconnected client, which would otherwise cancel it too and
+    leave the temporary file and the lock behind.
+    """
+    try:
+        if not await run_io(acquire_fill_lock, archive_path):
+            async for chunk in chunks:
+                yield chunk
+            return
+        temp_path = f'{archive_path}.{uuid.uuid4().hex}{TEMP_SUFFIX}'
+        try:
+            temp_file = await open_async(temp_path, 'wb')
+            try:
+                async for chunk in chunks:
+                    await run_io(temp_file.write, chunk)
+                    yield chunk
+            finally:
+                with anyio.CancelScope(shield=True):
+                    await run_io(temp_file.close)
+            await run_io(os.replace, temp_path, archive_path)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await remove(temp_path)
+                await run_io(release_fill_lock, archive_path)
+        logger.info('Cache archive %s', archive_path)
+        await run_io(evict_archives)
+    finally:
+        with anyio.CancelScope(shield=True):
+            await chunks.aclose()
@@ -0,0 +1,297 @@
+"""
+Backends holding the contents of stored files, addressed by file path.
+Deduplicated blobs, staged batch uploads and cached archives stay on the
+local disk of each node whatever the backend. Multipart uploads are
+staged there too, unless the backend takes their parts itself, as S3
+does without deduplication.
+"""
+from typing import AsyncIterator, BinaryIO, Iterable, NamedTuple, Optional
+
+from fastapi import HTTPException, status
+
+from src.core.config import app_settings
+
+from .base import check_quota, get_full_path
+from .checksum import Checksum, read_chunk
+from .s3 import S3Client
+from .storage import (
+    iter_file,
+    makedirs,
+    move,
+    open_async,
+    remove,
+    run_io,
+    write_file
+)
+
+
+def read_part(src: BinaryIO, size: int, checksum: Checksum) -> bytes:
+    """
+    Reads ``size`` bytes of ``src``, fewer only at its end.
+    """
+    parts = []
+    while size > 0 and (data := read_chunk(src, size, checksum)):
+        parts.append(data)
+        size -= len(data)
+    return b''.join(parts)
+
+
+class BackendUpload(NamedTuple):
+    """
+    A multipart upload whose parts the storage backend holds, with the
+    tag it returned for each part.
+    """
+    upload_id: str
+    etags: list[str]
+    size: int
+
+
+class StorageBackend:
+    local = False
+
+    async def write(self, *args, **kwargs) -> Checksum:
+        raise NotImplementedError
+
+    async def store(self, *args, **kwargs) -> Checksum:
+        raise NotImplementedError
+
+    def read(self, *args, **kwargs) -> AsyncIterator[bytes]:
+        raise NotImplementedError
+
+    async def delete(self, *args, **kwargs) -> None:
+        raise NotImplementedError
+
+    async def create_upload(self, *args, **kwargs) -> Optional[str]:
+        raise NotImplementedError
+
+    async def write_part(self, *args, **kwargs) -> str:
+        raise NotImplementedError
+
+    async def complete_upload(self, *args, **kwargs) -> Checksum:
+        raise NotImplementedError
+
+    async def abort_upload(self, *args, **kwargs) -> None:
+        raise NotImplementedError
+
+    async def makedirs(self, *args, **kwargs) -> None:
+        raise NotImplementedError
+
+    def get_download_url(self, *args, **kwargs) -> str:
+        raise NotImplementedError
+
+    def get_member_url(self, *args, **kwargs) -> Optional[str]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalStorage(StorageBackend):
+    """
+    Files under ``files_folder_path``, served by nginx from ``static_url``.
+    """
+    local = True
+
+    async def write(
+            self,
+            path: str,
+            src: BinaryIO,
+            limit: Optional[int] = None
+    ) -> Checksum:
+        return await write_file(src, get_full_path(path), limit=limit)
+
+    async def store(
+            self,
+            path: str,
+            source_path: str,
+            checksum: Checksum
+    ) -> Checksum:
+        await move(source_path, get_full_path(path))
+        return checksum
+
+    def read(self, path: str, start: int, length: int) -> AsyncIterator[bytes]:
+        return iter_file(get_full_path(path), start, length)
+
+    async def delete(self, path: str) -> None:
+        await remove(get_full_path(path))
+
+    async def create_upload(self, path: str, part_size: int, size: int) -> Optional[str]:
+        # Parts are staged on the local disk next to the files.
+        return None
+
+    async def makedirs(self, paths: Iterable[str]) -> None:
+        await makedirs(get_full_path(path) for path in paths)
+
+    def get_download_url(self, path: str) -> str:
+        return app_settings.static_url + path
+
+    def get_member_url(self, path: str) -> Optional[str]:
+        # Compression workers read local files directly.
+        return None
+
+
+class S3Storage(StorageBackend):
+    """
+    Objects of an S3-compatible bucket, keyed by file path. Uploads are
+    streamed in ``s3_part_size`` parts and downloads redirect to
+    presigned URLs, so any node can serve any file.
+    """
+
+    def __init__(self, client: S3Client):
+        self.client = client
+
+    @staticmethod
+    def get_key(path: str) -> str:
+        return path.lstrip('/')
+
+    async def write(
+            self,
+            path: str,
+            src: BinaryIO,
+            limit: Optional[int] = None
+    ) -> Checksum:
+        key = self.get_key(path)
+        part_size = app_settings.s3_part_size
+        checksum = Checksum()
+        data = await run_io(read_part, src, part_size, checksum)
+        check_quota(checksum.size, limit)
+        if len(data) < part_size:
+            await self.client.put_object(key, data)
+            return checksum
+        upload_id = await self.client.create_multipart_upload(key)
+        etags = []
+        try:
+            while data:
+                etags.append(
+                    await self.client.upload_part(key, upload_id, len(etags) + 1, data)
+                )
+                data = await run_io(read_part, src, part_size, checksum)
+                check_quota(checksum.size, limit)
+            await self.client.complete_multipart_upload(key, upload_id, etags)
+        except BaseException:
+            await self.client.abort_multipart_upload(key, upload_id)
+            raise
+        return checksum
+
+    async def store(
+            self,
+            path: str,
+            source_path: str,
+            checksum: Checksum
+    ) -> Checksum:
+        source = await open_async(source_path)
+        try:
+            await self.write(path, source)
+        finally:
+            await run_io(source.close)
+        await remove(source_path)
+        return checksum
+
+    def read(self, path: str, start: int, length: int) -> AsyncIterator[bytes]:
+        return self.client.iter_object(
+            self.get_key(path),
+            start,
+            length,
+            app_settings.download_chunk_size
+        )
+
+    async def delete(self, path: str) -> None:
+        await self.client.delete_object(self.get_key(path))
+
+    async def create_upload(self, path: str, part_size: int, size: int) -> Optional[str]:
+        """
+        Starts an S3 multipart upload, so parts can land on any node.
+        S3 rejects parts below ``s3_min_part_size`` but the last one, and
+        each part is held in memory while it is sent.
+        """
+        if size > part_size and part_size < app_settings.s3_min_part_size:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f'Part size must be at least {app_settings.s3_min_part_size} bytes.'
+            )
+        if min(part_size, size) > app_settings.s3_max_part_size:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f'Part size must be at most {app_settings.s3_max_part_size} bytes.'
+            )
+        return await self.client.create_multipart_upload(self.get_key(path))
+
+    async def write_part(
+            self,
+            path: str,
+            upload_id: str,
+            part_number: int,
+            data: bytes,
+            sha256: str
+    ) -> str:
+        return await self.client.upload_part(
+            self.get_key(path), upload_id, part_number, data, sha256
+        )
+
+    async def complete_upload(
+            self,
+            path: str,
+            upload: BackendUpload,
+            checksum: Checksum
+    ) -> Checksum:
+        """
+        Completes the upload into the object at ``path``. ``checksum``
+        covers the leading bytes hashed as the parts arrived, the rest
+        is read back from the object.
+        """
+        await self.client.complete_multipart_upload(
+            self.get_key(path), upload.upload_id, upload.etags
+        )
+        async for data in self.read(path, checksum.size, upload.size - checksum.size):
+            checksum.update(data)
+        return checksum
+
+    async def abort_upload(self, path: str, upload_id: str) -> None:
+        await self.client.abort_multipart_upload(self.get_key(path), upload_id)
+
+    async def makedirs(self, paths: Iterable[str]) -> None:
+        # Keys have no directories to create.
+        pass
+
+    def get_download_url(self, path: str) -> str:
+        return self.client.presign(self.get_key(path), app_settings.s3_presign_ttl)
+
+    def get_member_url(self, path: str) -> Optional[str]:
+        return self.get_download_url(path)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+def create_s3_storage() -> S3Storage:
+    return S3Storage(
+        S3Client(
+            endpoint_url=app_settings.s3_endpoint_url,
+            bucket=app_settings.s3_bucket,
+            access_key=app_settings.s3_access_key,
+            secret_key=app_settings.s3_secret_key,
+            region=app_settings.s3_region
+        )
+    )
+
+
+STORAGE_BACKENDS = {
+    'local': LocalStorage,
+    's3': create_s3_storage
+}
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        _storage = STORAGE_BACKENDS[app_settings.storage_backend]()
+    return _storage
+
+
+async def close_storage() -> None:
+    global _storage
+    if _storage is not None:
+        await _storage.close()
+        _storage = None
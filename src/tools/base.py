@@ -1,3 +1,7 @@
+from typing import Optional
+
+from fastapi import HTTPException, status
+
 from src.core.config import app_settings
 
 
@@ -5,3 +9,18 @@ def get_full_path(path: str):
     return app_settings.files_folder_path + path
 
 
+def glob_to_like(pattern: str, escape: str = '\\') -> str:
+    """
+    Translates a ``*``/``?`` glob into a LIKE pattern escaped with ``escape``.
+    """
+    for symbol in (escape, '%', '_'):
+        pattern = pattern.replace(symbol, escape + symbol)
+    return pattern.replace('*', '%').replace('?', '_')
+
+
+def check_quota(size: int, limit: Optional[int]) -> None:
+    if limit is not None and size > limit:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail='Storage quota exceeded.'
+        )
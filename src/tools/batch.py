@@ -0,0 +1,107 @@
+import os
+import posixpath
+import tarfile
+import tempfile
+from typing import BinaryIO, Optional
+
+from fastapi import HTTPException, UploadFile, status
+
+from src.core.config import app_settings
+
+from .checksum import Checksum, read_chunk
+from .file_create import BatchEntry
+from .storage import run_io
+
+
+def get_entry_path(directory: str, name: str) -> str:
+    """
+    Path of a batch member named ``name`` relative to ``directory``.
+    Names may contain subdirectories but must stay inside ``directory``.
+    """
+    name = posixpath.normpath(name.replace('\\', '/'))
+    if name.startswith(('/', '../')) or name in ('.', '..', ''):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Invalid file name {name}.'
+        )
+    return directory.rstrip('/') + '/' + name
+
+
+def check_batch_size(count: int) -> None:
+    if not count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='No files to upload.'
+        )
+    if count > app_settings.batch_upload_max_files:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'At most {app_settings.batch_upload_max_files} files '
+                   f'can be uploaded at once.'
+        )
+
+
+def extract_archive(
+        archive: BinaryIO,
+        directory: str,
+        staging_dir: str
+) -> dict[str, tuple[str, Checksum]]:
+    """
+    Reads a tar stream (optionally compressed) member by member and
+    writes its regular files into ``staging_dir``, hashing them on the
+    way. Returns the staged file and its checksum for every target path,
+    later members replacing earlier ones.
+    """
+    staged = {}
+    try:
+        with tarfile.open(fileobj=archive, mode='r|*') as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                file_path = get_entry_path(directory, member.name)
+                source = tar.extractfile(member)
+                fd, staging_path = tempfile.mkstemp(dir=staging_dir)
+                checksum = Checksum()
+                with os.fdopen(fd, 'wb') as staging_file:
+                    while data := read_chunk(source, app_settings.upload_chunk_size, checksum):
+                        staging_file.write(data)
+                staged[file_path] = staging_path, checksum
+                if len(staged) > app_settings.batch_upload_max_files:
+                    check_batch_size(len(staged))
+    except tarfile.TarError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Archive must be a tar file.'
+        )
+    return staged
+
+
+async def get_batch_entries(
+        directory: str,
+        files: Optional[list[UploadFile]],
+        archive: Optional[UploadFile],
+        staging_dir: str
+) -> list[BatchEntry]:
+    entries = {}
+    for file in files or []:
+        file_path = get_entry_path(directory, file.filename)
+        entries[file_path] = BatchEntry(file_path=file_path, file_obj=file)
+    if archive is not None:
+        staged = await run_io(extract_archive, archive.file, directory, staging_dir)
+        for file_path, (staging_path, checksum) in staged.items():
+            entries[file_path] = BatchEntry(
+                file_path=file_path,
+                source_path=staging_path,
+                checksum=checksum
+            )
+    check_batch_size(len(entries))
+    return list(entries.values())
+
+
+def make_staging_dir() -> str:
+    os.makedirs(app_settings.multipart_folder_path, exist_ok=True)
+    return tempfile.mkdtemp(dir=app_settings.multipart_folder_path)
+
+
+async def create_staging_dir() -> str:
+    return await run_io(make_staging_dir)
@@ -0,0 +1,200 @@
+import bisect
+import hashlib
+import io
+import os
+import uuid
+from typing import AsyncIterator, Optional
+
+from fastapi import UploadFile
+
+from src.core.config import app_settings
+
+from .base import check_quota
+from .checksum import Checksum, read_chunk
+from .storage import run_io
+
+# FastCDC cut points: a chunk ends where the Gear rolling hash of the
+# last 64 bytes has its top bits clear, so boundaries depend only on the
+# nearby content and an insertion shifts just the chunks around it. The
+# mask is stricter before chunk_avg_size and looser after it, which
+# keeps chunk sizes close to the average.
+GEAR = [
+    int.from_bytes(hashlib.sha256(bytes([byte])).digest()[:8], 'big')
+    for byte in range(256)
+]
+GEAR_WINDOW = 64
+HASH_MASK = (1 << 64) - 1
+
+
+def get_cut_mask(bits: int) -> int:
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+def get_chunk_path(digest: str) -> str:
+    return os.path.join(
+        app_settings.blobs_folder_path,
+        digest[:2],
+        digest[2:4],
+        digest
+    )
+
+
+def find_cut_point(buffer: bytes, start: int, final: bool) -> int:
+    """
+    End of the chunk starting at ``start``, or ``start`` if more data
+    is needed to decide.
+    """
+    available = len(buffer) - start
+    if available <= app_settings.chunk_min_size:
+        return len(buffer) if final else start
+    end = start + min(available, app_settings.chunk_max_size)
+    normal = min(start + app_settings.chunk_avg_size, end)
+    bits = app_settings.chunk_avg_size.bit_length() - 1
+    position = start + app_settings.chunk_min_size
+    gear = GEAR
+    digest = 0
+    for byte in buffer[max(position - GEAR_WINDOW, start):position]:
+        digest = ((digest << 1) + gear[byte]) & HASH_MASK
+    for limit, mask in ((normal, get_cut_mask(bits + 2)), (end, get_cut_mask(bits - 2))):
+        for byte in buffer[position:limit]:
+            digest = ((digest << 1) + gear[byte]) & HASH_MASK
+            position += 1
+            if not digest & mask:
+                return position
+    if available >= app_settings.chunk_max_size:
+        return end
+    return len(buffer) if final else start
+
+
+def store_chunk(data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    chunk_path = get_chunk_path(digest)
+    if not os.path.exists(chunk_path):
+        os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+        tmp_path = f'{chunk_path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as chunk_file:
+            chunk_file.write(data)
+        os.replace(tmp_path, chunk_path)
+    return digest
+
+
+def store_chunks(buffer: bytes, final: bool) -> tuple[list[tuple[str, int]], int]:
+    """
+    Cuts as many chunks as possible off the head of ``buffer`` and stores
+    them. Returns the manifest entries and the number of consumed bytes.
+    """
+    entries = []
+    offset = 0
+    while offset < len(buffer):
+        cut = find_cut_point(buffer, offset, final)
+        if cut == offset:
+            break
+        chunk = buffer[offset:cut]
+        entries.append((store_chunk(chunk), len(chunk)))
+        offset = cut
+    return entries, offset
+
+
+def load_manifest(manifest: str) -> list[tuple[str, int]]:
+    with open(get_chunk_path(manifest), 'r') as manifest_file:
+        return [
+            (digest, int(size))
+            for digest, size in (line.split() for line in manifest_file)
+        ]
+
+
+async def write_blob(
+        file_obj: UploadFile,
+        limit: Optional[int] = None
+) -> tuple[Checksum, str]:
+    """
+    Splits the upload into content-defined chunks, stores every chunk once
+    by its hash and returns the checksum of the upload and the digest of
+    the chunk manifest. Stops as soon as the upload grows past ``limit``
+    bytes.
+    """
+    entries = []
+    buffer = b''
+    checksum = Checksum()
+    while True:
+        data = await run_io(
+            read_chunk, file_obj.file, app_settings.blob_read_size, checksum
+        )
+        check_quota(checksum.size, limit)
+        buffer += data
+        stored, consumed = await run_io(store_chunks, buffer, not data)
+        entries.extend(stored)
+        buffer = buffer[consumed:]
+        if not data:
+            break
+    manifest = ''.join(f'{digest} {size}\n' for digest, size in entries)
+    manifest_digest = await run_io(store_chunk, manifest.encode())
+    return checksum, manifest_digest
+
+
+class BlobReader(io.RawIOBase):
+    """
+    Seekable read-only view of a blob reassembled from its chunks.
+    """
+
+    def __init__(self, manifest: str):
+        super().__init__()
+        self._entries = load_manifest(manifest)
+        self._offsets = []
+        offset = 0
+        for _, size in self._entries:
+            self._offsets.append(offset)
+            offset += size
+        self._size = offset
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._position = max(offset, 0)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        if self._position >= self._size:
+            return 0
+        index = bisect.bisect_right(self._offsets, self._position) - 1
+        digest, size = self._entries[index]
+        start = self._position - self._offsets[index]
+        length = min(len(buffer), size - start)
+        with open(get_chunk_path(digest), 'rb') as chunk_file:
+            chunk_file.seek(start)
+            data = chunk_file.read(length)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+async def iter_blob(
+        manifest: str,
+        start: int = 0,
+        length: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    reader = await run_io(BlobReader, manifest)
+    with reader:
+        reader.seek(start)
+        while length is None or length > 0:
+            read_size = app_settings.blob_read_size
+            if length is not None:
+                read_size = min(read_size, length)
+            data = await run_io(reader.read, read_size)
+            if not data:
+                break
+            if length is not None:
+                length -= len(data)
+            yield data
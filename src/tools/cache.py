@@ -1,11 +1,59 @@
+import asyncio
+import contextlib
+import functools
 import json
+import logging.config
+import math
+import random
+import time
 import uuid
 from datetime import datetime
-from typing import Callable, Type
+from typing import AsyncIterator, Awaitable, Callable, Optional, Type
 
+import redis.asyncio as redis
 from fastapi_cache import caches
 from fastapi_cache.backends.redis import CACHE_KEY, RedisCacheBackend
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import app_settings
+from src.core.logger import LOGGING
+
+from .local_cache import LocalCache
+from .metrics import cache_hits, cache_misses, redis_command_seconds
+
+logging.config.dictConfig(LOGGING)
+logger = logging.getLogger('tools-cache')
+
+INVALIDATION_RETRY_DELAY = 1
+VERSION_BATCH_SIZE = 500
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Identifies this process in invalidation messages, so it does not
+# drop the entries it has just written itself.
+INSTANCE_ID = uuid.uuid4().hex
+
+local_cache = LocalCache(
+    max_entries=app_settings.local_cache_max_entries,
+    ttl=app_settings.local_cache_ttl
+)
+
+# Load duration and expiry of the keys loaded by this process, used to
+# refresh them before they expire.
+refresh_info = LocalCache(
+    max_entries=app_settings.local_cache_max_entries,
+    ttl=math.inf
+)
+
+_redis_client: Optional[redis.Redis] = None
+_invalidation_listener: Optional[asyncio.Task] = None
+_loads: dict[str, asyncio.Task] = {}
 
 
 def redis_cache():
@@ -20,46 +68,324 @@ def serialized_data(value):
     return value
 
 
+def get_redis_client() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.from_url(
+            app_settings.redis_url,
+            decode_responses=True
+        )
+    return _redis_client
+
+
+async def publish_invalidation(*redis_keys: str):
+    if not app_settings.local_cache:
+        return
+    with redis_command_seconds.time(command='publish'):
+        await get_redis_client().publish(
+            app_settings.cache_invalidation_channel,
+            f'{INSTANCE_ID} {json.dumps(redis_keys)}'
+        )
+
+
+async def listen_invalidations():
+    """
+    Drops local entries changed by other processes. Messages sent while
+    the subscription is down are lost, so the local tier is cleared on
+    every reconnect.
+    """
+    while True:
+        try:
+            async with get_redis_client().pubsub() as pubsub:
+                await pubsub.subscribe(app_settings.cache_invalidation_channel)
+                local_cache.clear()
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    sender, _, redis_keys = message['data'].partition(' ')
+                    if sender == INSTANCE_ID:
+                        continue
+                    for redis_key in json.loads(redis_keys):
+                        local_cache.delete(redis_key)
+        except (redis.ConnectionError, OSError):
+            logger.exception('Cache invalidation subscription lost')
+            local_cache.clear()
+            await asyncio.sleep(INVALIDATION_RETRY_DELAY)
+
+
+def start_invalidation_listener():
+    global _invalidation_listener
+    if app_settings.local_cache:
+        _invalidation_listener = asyncio.create_task(listen_invalidations())
+
+
+async def stop_invalidation_listener():
+    global _redis_client, _invalidation_listener
+    if _invalidation_listener is not None:
+        _invalidation_listener.cancel()
+        _invalidation_listener = None
+    if _redis_client is not None:
+        await _redis_client.close()
+        _redis_client = None
+
+
 async def set_cache(
         cache: RedisCacheBackend,
         data: dict,
         redis_key: str,
         expire: int = 30
 ):
-    await cache.set(
-        key=redis_key,
-        value=json.dumps(data, default=serialized_data),
-        expire=expire
-    )
+    value = json.dumps(data, default=serialized_data)
+    with redis_command_seconds.time(command='set'):
+        await cache.set(
+            key=redis_key,
+            value=value,
+            expire=expire
+        )
+    if app_settings.local_cache:
+        local_cache.set(redis_key, json.loads(value), expire)
+        await publish_invalidation(redis_key)
+
+
+async def delete_cache(cache: RedisCacheBackend, redis_key: str):
+    with redis_command_seconds.time(command='delete'):
+        await cache.delete(redis_key)
+    local_cache.delete(redis_key)
+    await publish_invalidation(redis_key)
+
+
+async def get_version(version_key: str) -> str:
+    """
+    Current version of a group of cache entries, read through the same
+    client as ``bump_versions`` writes it. Versions are random, so a
+    version key lost from Redis never brings old entries back.
+    """
+    if app_settings.local_cache:
+        version = local_cache.get(version_key)
+        if version is not None:
+            return version
+    client = get_redis_client()
+    with redis_command_seconds.time(command='get'):
+        version = await client.get(version_key)
+    if version is None:
+        with redis_command_seconds.time(command='set'):
+            await client.set(version_key, json.dumps(uuid.uuid4().hex), nx=True)
+        with redis_command_seconds.time(command='get'):
+            version = await client.get(version_key)
+    version = json.loads(version)
+    if app_settings.local_cache:
+        local_cache.set(version_key, version)
+    return version
+
+
+async def bump_versions(version_keys: list[str]):
+    """
+    Moves every entry keyed with the versions of ``version_keys`` out of
+    reach; the stale entries are left to expire. Keys are written in
+    pipelined batches, with one invalidation message per batch.
+    """
+    for index in range(0, len(version_keys), VERSION_BATCH_SIZE):
+        batch = version_keys[index:index + VERSION_BATCH_SIZE]
+        async with get_redis_client().pipeline(transaction=False) as pipe:
+            for version_key in batch:
+                pipe.set(version_key, json.dumps(uuid.uuid4().hex))
+            with redis_command_seconds.time(command='pipeline'):
+                await pipe.execute()
+        for version_key in batch:
+            local_cache.delete(version_key)
+        await publish_invalidation(*batch)
+
+
+def get_key_family(redis_key: str) -> str:
+    """
+    Kind of a cache key, such as ``file_info`` for
+    ``file_info_for_<path>_<version>``.
+    """
+    return redis_key.split('_for_', 1)[0]
 
 
 async def get_cache(cache: RedisCacheBackend, redis_key: str) -> dict:
-    data = await cache.get(redis_key)
+    family = get_key_family(redis_key)
+    if app_settings.local_cache:
+        data = local_cache.get(redis_key)
+        if data is not None:
+            cache_hits.inc(tier='local', family=family)
+            return data
+        cache_misses.inc(tier='local', family=family)
+    with redis_command_seconds.time(command='get'):
+        data = await cache.get(redis_key)
     if data:
+        cache_hits.inc(tier='redis', family=family)
         data = json.loads(data)
+        if app_settings.local_cache:
+            local_cache.set(redis_key, data)
+    else:
+        cache_misses.inc(tier='redis', family=family)
     return data
 
 
+def should_refresh_early(redis_key: str) -> bool:
+    """
+    Probabilistic early expiration (XFetch): the closer the key is to
+    expiry and the slower it is to load, the more likely a read is to
+    reload it ahead of time.
+    """
+    beta = app_settings.cache_early_refresh_beta
+    info = refresh_info.get(redis_key)
+    if beta <= 0 or info is None:
+        return False
+    delta, expires_at = info
+    return time.monotonic() - delta * beta * math.log(1 - random.random()) >= expires_at
+
+
+async def acquire_cache_lock(redis_key: str) -> Optional[str]:
+    token = uuid.uuid4().hex
+    with redis_command_seconds.time(command='set'):
+        acquired = await get_redis_client().set(
+            f'lock:{redis_key}',
+            token,
+            nx=True,
+            px=int(app_settings.cache_lock_timeout * 1000)
+        )
+    return token if acquired else None
+
+
+async def release_cache_lock(redis_key: str, token: str):
+    with redis_command_seconds.time(command='eval'):
+        await get_redis_client().eval(
+            RELEASE_LOCK_SCRIPT, 1, f'lock:{redis_key}', token
+        )
+
+
+async def wait_for_cache(cache: RedisCacheBackend, redis_key: str) -> Optional[dict]:
+    deadline = time.monotonic() + app_settings.cache_lock_timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(app_settings.cache_lock_poll_interval)
+        with redis_command_seconds.time(command='get'):
+            data = await cache.get(redis_key)
+        if data:
+            return json.loads(data)
+    return None
+
+
+@contextlib.asynccontextmanager
+async def own_sessions(args: tuple, kwargs: dict) -> AsyncIterator[tuple[tuple, dict]]:
+    """
+    Replaces the sessions among ``args`` and ``kwargs`` with new ones on
+    the same engines. A shared load outlives the request that started
+    it, and that request closes its session when it goes away.
+    """
+    sessions = []
+
+    def replace(value):
+        if isinstance(value, AsyncSession):
+            value = AsyncSession(bind=value.bind, expire_on_commit=False)
+            sessions.append(value)
+        return value
+
+    try:
+        yield (
+            tuple(replace(value) for value in args),
+            {name: replace(value) for name, value in kwargs.items()}
+        )
+    finally:
+        for session in sessions:
+            await session.close()
+
+
+async def load_data(
+        redis_key: str,
+        cache: RedisCacheBackend,
+        db_func_obj: Callable,
+        data_schema: Optional[Type[BaseModel]],
+        db_func_args: tuple,
+        db_func_kwargs: dict,
+        cache_expire: int,
+        stale_data: Optional[dict] = None
+):
+    token = None
+    if app_settings.cache_lock:
+        token = await acquire_cache_lock(redis_key)
+        if token is None:
+            # Another worker is loading this key.
+            if stale_data:
+                return stale_data
+            data = await wait_for_cache(cache, redis_key)
+            if data:
+                return data
+    try:
+        started_at = time.monotonic()
+        async with own_sessions(db_func_args, db_func_kwargs) as (args, kwargs):
+            data = await db_func_obj(*args, **kwargs)
+            if data and data_schema:
+                data = data_schema.from_orm(data).dict()
+        if not data:
+            return None
+        await set_cache(
+            cache=cache,
+            data=data,
+            redis_key=redis_key,
+            expire=cache_expire
+        )
+        finished_at = time.monotonic()
+        refresh_info.set(
+            redis_key,
+            (finished_at - started_at, finished_at + cache_expire),
+            cache_expire
+        )
+        return data
+    finally:
+        if token:
+            await release_cache_lock(redis_key, token)
+
+
+def forget_load(redis_key: str, task: asyncio.Task):
+    _loads.pop(redis_key, None)
+    if not task.cancelled():
+        # Mark the exception as retrieved when every waiter has gone.
+        task.exception()
+
+
+async def load_once(redis_key: str, loader: Callable[[], Awaitable]):
+    """
+    Coalesces concurrent loads of one key: the first caller starts the
+    loader, the others wait for its result. The load is shielded, so a
+    cancelled caller does not fail the others.
+    """
+    task = _loads.get(redis_key)
+    if task is None:
+        task = asyncio.ensure_future(loader())
+        _loads[redis_key] = task
+        task.add_done_callback(functools.partial(forget_load, redis_key))
+    return await asyncio.shield(task)
+
+
 async def get_cache_or_data(
         redis_key: str,
         cache: RedisCacheBackend,
         db_func_obj: Callable,
-        data_schema: Type[BaseModel],
+        data_schema: Optional[Type[BaseModel]] = None,
         db_func_args: tuple = (),
         db_func_kwargs: dict = {},
         cache_expire: int = 30
 ):
+    """
+    Without ``data_schema`` the result of ``db_func_obj`` is cached as is.
+    """
     data = await get_cache(cache, redis_key)
-    if not data:
-        data = await db_func_obj(*db_func_args, **db_func_kwargs)
-        if data:
-            data = data_schema.from_orm(data).dict()
-            await set_cache(
-                cache=cache,
-                data=data,
-                redis_key=redis_key,
-                expire=cache_expire
-            )
-        else:
-            return None
-    return data
+    if data and not should_refresh_early(redis_key):
+        return data
+    return await load_once(
+        redis_key,
+        functools.partial(
+            load_data,
+            redis_key=redis_key,
+            cache=cache,
+            db_func_obj=db_func_obj,
+            data_schema=data_schema,
+            db_func_args=db_func_args,
+            db_func_kwargs=db_func_kwargs,
+            cache_expire=cache_expire,
+            stale_data=data
+        )
+    )
@@ -0,0 +1,66 @@
+import hashlib
+import zlib
+from typing import BinaryIO, Iterable, Optional
+
+from src.core.config import app_settings
+
+
+class Checksum:
+    """
+    Size, SHA-256 and, when ``checksum_crc32`` is on, CRC32 of a stream,
+    updated chunk by chunk as the stream is copied.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._crc32 = 0 if app_settings.checksum_crc32 else None
+
+    def copy(self) -> 'Checksum':
+        other = Checksum.__new__(Checksum)
+        other.size = self.size
+        other._sha256 = self._sha256.copy()
+        other._crc32 = self._crc32
+        return other
+
+    def update(self, data: bytes) -> None:
+        self.size += len(data)
+        self._sha256.update(data)
+        if self._crc32 is not None:
+            self._crc32 = zlib.crc32(data, self._crc32)
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    @property
+    def crc32(self) -> Optional[int]:
+        return self._crc32
+
+
+def read_chunk(src: BinaryIO, size: int, checksum: Checksum) -> bytes:
+    data = src.read(size)
+    checksum.update(data)
+    return data
+
+
+def checksum_range(
+        path: str,
+        offset: int,
+        length: int,
+        checksums: Iterable[Checksum]
+) -> None:
+    """
+    Feeds ``length`` bytes of ``path`` starting at ``offset`` to every
+    one of ``checksums``.
+    """
+    checksums = list(checksums)
+    with open(path, 'rb') as src:
+        src.seek(offset)
+        while length > 0:
+            data = src.read(min(length, app_settings.io_buffer_size))
+            if not data:
+                break
+            length -= len(data)
+            for checksum in checksums:
+                checksum.update(data)
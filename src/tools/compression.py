@@ -0,0 +1,368 @@
+import collections
+import gzip
+import io
+import logging.config
+import os
+import queue
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional
+)
+
+import py7zr
+
+from src.core.config import app_settings
+from src.core.logger import LOGGING
+
+from .blobs import BlobReader
+from .s3 import UrlReader
+
+logging.config.dictConfig(LOGGING)
+logger = logging.getLogger('tools-compression')
+
+QUEUE_POLL_TIMEOUT = 0.5
+MEMBER_MODE = 0o644
+ZIP_MIN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+class ArchiveCancelled(Exception):
+    pass
+
+
+class ChunkWriter(io.RawIOBase):
+    """
+    Write-only, non-seekable stream which hands archive bytes over
+    to the consumer in chunks of ``chunk_size`` through a bounded queue.
+    """
+
+    def __init__(
+            self,
+            chunks: queue.Queue,
+            cancel_event: threading.Event,
+            chunk_size: int = app_settings.archive_chunk_size
+    ):
+        super().__init__()
+        self._chunks = chunks
+        self._cancel_event = cancel_event
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._position = 0
+        self._cancelled = False
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def write(self, data) -> int:
+        if self._cancelled:
+            # Archive writers still emit trailers while unwinding.
+            return len(data)
+        self._buffer += data
+        self._position += len(data)
+        while len(self._buffer) >= self._chunk_size:
+            self.put(bytes(self._buffer[:self._chunk_size]))
+            del self._buffer[:self._chunk_size]
+        return len(data)
+
+    def put(self, item) -> None:
+        while True:
+            if self._cancel_event.is_set():
+                self._cancelled = True
+                raise ArchiveCancelled
+            try:
+                self._chunks.put(item, timeout=QUEUE_POLL_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self) -> None:
+        if self._buffer:
+            self.put(bytes(self._buffer))
+            self._buffer.clear()
+        self.put(b'')
+
+
+class ArchiveMember(NamedTuple):
+    path: str
+    arcname: str
+    size: int
+    mtime: float
+    manifest: Optional[str] = None
+    url: Optional[str] = None
+
+
+def open_member(member: ArchiveMember) -> BinaryIO:
+    if member.manifest:
+        return io.BufferedReader(
+            BlobReader(member.manifest),
+            app_settings.archive_chunk_size
+        )
+    if member.url:
+        return io.BufferedReader(
+            UrlReader(member.url, member.size),
+            app_settings.archive_chunk_size
+        )
+    return open(member.path, 'rb')
+
+
+def scan_directory(directory: str, prefix: str = '') -> Iterator[ArchiveMember]:
+    with os.scandir(directory) as entries:
+        entries = sorted(entries, key=lambda entry: entry.name)
+    for entry in entries:
+        arcname = prefix + entry.name
+        if entry.is_dir(follow_symlinks=False):
+            yield from scan_directory(entry.path, arcname + '/')
+        elif entry.is_file(follow_symlinks=False):
+            entry_stat = entry.stat(follow_symlinks=False)
+            yield ArchiveMember(
+                path=entry.path,
+                arcname=arcname,
+                size=entry_stat.st_size,
+                mtime=entry_stat.st_mtime
+            )
+
+
+def walk_members(full_path: str) -> Iterator[ArchiveMember]:
+    """
+    Archive members of a file or of a whole directory tree, named
+    relative to the requested path.
+    """
+    if os.path.isfile(full_path):
+        file_stat = os.stat(full_path)
+        yield ArchiveMember(
+            path=full_path,
+            arcname=os.path.basename(full_path),
+            size=file_stat.st_size,
+            mtime=file_stat.st_mtime
+        )
+    else:
+        yield from scan_directory(full_path)
+
+
+def prepare_members(
+        members: Iterable[ArchiveMember],
+        prepare_func: Callable,
+        executor: ThreadPoolExecutor
+) -> Iterator[tuple[ArchiveMember, Optional[Any]]]:
+    """
+    Runs ``prepare_func`` for small members on ``executor`` ahead of the
+    writer and yields the results in archive order. Large members are
+    yielded with ``None`` and are left to be streamed by the writer.
+    """
+    window = collections.deque()
+    window_size = app_settings.compression_threads * 4
+    for member in members:
+        if member.size <= app_settings.parallel_member_size:
+            window.append((member, executor.submit(prepare_func, member)))
+        else:
+            window.append((member, None))
+        while len(window) > window_size:
+            yield resolve_member(*window.popleft())
+    while window:
+        yield resolve_member(*window.popleft())
+
+
+def resolve_member(
+        member: ArchiveMember,
+        future: Optional[Future]
+) -> tuple[ArchiveMember, Optional[Any]]:
+    return member, future.result() if future else None
+
+
+def get_zip_info(member: ArchiveMember) -> zipfile.ZipInfo:
+    date_time = max(time.localtime(member.mtime)[:6], ZIP_MIN_DATE_TIME)
+    zip_info = zipfile.ZipInfo(member.arcname, date_time)
+    zip_info.external_attr = MEMBER_MODE << 16
+    zip_info.compress_type = zipfile.ZIP_DEFLATED
+    zip_info.file_size = member.size
+    return zip_info
+
+
+def deflate_member(member: ArchiveMember) -> tuple[zipfile.ZipInfo, bytes]:
+    zip_info = get_zip_info(member)
+    with open_member(member) as src:
+        data = src.read()
+    compressor = zlib.compressobj(
+        zlib.Z_DEFAULT_COMPRESSION,
+        zlib.DEFLATED,
+        -zlib.MAX_WBITS
+    )
+    payload = compressor.compress(data) + compressor.flush()
+    zip_info.file_size = len(data)
+    zip_info.compress_size = len(payload)
+    zip_info.CRC = zlib.crc32(data)
+    return zip_info, payload
+
+
+def write_deflated(
+        zip_io: zipfile.ZipFile,
+        zip_info: zipfile.ZipInfo,
+        payload: bytes
+) -> None:
+    # Same bookkeeping as ZipFile.mkdir: sizes and CRC are known up front,
+    # so the entry needs no data descriptor even on unseekable streams.
+    zip_info.header_offset = zip_io.fp.tell()
+    zip_io.fp.write(zip_info.FileHeader(False))
+    zip_io.fp.write(payload)
+    zip_io.filelist.append(zip_info)
+    zip_io.NameToInfo[zip_info.filename] = zip_info
+    zip_io.start_dir = zip_io.fp.tell()
+
+
+class ParallelGzipWriter(io.RawIOBase):
+    """
+    Gzip compressor which deflates fixed-size blocks on a thread pool and
+    writes them as consecutive gzip members, which is a valid gzip stream.
+    """
+
+    def __init__(
+            self,
+            file_obj: BinaryIO,
+            executor: ThreadPoolExecutor,
+            block_size: int = app_settings.gzip_block_size
+    ):
+        super().__init__()
+        self._file_obj = file_obj
+        self._executor = executor
+        self._block_size = block_size
+        self._buffer = bytearray()
+        self._blocks = collections.deque()
+        self._window_size = app_settings.compression_threads * 2
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self._block_size:
+            self._submit(bytes(self._buffer[:self._block_size]))
+            del self._buffer[:self._block_size]
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        self._blocks.append(self._executor.submit(gzip.compress, block, mtime=0))
+        while len(self._blocks) > self._window_size:
+            self._file_obj.write(self._blocks.popleft().result())
+
+    def finish(self) -> None:
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._blocks:
+            self._file_obj.write(self._blocks.popleft().result())
+
+
+def zip_files(file_obj: BinaryIO, members: Iterable[ArchiveMember]) -> None:
+    zip_io = zipfile.ZipFile(
+        file_obj,
+        mode='w',
+        compression=zipfile.ZIP_DEFLATED
+    )
+    with ThreadPoolExecutor(app_settings.compression_threads) as executor, zip_io:
+        prepared_members = prepare_members(
+            members=members,
+            prepare_func=deflate_member,
+            executor=executor
+        )
+        for member, deflated in prepared_members:
+            if deflated:
+                write_deflated(zip_io, *deflated)
+                continue
+            with open_member(member) as src, zip_io.open(get_zip_info(member), 'w') as dest:
+                shutil.copyfileobj(src, dest, app_settings.archive_chunk_size)
+
+
+def tar_files(file_obj: BinaryIO, members: Iterable[ArchiveMember]) -> None:
+    with ThreadPoolExecutor(app_settings.compression_threads) as executor:
+        gzip_writer = ParallelGzipWriter(file_obj=file_obj, executor=executor)
+        with tarfile.open(fileobj=gzip_writer, mode='w|') as tar:
+            for member in members:
+                tar_info = tarfile.TarInfo(member.arcname)
+                tar_info.size = member.size
+                tar_info.mtime = member.mtime
+                tar_info.mode = MEMBER_MODE
+                with open_member(member) as src:
+                    tar.addfile(tar_info, src)
+        gzip_writer.finish()
+
+
+def seven_zip_files(file_obj: BinaryIO, members: Iterable[ArchiveMember]) -> None:
+    # 7z keeps its header at the end of the archive and seeks back to
+    # the start header on close, so it is spooled to disk first.
+    with tempfile.TemporaryFile() as spool:
+        with py7zr.SevenZipFile(spool, mode='w') as seven_zip:
+            for member in members:
+                with open_member(member) as src:
+                    seven_zip.writef(src, member.arcname)
+        spool.seek(0)
+        shutil.copyfileobj(spool, file_obj, app_settings.archive_chunk_size)
+
+
+COMPRESSION_TO_FUNC = {
+    'zip': zip_files,
+    'tar': tar_files,
+    '7z': seven_zip_files
+}
+
+COMPRESSION_TO_MEDIA_TYPE = {
+    'zip': 'application/x-zip-compressed',
+    'tar': 'application/x-gtar',
+    '7z': 'application/x-7z-compressed'
+}
+
+
+def build_archive(
+        compression_type: str,
+        full_path: str,
+        chunks: queue.Queue,
+        cancel_event: threading.Event,
+        members: Optional[list[ArchiveMember]] = None
+) -> int:
+    """
+    Runs in a compression worker process. Chunks are pushed into
+    ``chunks`` and the end of the archive is marked with ``b''``.
+    Without explicit ``members`` the tree under ``full_path`` is archived.
+    Returns the total size of the archived members.
+    """
+    writer = ChunkWriter(chunks=chunks, cancel_event=cancel_event)
+    if members is None:
+        members = walk_members(full_path)
+    bytes_in = 0
+
+    def count_members(members: Iterable[ArchiveMember]) -> Iterator[ArchiveMember]:
+        nonlocal bytes_in
+        for member in members:
+            bytes_in += member.size
+            yield member
+
+    try:
+        COMPRESSION_TO_FUNC[compression_type](writer, count_members(members))
+        writer.finish()
+    except ArchiveCancelled:
+        logger.info('Compression of %s cancelled', full_path)
+    except Exception:
+        logger.exception('Compression of %s failed', full_path)
+        raise
+    return bytes_in
+
+
+def get_chunk(chunks: queue.Queue) -> Optional[bytes]:
+    try:
+        return chunks.get(timeout=QUEUE_POLL_TIMEOUT)
+    except queue.Empty:
+        return None
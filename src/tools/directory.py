@@ -1,20 +1,186 @@
+import math
 import uuid
+from typing import Iterable, Optional
 
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 
-from src.models.models import Directory
+from src.core.config import app_settings
+from src.models.models import Directory, DirectoryUsage
 
+from .backends import get_storage
+from .local_cache import LocalCache
 
-async def create_dir_info(
+# Rows per INSERT, keeping the bound parameters under SQLite's limit.
+INSERT_BATCH_SIZE = 150
+# Paths bound into one IN clause.
+SELECT_BATCH_SIZE = 500
+# Inserts of a directory chain raced by concurrent uploads.
+DIRS_INSERT_ATTEMPTS = 3
+
+DIALECT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+# Ids of the directories this process has already created or looked up.
+known_dirs = LocalCache(
+    max_entries=app_settings.known_dirs_max_entries,
+    ttl=math.inf
+)
+
+
+def get_parent_dirs(file_path: str) -> list[str]:
+    """
+    Every directory above ``file_path``, outermost first:
+    ``/a/b/file`` gives ``['/a', '/a/b']``.
+    """
+    parts = file_path.split('/')[1:-1]
+    return ['/' + '/'.join(parts[:index]) for index in range(1, len(parts) + 1)]
+
+
+def get_dir_path(path: str) -> Optional[str]:
+    """
+    Directory containing ``path``, None for the root.
+    """
+    return path.rsplit('/', 1)[0] or None
+
+
+def get_missing_dirs(file_paths) -> list[str]:
+    dir_paths = set()
+    for file_path in file_paths:
+        dir_paths.update(
+            dir_path for dir_path in get_parent_dirs(file_path)
+            if known_dirs.get(dir_path) is None
+        )
+    return sorted(dir_paths)
+
+
+def get_parent_id(path: str):
+    parent_path = get_dir_path(path)
+    if parent_path is None:
+        return None
+    parent_id = known_dirs.get(parent_path)
+    if parent_id is not None:
+        return parent_id
+    return select(Directory.id).where(
+        Directory.path == parent_path
+    ).scalar_subquery()
+
+
+async def insert_dirs(
         db: AsyncSession,
-        path: str
-) -> Directory:
-    dir_id = str(uuid.uuid1())
-    dir_info_obj = Directory(
-        id=dir_id,
-        path=path
-    )
-    db.add(dir_info_obj)
-    await db.commit()
-    await db.refresh(dir_info_obj)
-    return dir_info_obj
+        paths: list[str]
+) -> None:
+    """
+    Inserts the rows of ``paths`` missing from the table in one
+    multi-row INSERT that skips existing rows. New rows get their ids
+    here, so children are linked to parents inserted by the same
+    statement.
+    """
+    dir_ids = await get_dir_ids(db=db, paths=paths)
+    new_paths = [path for path in paths if path not in dir_ids]
+    dir_ids.update((path, uuid.uuid1()) for path in new_paths)
+    insert = DIALECT_INSERTS[db.bind.dialect.name]
+    for index in range(0, len(new_paths), INSERT_BATCH_SIZE):
+        statement = insert(Directory).values([
+            {
+                'id': dir_ids[path],
+                'path': path,
+                'name': path.rsplit('/', 1)[1],
+                'parent_id': dir_ids.get(get_dir_path(path)) or get_parent_id(path)
+            }
+            for path in new_paths[index:index + INSERT_BATCH_SIZE]
+        ]).on_conflict_do_nothing(index_elements=['path'])
+        await db.execute(statement)
+
+
+async def create_dirs_info(
+        db: AsyncSession,
+        paths: list[str]
+) -> None:
+    """
+    Creates the ``paths`` on disk and inserts their rows on a session of
+    their own, committed before the upload is streamed, so no lock on
+    the directories is held meanwhile. A parent inserted concurrently
+    in between leaves its child linked to an id that was never inserted;
+    the insert then fails and is retried against the committed rows.
+    The caller marks the paths known with ``remember_dirs``.
+    """
+    if not paths:
+        return
+    parents = {path.rsplit('/', 1)[0] for path in paths}
+    await get_storage().makedirs(path for path in paths if path not in parents)
+    async with AsyncSession(bind=db.bind, expire_on_commit=False) as dirs_db:
+        for attempt in range(DIRS_INSERT_ATTEMPTS):
+            try:
+                await insert_dirs(dirs_db, sorted(paths))
+                await dirs_db.commit()
+                return
+            except IntegrityError:
+                await dirs_db.rollback()
+                if attempt == DIRS_INSERT_ATTEMPTS - 1:
+                    raise
+
+
+async def get_dir_ids(
+        db: AsyncSession,
+        paths: Iterable[str]
+) -> dict[str, uuid.UUID]:
+    dir_ids = {}
+    missing = []
+    for path in set(paths):
+        dir_id = known_dirs.get(path)
+        if dir_id is None:
+            missing.append(path)
+        else:
+            dir_ids[path] = dir_id
+    for index in range(0, len(missing), SELECT_BATCH_SIZE):
+        statement = select(Directory.id, Directory.path).where(
+            Directory.path.in_(missing[index:index + SELECT_BATCH_SIZE])
+        )
+        results = await db.execute(statement=statement)
+        dir_ids.update((path, dir_id) for dir_id, path in results.all())
+    return dir_ids
+
+
+async def add_dirs_usage(
+        db: AsyncSession,
+        dir_ids: dict[str, uuid.UUID],
+        usage: dict[tuple[uuid.UUID, str], list[int]]
+) -> None:
+    """
+    Adds the (size, files count) deltas of ``usage``, keyed by owner and
+    directory path, to the per-user totals of those directories in one
+    upsert. Rows are written in key order, so concurrent writers of the
+    same user lock them in the same order; other users never share them.
+    """
+    rows = [
+        {
+            'user_id': user_id,
+            'directory_id': dir_ids[path],
+            'parent_id': dir_ids.get(get_dir_path(path)),
+            'size': size,
+            'files_count': count
+        }
+        for (user_id, path), (size, count) in sorted(usage.items())
+        if size or count
+    ]
+    insert = DIALECT_INSERTS[db.bind.dialect.name]
+    for index in range(0, len(rows), INSERT_BATCH_SIZE):
+        statement = insert(DirectoryUsage).values(rows[index:index + INSERT_BATCH_SIZE])
+        statement = statement.on_conflict_do_update(
+            index_elements=['user_id', 'directory_id'],
+            set_={
+                'size': DirectoryUsage.size + statement.excluded.size,
+                'files_count': DirectoryUsage.files_count + statement.excluded.files_count
+            }
+        )
+        await db.execute(statement)
+
+
+def remember_dirs(dir_ids: dict[str, uuid.UUID]) -> None:
+    for path, dir_id in dir_ids.items():
+        known_dirs.set(path, dir_id)
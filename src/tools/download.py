@@ -0,0 +1,140 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+
+from fastapi import HTTPException, status
+from starlette.datastructures import Headers
+
+from .backends import get_storage
+from .blobs import iter_blob
+
+
+def get_last_modified(file_info: dict) -> datetime:
+    created_at = file_info['created_at']
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.replace(microsecond=0)
+
+
+def get_etag(file_info: dict) -> str:
+    """
+    Deduplicated files are identified by their manifest digest, other
+    files by their id, size and modification time.
+    """
+    if file_info.get('manifest'):
+        return f'"{file_info["manifest"]}"'
+    version = '{}:{}:{}'.format(
+        file_info['id'],
+        file_info['size'],
+        get_last_modified(file_info).isoformat()
+    )
+    return f'"{hashlib.md5(version.encode()).hexdigest()}"'
+
+
+def get_validators(file_info: dict) -> dict:
+    return {
+        'ETag': get_etag(file_info),
+        'Last-Modified': format_datetime(
+            get_last_modified(file_info),
+            usegmt=True
+        )
+    }
+
+
+def get_content_disposition(filename: str) -> str:
+    """
+    ``attachment`` header naming the file in UTF-8 as in RFC 6266, with
+    an ASCII fallback for clients that ignore ``filename*``.
+    """
+    fallback = ''.join(
+        char if char.isascii() and char.isprintable() and char not in '"\\' else '_'
+        for char in filename
+    )
+    return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename, safe="")}'
+
+
+def parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == '*':
+        return True
+    tags = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return etag in tags
+
+
+def is_not_modified(headers: Headers, file_info: dict) -> bool:
+    if_none_match = headers.get('if-none-match')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, get_etag(file_info))
+    if_modified_since = headers.get('if-modified-since')
+    if if_modified_since is not None:
+        date = parse_http_date(if_modified_since)
+        return date is not None and get_last_modified(file_info) <= date
+    return False
+
+
+def if_range_matches(headers: Headers, file_info: dict) -> bool:
+    if_range = headers.get('if-range')
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == get_etag(file_info)
+    return parse_http_date(if_range) == get_last_modified(file_info)
+
+
+def parse_range(range_header: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    Inclusive bounds of a single ``bytes`` range, not yet clamped to
+    ``size``. None for other units, multiple ranges or malformed values.
+    """
+    unit, _, ranges = range_header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in ranges:
+        return None
+    first, _, last = ranges.strip().partition('-')
+    try:
+        if first:
+            return int(first), int(last) if last else size - 1
+        return size - int(last), size - 1
+    except ValueError:
+        return None
+
+
+def get_range(headers: Headers, file_info: dict) -> Optional[tuple[int, int]]:
+    """
+    Returns the inclusive byte range requested by the client or None
+    when the whole file should be sent. Only single ranges are served,
+    a multi-range request gets the full file.
+    """
+    range_header = headers.get('range')
+    if not range_header or not if_range_matches(headers, file_info):
+        return None
+    size = file_info['size']
+    byte_range = parse_range(range_header, size)
+    if byte_range is None:
+        return None
+    start, end = max(byte_range[0], 0), min(byte_range[1], size - 1)
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail='Requested range is not satisfiable.',
+            headers={'Content-Range': f'bytes */{size}'}
+        )
+    return start, end
+
+
+def iter_content(file_info: dict, start: int, length: int) -> AsyncIterator[bytes]:
+    if file_info.get('manifest'):
+        return iter_blob(file_info['manifest'], start, length)
+    return get_storage().read(file_info['path'], start, length)
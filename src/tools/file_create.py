@@ -1,54 +1,131 @@
-import os.path
+import asyncio
+import os
+import uuid
+from collections import defaultdict
 from datetime import datetime
-from typing import Callable, Type
+from typing import Callable, NamedTuple, Optional, Type
 
-from aioshutil import copyfileobj
-from fastapi import File as FileObj
+from fastapi import File as FileObj, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 
-from src.models.models import File as FileModel, User as UserModel
+from src.models.models import File as FileModel
+from src.schemas.user import CurrentUser
 from ..core.config import app_settings
+from .backends import BackendUpload, get_storage
+from .base import check_quota
+from .checksum import Checksum
+from .blobs import write_blob
+from .directory import (
+    add_dirs_usage,
+    get_dir_ids,
+    get_dir_path,
+    get_missing_dirs,
+    get_parent_dirs,
+    remember_dirs
+)
+from .storage import getsize, open_async, remove, run_io
+from .usage import add_usage
 
 
-async def write_to_file(
+async def store_file(
         file_obj: FileObj,
-        full_file_path: str,
-):
-    with open(full_file_path, 'wb') as buffer:
-        await copyfileobj(file_obj.file, buffer)
+        file_path: str,
+        source_path: Optional[str] = None,
+        limit: Optional[int] = None,
+        checksum: Optional[Checksum] = None,
+        upload: Optional[BackendUpload] = None
+) -> tuple[Checksum, Optional[str]]:
+    """
+    Returns the checksum of the stored file, computed while it is
+    written, and, for deduplicated storage, the digest of its chunk
+    manifest. An already assembled ``source_path`` is handed to the
+    storage backend as a whole, along with the ``checksum`` computed
+    while it was staged. The parts of an ``upload`` held by the storage
+    backend are assembled there, ``checksum`` covering the bytes hashed
+    as they arrived. Files larger than ``limit`` bytes are rejected.
+    """
+    if upload is not None:
+        check_quota(upload.size, limit)
+        return await get_storage().complete_upload(file_path, upload, checksum), None
+    if source_path:
+        check_quota(await getsize(source_path), limit)
+    if app_settings.dedup_storage:
+        checksum, manifest = await write_blob(file_obj, limit=limit)
+        if source_path:
+            await remove(source_path)
+        return checksum, manifest
+    if source_path:
+        return await get_storage().store(file_path, source_path, checksum), None
+    return await get_storage().write(file_path, file_obj.file, limit=limit), None
+
+
+async def discard_files(
+        db: AsyncSession,
+        model: Type[FileModel],
+        paths: list[str]
+) -> None:
+    """
+    Removes the stored contents of new files whose rows failed to
+    commit, except for paths a concurrent upload has recorded meanwhile.
+    """
+    await db.rollback()
+    result = await db.execute(select(model.path).where(model.path.in_(paths)))
+    recorded = set(result.scalars())
+    for path in paths:
+        if path not in recorded:
+            await get_storage().delete(path)
 
 
 async def create_file(
         db: AsyncSession,
         file_path: str,
-        full_file_path: str,
-        create_dir_info: Callable,
+        create_dirs_info: Callable,
         file_obj: FileObj,
         model: Type[FileModel],
-        user_obj: Type[UserModel]
+        user_obj: CurrentUser,
+        source_path: Optional[str] = None,
+        limit: Optional[int] = None,
+        checksum: Optional[Checksum] = None,
+        upload: Optional[BackendUpload] = None
 ):
-    path = app_settings.files_folder_path
-    for dir_name in file_path.split('/')[1:-1]:
-        path = os.path.join(path, dir_name)
-        if os.path.exists(path):
-            continue
-        else:
-            os.mkdir(path)
-            await create_dir_info(db=db, path=path)
-    await write_to_file(
+    dir_paths = get_missing_dirs([file_path])
+    await create_dirs_info(db=db, paths=dir_paths)
+    dir_ids = await get_dir_ids(db=db, paths=get_parent_dirs(file_path))
+    checksum, manifest = await store_file(
         file_obj=file_obj,
-        full_file_path=full_file_path
+        file_path=file_path,
+        source_path=source_path,
+        limit=limit,
+        checksum=checksum,
+        upload=upload
     )
-    size = os.path.getsize(full_file_path)
+    size = checksum.size
     new_file = model(
         name=file_obj.filename,
         path=file_path,
         size=size,
+        sha256=checksum.sha256,
+        crc32=checksum.crc32,
+        manifest=manifest,
         is_downloadable=True,
-        user=user_obj
+        user_id=user_obj.id,
+        directory_id=dir_ids.get(get_dir_path(file_path))
     )
-    db.add(new_file)
-    await db.commit()
+    try:
+        db.add(new_file)
+        await add_usage(db=db, user_id=user_obj.id, size_delta=size, count_delta=1)
+        await add_dirs_usage(
+            db=db,
+            dir_ids=dir_ids,
+            usage={(user_obj.id, path): (size, 1) for path in get_parent_dirs(file_path)}
+        )
+        await db.commit()
+    except Exception:
+        if manifest is None:
+            await discard_files(db=db, model=model, paths=[file_path])
+        raise
+    remember_dirs(dir_ids)
     await db.refresh(new_file)
     return new_file
 
@@ -56,16 +133,207 @@ async def create_file(
 async def put_file(
         db: AsyncSession,
         file_obj: FileObj,
-        full_file_path: str,
-        file_info: Type[FileModel]
+        file_info: Type[FileModel],
+        source_path: Optional[str] = None,
+        limit: Optional[int] = None,
+        checksum: Optional[Checksum] = None,
+        upload: Optional[BackendUpload] = None
 ):
-    await write_to_file(
+    checksum, manifest = await store_file(
         file_obj=file_obj,
-        full_file_path=full_file_path
+        file_path=file_info.path,
+        source_path=source_path,
+        limit=limit,
+        checksum=checksum,
+        upload=upload
+    )
+    size = checksum.size
+    await add_usage(
+        db=db,
+        user_id=file_info.user_id,
+        size_delta=size - file_info.size
+    )
+    await add_dirs_usage(
+        db=db,
+        dir_ids=await get_dir_ids(db=db, paths=get_parent_dirs(file_info.path)),
+        usage={
+            (file_info.user_id, path): (size - file_info.size, 0)
+            for path in get_parent_dirs(file_info.path)
+        }
     )
-    size = os.path.getsize(full_file_path)
     file_info.size = size
+    file_info.sha256 = checksum.sha256
+    file_info.crc32 = checksum.crc32
+    file_info.manifest = manifest
     file_info.created_at = datetime.utcnow()
     await db.commit()
     await db.refresh(file_info)
     return file_info
+
+
+class BatchEntry(NamedTuple):
+    """
+    A file of a batch upload: either an uploaded ``file_obj`` or an
+    already written ``source_path``, which is opened only when stored,
+    with the ``checksum`` computed while writing it.
+    """
+    file_path: str
+    file_obj: Optional[FileObj] = None
+    source_path: Optional[str] = None
+    checksum: Optional[Checksum] = None
+
+    @property
+    def size(self) -> int:
+        if self.file_obj is None:
+            return os.path.getsize(self.source_path)
+        size = self.file_obj.file.seek(0, os.SEEK_END)
+        self.file_obj.file.seek(0)
+        return size
+
+
+def get_entry_sizes(entries: list[BatchEntry]) -> list[int]:
+    return [entry.size for entry in entries]
+
+
+async def store_files(
+        entries: list[BatchEntry]
+) -> list[tuple[Checksum, Optional[str]]]:
+    """
+    Stores the files of a batch concurrently, at most
+    ``batch_upload_concurrency`` at a time.
+    """
+    semaphore = asyncio.Semaphore(app_settings.batch_upload_concurrency)
+
+    async def store(entry: BatchEntry) -> tuple[Checksum, Optional[str]]:
+        async with semaphore:
+            if entry.file_obj is not None:
+                return await store_file(
+                    file_obj=entry.file_obj,
+                    file_path=entry.file_path,
+                    source_path=entry.source_path
+                )
+            with await open_async(entry.source_path) as source:
+                return await store_file(
+                    file_obj=UploadFile(
+                        filename=entry.file_path.split('/')[-1],
+                        file=source
+                    ),
+                    file_path=entry.file_path,
+                    source_path=entry.source_path,
+                    checksum=entry.checksum
+                )
+
+    return await asyncio.gather(*(store(entry) for entry in entries))
+
+
+async def create_or_put_files(
+        db: AsyncSession,
+        entries: list[BatchEntry],
+        files_in_storage: dict[str, FileModel],
+        create_dirs_info: Callable,
+        model: Type[FileModel],
+        user_obj: CurrentUser,
+        limit: Optional[int] = None
+) -> list[FileModel]:
+    """
+    Batch counterpart of ``create_file`` and ``put_file``: every row is
+    inserted or updated in one transaction, without per-file refreshes.
+    The whole batch is rejected before anything is stored when it would
+    grow the usage of ``user_obj`` by more than ``limit`` bytes.
+    """
+    if limit is not None:
+        size_delta = 0
+        sizes = await run_io(get_entry_sizes, entries)
+        for entry, size in zip(entries, sizes):
+            file_info = files_in_storage.get(entry.file_path)
+            if file_info is None:
+                size_delta += size
+            elif file_info.user_id == user_obj.id:
+                size_delta += size - file_info.size
+        check_quota(size_delta, limit)
+    dir_paths = get_missing_dirs(entry.file_path for entry in entries)
+    await create_dirs_info(db=db, paths=dir_paths)
+    dir_ids = await get_dir_ids(
+        db=db,
+        paths={
+            path for entry in entries
+            for path in get_parent_dirs(entry.file_path)
+        }
+    )
+    stored = await store_files(entries)
+    new_paths = [
+        entry.file_path
+        for entry, (_, manifest) in zip(entries, stored)
+        if entry.file_path not in files_in_storage and manifest is None
+    ]
+    try:
+        files = await record_files(
+            db=db,
+            entries=entries,
+            stored=stored,
+            files_in_storage=files_in_storage,
+            dir_ids=dir_ids,
+            model=model,
+            user_obj=user_obj
+        )
+        await db.commit()
+    except Exception:
+        if new_paths:
+            await discard_files(db=db, model=model, paths=new_paths)
+        raise
+    remember_dirs(dir_ids)
+    return files
+
+
+async def record_files(
+        db: AsyncSession,
+        entries: list[BatchEntry],
+        stored: list[tuple[Checksum, Optional[str]]],
+        files_in_storage: dict[str, FileModel],
+        dir_ids: dict[str, uuid.UUID],
+        model: Type[FileModel],
+        user_obj: CurrentUser
+) -> list[FileModel]:
+    """
+    Adds or updates the rows of a stored batch along with the usage of
+    their owners and directories, without committing.
+    """
+    files = []
+    usage = defaultdict(lambda: [0, 0])
+    dirs_usage = defaultdict(lambda: [0, 0])
+    now = datetime.utcnow()
+    for entry, (checksum, manifest) in zip(entries, stored):
+        size = checksum.size
+        file_info = files_in_storage.get(entry.file_path)
+        if file_info is None:
+            file_info = model(
+                id=uuid.uuid1(),
+                name=entry.file_path.split('/')[-1],
+                path=entry.file_path,
+                is_downloadable=True,
+                user_id=user_obj.id,
+                directory_id=dir_ids.get(get_dir_path(entry.file_path)),
+                size=0
+            )
+            db.add(file_info)
+            usage[file_info.user_id][1] += 1
+            for path in get_parent_dirs(entry.file_path):
+                dirs_usage[file_info.user_id, path][1] += 1
+        usage[file_info.user_id][0] += size - file_info.size
+        for path in get_parent_dirs(entry.file_path):
+            dirs_usage[file_info.user_id, path][0] += size - file_info.size
+        file_info.size = size
+        file_info.sha256 = checksum.sha256
+        file_info.crc32 = checksum.crc32
+        file_info.manifest = manifest
+        file_info.created_at = now
+        files.append(file_info)
+    for user_id, (size_delta, count_delta) in usage.items():
+        await add_usage(
+            db=db,
+            user_id=user_id,
+            size_delta=size_delta,
+            count_delta=count_delta
+        )
+    await add_dirs_usage(db=db, dir_ids=dir_ids, usage=dirs_usage)
+    return files
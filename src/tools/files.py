@@ -1,26 +1,57 @@
-import io
+import asyncio
+import base64
+import hashlib
+import json
 import logging.config
-import os.path
-import tarfile
-import zipfile
-from io import BytesIO
-from typing import Callable
+import os
+import time
+import uuid
+import weakref
+from datetime import datetime
+from typing import AsyncIterator, Optional
 
-import py7zr
 from fastapi import HTTPException, status
 from fastapi_cache.backends.redis import RedisCacheBackend
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core.config import app_settings
 from src.core.logger import LOGGING
 from src.schemas import file as file_schema
-from src.services.base import directory_crud, file_crud
+from src.services.base import directory_crud, file_crud, user_crud
 
+from .archive_cache import (
+    fill_archive_cache,
+    get_archive_version,
+    get_cached_archive_path,
+    open_cached_archive
+)
+from .backends import get_storage
 from .base import get_full_path
-from .cache import get_cache_or_data
+from .cache import bump_versions, get_cache_or_data, get_version
+from .checksum import Checksum
+from .compression import (
+    COMPRESSION_TO_MEDIA_TYPE,
+    ArchiveMember,
+    build_archive,
+    get_chunk,
+    walk_members
+)
+from .download import iter_content
+from .metrics import (
+    compression_bytes_in,
+    compression_bytes_out,
+    compression_seconds
+)
+from .storage import iter_file, run_io
+from .workers import create_job_channels, get_compression_pool
 
 logging.config.dictConfig(LOGGING)
 logger = logging.getLogger('tools-files')
 
+COMPRESSION_RETRY_AFTER = 5
+
+_active_jobs = 0
+
 
 def is_downloadable(file_info: dict):
     if not file_info.get('is_downloadable'):
@@ -53,16 +84,200 @@ async def get_file_info(
     return file_info
 
 
-def is_file(path: str) -> bool:
-    return os.path.isfile(path)
+async def verify_file(
+        db: AsyncSession,
+        path: str
+) -> dict:
+    """
+    Reads a stored file back and checks it against the checksum kept on
+    upload. Files stored before checksums were kept get theirs saved.
+    """
+    file_info = await get_file_info(db=db, path=path)
+    checksum = Checksum()
+    chunks = iter_content(
+        {'path': file_info.path, 'manifest': file_info.manifest},
+        0,
+        file_info.size
+    )
+    async for chunk in chunks:
+        await run_io(checksum.update, chunk)
+    valid = None
+    if file_info.sha256 is None:
+        file_info.sha256 = checksum.sha256
+        file_info.crc32 = checksum.crc32
+        await db.commit()
+        await invalidate_file_cache(file_obj=file_info)
+    else:
+        valid = (
+            checksum.size == file_info.size
+            and checksum.sha256 == file_info.sha256
+            and (
+                None in (checksum.crc32, file_info.crc32)
+                or checksum.crc32 == file_info.crc32
+            )
+        )
+        if not valid:
+            logger.error('File %s does not match its checksum', file_info.path)
+    return {
+        'id': file_info.id,
+        'path': file_info.path,
+        'size': checksum.size,
+        'sha256': checksum.sha256,
+        'crc32': checksum.crc32,
+        'valid': valid
+    }
 
 
-def get_files_paths_by_folder(full_path: str) -> list:
-    return [
-        os.path.join(full_path, f)
-        for f in os.listdir(full_path)
-        if os.path.isfile(os.path.join(full_path, f))
-    ]
+def get_file_version_key(path: str) -> str:
+    if path.find('/') != -1 and not path.startswith('/'):
+        path = '/' + path
+    return f'file_version_for_{path}'
+
+
+def get_files_version_key(user_id) -> str:
+    return f'files_version_for_{user_id}'
+
+
+async def get_file_info_key(path: str) -> str:
+    version = await get_version(get_file_version_key(path))
+    return f'file_info_for_{path}_{version}'
+
+
+async def get_files_list_key(
+        user_id,
+        query: file_schema.FilesListQuery
+) -> str:
+    version = await get_version(get_files_version_key(user_id))
+    query_digest = hashlib.md5(query.json(sort_keys=True).encode()).hexdigest()
+    return f'files_list_for_{user_id}_{version}_{query_digest}'
+
+
+async def invalidate_files_cache(user_id, files: list) -> None:
+    """
+    Called after files are written by ``user_id``: the info of the
+    overwritten ``files``, looked up by path or by id, and every files
+    list page of the writer and of the owners of ``files`` get new
+    versions. New files have nothing cached yet.
+    """
+    owner_ids = {user_id} | {file_obj.user_id for file_obj in files}
+    await bump_versions([
+        version_key
+        for file_obj in files
+        for version_key in (
+            get_file_version_key(file_obj.path),
+            get_file_version_key(str(file_obj.id))
+        )
+    ] + [get_files_version_key(owner_id) for owner_id in owner_ids])
+
+
+async def invalidate_file_cache(file_obj) -> None:
+    await invalidate_files_cache(file_obj.user_id, [file_obj])
+
+
+def encode_cursor(file_obj, sort_by: str) -> str:
+    value = getattr(file_obj, sort_by)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    cursor = json.dumps([sort_by, value, str(file_obj.id)])
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def decode_cursor(cursor: str, sort_by: str) -> tuple:
+    try:
+        cursor_sort_by, value, file_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode())
+        )
+        if cursor_sort_by != sort_by:
+            raise ValueError('Cursor belongs to another sort order')
+        if sort_by == 'created_at':
+            value = datetime.fromisoformat(value)
+        return value, uuid.UUID(file_id)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Invalid cursor.'
+        )
+
+
+async def get_files_list(
+        db: AsyncSession,
+        user_obj,
+        query: Optional[file_schema.FilesListQuery] = None
+) -> dict:
+    query = query or file_schema.FilesListQuery()
+    after = decode_cursor(query.cursor, query.sort_by) if query.cursor else None
+    files = await file_crud.get_list_by_user_object(
+        db=db,
+        user_obj=user_obj,
+        query=query,
+        after=after
+    )
+    next_cursor = None
+    if len(files) > query.limit:
+        files = files[:query.limit]
+        next_cursor = encode_cursor(files[-1], query.sort_by)
+    return {
+        'account_id': user_obj.id,
+        'files': [file_schema.File.from_orm(file).dict() for file in files],
+        'next_cursor': next_cursor
+    }
+
+
+async def get_tree(
+        db: AsyncSession,
+        path: str,
+        user_obj
+) -> dict:
+    """
+    Direct subdirectories and files of the directory at ``path`` with
+    the total size and files count of every directory, counting only
+    the files of ``user_obj``.
+    """
+    path = path.rstrip('/')
+    if path:
+        dir_info = await directory_crud.get_dir_info_by_path(db=db, dir_path=path)
+        dir_id = dir_info and dir_info.id
+        usage = dir_id and await directory_crud.get_usage(
+            db=db,
+            dir_id=dir_id,
+            user_id=user_obj.id
+        )
+        if not usage or not usage[1]:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='Directory not found'
+            )
+        size, files_count = usage
+    else:
+        dir_id = None
+        usage = await user_crud.get_usage(db=db, user_id=user_obj.id)
+        size, files_count = usage['used_bytes'], usage['files_count']
+    children = await directory_crud.get_children_usage(
+        db=db,
+        dir_id=dir_id,
+        user_id=user_obj.id
+    )
+    files = await file_crud.get_list_by_directory(
+        db=db,
+        dir_id=dir_id,
+        user_obj=user_obj
+    )
+    return {
+        'path': path or '/',
+        'size': size,
+        'files_count': files_count,
+        'directories': [
+            {
+                'id': directory.id,
+                'name': directory.name,
+                'path': directory.path,
+                'size': dir_size,
+                'files_count': dir_files_count
+            }
+            for directory, dir_size, dir_files_count in children
+        ],
+        'files': files
+    }
 
 
 async def get_path_by_id(
@@ -93,66 +308,142 @@ async def get_path_by_id(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail='Directory or file not found'
             )
-        return dir_info.get()
+        return dir_info.get('path')
     return file_info.get('path')
 
 
-def compress_file(
-        write_to_file_func: Callable,
-        full_path: str
-) -> None:
-    if is_file(full_path):
-        write_to_file_func(full_path)
-    else:
-        files_paths = get_files_paths_by_folder(full_path)
-        for file_path in files_paths:
-            write_to_file_func(file_path)
+class CompressionSlot:
+    """
+    One of the ``compression_max_jobs`` archive builds, taken when the
+    request is admitted and released once, by the build or when its
+    response is dropped unsent.
+    """
 
+    def __init__(self):
+        global _active_jobs
+        if _active_jobs >= app_settings.compression_max_jobs:
+            logger.warning('Compression queue is full (%s jobs)', _active_jobs)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail='Too many archives are being built, try again later.',
+                headers={'Retry-After': str(COMPRESSION_RETRY_AFTER)}
+            )
+        _active_jobs += 1
+        self.released = False
 
-def zip_files(io_obj: BytesIO, full_path: str) -> tuple[io.BytesIO, str]:
-    with zipfile.ZipFile(io_obj, mode='w', compression=zipfile.ZIP_DEFLATED) as zip_io:
-        compress_file(
-            write_to_file_func=zip_io.write,
-            full_path=full_path
-        )
-        zip_io.close()
-    return io_obj, 'application/x-zip-compressed'
+    def release(self) -> None:
+        global _active_jobs
+        if not self.released:
+            self.released = True
+            _active_jobs -= 1
 
 
-def tar_files(io_obj: BytesIO, full_path: str) -> tuple[io.BytesIO, str]:
-    with tarfile.open(fileobj=io_obj, mode='w:gz') as tar:
-        compress_file(
-            write_to_file_func=tar.add,
-            full_path=full_path
+async def get_archive_members(
+        db: AsyncSession,
+        path: str
+) -> list[ArchiveMember]:
+    """
+    Members of a deduplicated or remotely stored archive come from the
+    ``File`` rows, since there is no plain file tree to walk.
+    """
+    files = await file_crud.get_list_by_path(db=db, path=path)
+    if not files:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Directory or file not found'
+        )
+    prefix = path.rstrip('/') + '/'
+    storage = get_storage()
+    return [
+        ArchiveMember(
+            path=file.path,
+            arcname=file.path[len(prefix):] if file.path.startswith(prefix) else file.name,
+            size=file.size,
+            mtime=file.created_at.timestamp(),
+            manifest=file.manifest,
+            url=None if file.manifest else storage.get_member_url(file.path)
         )
-        tar.close()
-    return io_obj, 'application/x-gtar'
+        for file in files
+    ]
 
 
-def seven_zip_files(io_obj: BytesIO, full_path: str) -> tuple[io.BytesIO, str]:
-    with py7zr.SevenZipFile(io_obj, mode='w') as seven_zip:
-        compress_file(
-            write_to_file_func=seven_zip.write,
-            full_path=full_path
+def list_members(full_path: str) -> list[ArchiveMember]:
+    if not os.path.exists(full_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Directory or file not found'
         )
-    return io_obj, 'application/x-7z-compressed'
+    return list(walk_members(full_path))
 
 
-COMPRESSION_TO_FUNC = {
-    'zip': zip_files,
-    'tar': tar_files,
-    '7z': seven_zip_files
-}
+async def compress(
+        path: str,
+        compression_type: str,
+        slot: CompressionSlot,
+        members: Optional[list[ArchiveMember]] = None
+) -> AsyncIterator[bytes]:
+    full_path = get_full_path(path=path)
+    loop = asyncio.get_running_loop()
+    chunks, cancel_event = await loop.run_in_executor(
+        None,
+        create_job_channels,
+        app_settings.archive_queue_size
+    )
+    job = loop.run_in_executor(
+        get_compression_pool(),
+        build_archive,
+        compression_type,
+        full_path,
+        chunks,
+        cancel_event,
+        members
+    )
+    started_at = time.perf_counter()
+    bytes_out = 0
+    try:
+        while True:
+            chunk = await loop.run_in_executor(None, get_chunk, chunks)
+            if chunk is None:
+                if job.done():
+                    job.result()
+                continue
+            if not chunk:
+                break
+            bytes_out += len(chunk)
+            yield chunk
+        compression_bytes_in.inc(await job, compression_type=compression_type)
+        compression_seconds.observe(
+            time.perf_counter() - started_at,
+            compression_type=compression_type
+        )
+    finally:
+        compression_bytes_out.inc(bytes_out, compression_type=compression_type)
+        slot.release()
+        if not job.done():
+            logger.info('Cancel compression of %s', full_path)
+            # Signalling the manager is a round-trip, nothing waits for it.
+            loop.run_in_executor(None, cancel_event.set)
+            job.cancel()
 
 
-def compress(
-        io_obj: BytesIO,
+def start_compression(
         path: str,
-        compression_type: str
-):
-    full_path = get_full_path(path=path)
-    io_obj, media_type = COMPRESSION_TO_FUNC[compression_type](io_obj, full_path)
-    return io_obj, media_type
+        compression_type: str,
+        members: Optional[list[ArchiveMember]] = None
+) -> AsyncIterator[bytes]:
+    """
+    Admits an archive build, or answers 503 when ``compression_max_jobs``
+    are running, and returns its chunks.
+    """
+    slot = CompressionSlot()
+    chunks = compress(
+        path=path,
+        compression_type=compression_type,
+        slot=slot,
+        members=members
+    )
+    weakref.finalize(chunks, slot.release)
+    return chunks
 
 
 async def get_compressed_file_with_media_type(
@@ -160,8 +451,7 @@ async def get_compressed_file_with_media_type(
         cache: RedisCacheBackend,
         path: str,
         compression_type: str
-) -> tuple[BytesIO, str]:
-    io_obj = BytesIO()
+) -> tuple[AsyncIterator[bytes], str]:
     if path.find('/') == -1:
         path = await get_path_by_id(
             db=db,
@@ -173,9 +463,35 @@ async def get_compressed_file_with_media_type(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail='Path must starts with / .'
         )
-    refreshed_io, media_type = compress(
-        io_obj=io_obj,
-        path=path,
+    members = None
+    if app_settings.dedup_storage or not get_storage().local:
+        members = await get_archive_members(db=db, path=path)
+    if not app_settings.archive_cache:
+        chunks = start_compression(
+            path=path,
+            compression_type=compression_type,
+            members=members
+        )
+        return chunks, COMPRESSION_TO_MEDIA_TYPE[compression_type]
+    if members is None:
+        members = await run_io(list_members, get_full_path(path=path))
+    archive_path = get_cached_archive_path(
+        version=get_archive_version(path, compression_type, members),
         compression_type=compression_type
     )
-    return refreshed_io, media_type
+    size = await run_io(open_cached_archive, archive_path)
+    if size is not None:
+        logger.info('Send cached archive %s', archive_path)
+        return (
+            iter_file(archive_path, 0, size),
+            COMPRESSION_TO_MEDIA_TYPE[compression_type]
+        )
+    chunks = start_compression(
+        path=path,
+        compression_type=compression_type,
+        members=members
+    )
+    return (
+        fill_archive_cache(chunks, archive_path),
+        COMPRESSION_TO_MEDIA_TYPE[compression_type]
+    )
@@ -0,0 +1,205 @@
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels, kept in process memory.
+    """
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[label] for label in self.labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels[label] for label in self.labels), 0)
+
+    def samples(self) -> list[tuple[dict, float]]:
+        with self._lock:
+            return [
+                (dict(zip(self.labels, key)), value)
+                for key, value in self._values.items()
+            ]
+
+
+class Gauge(Counter):
+    """
+    Value that goes up and down, such as the number of requests in flight.
+    """
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """
+    Distribution of observed values over cumulative ``buckets``.
+    """
+
+    DEFAULT_BUCKETS = (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+    )
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            labels: Iterable[str] = (),
+            buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[label] for label in self.labels)
+        with self._lock:
+            counts, count, total = self._values.get(
+                key, ([0] * len(self.buckets), 0, 0.0)
+            )
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, count + 1, total + value)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def count(self, **labels) -> int:
+        key = tuple(labels[label] for label in self.labels)
+        with self._lock:
+            return self._values.get(key, ([], 0, 0.0))[1]
+
+    def samples(self) -> list[tuple[dict, list[int], int, float]]:
+        """
+        Returns the labels, cumulative bucket counts, total count and sum
+        of every observed label set.
+        """
+        with self._lock:
+            return [
+                (dict(zip(self.labels, key)), list(counts), count, total)
+                for key, (counts, count, total) in self._values.items()
+            ]
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(
+        f'{name}="{escape_label_value(value)}"' for name, value in labels.items()
+    )
+    return '{' + pairs + '}'
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def render_metrics() -> str:
+    """
+    Every registered metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        kind = METRIC_TYPES[type(metric)]
+        lines.append(f'# HELP {metric.name} {metric.description}')
+        lines.append(f'# TYPE {metric.name} {kind}')
+        if kind != 'histogram':
+            for labels, value in metric.samples():
+                lines.append(f'{metric.name}{format_labels(labels)} {format_value(value)}')
+            continue
+        for labels, counts, count, total in metric.samples():
+            for bound, bucket_count in zip(metric.buckets + (math.inf,), counts + [count]):
+                bucket_labels = format_labels({**labels, 'le': format_value(bound)})
+                lines.append(f'{metric.name}_bucket{bucket_labels} {bucket_count}')
+            lines.append(f'{metric.name}_sum{format_labels(labels)} {format_value(total)}')
+            lines.append(f'{metric.name}_count{format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+REGISTRY: list = []
+METRIC_TYPES = {Counter: 'counter', Gauge: 'gauge', Histogram: 'histogram'}
+
+cache_hits = Counter('cache_hits_total', 'Cache hits.', ('tier', 'family'))
+cache_misses = Counter('cache_misses_total', 'Cache misses.', ('tier', 'family'))
+password_hash_seconds = Histogram(
+    'password_hash_seconds',
+    'Time spent hashing or verifying a password.',
+    ('operation',)
+)
+password_rejected = Counter(
+    'password_rejected_total',
+    'Password operations rejected because the hashing queue was full.'
+)
+db_pool_wait_seconds = Histogram(
+    'db_pool_wait_seconds',
+    'Time spent waiting for a database connection from the pool.'
+)
+db_pool_timeouts = Counter(
+    'db_pool_timeouts_total',
+    'Checkouts that timed out because the database pool was exhausted.'
+)
+http_request_seconds = Histogram(
+    'http_request_duration_seconds',
+    'Time spent serving an HTTP request, until its response is sent.',
+    ('method', 'route', 'status')
+)
+http_requests_in_flight = Gauge(
+    'http_requests_in_flight',
+    'HTTP requests being served.',
+    ('method', 'route')
+)
+db_statement_seconds = Histogram(
+    'db_statement_duration_seconds',
+    'Time spent executing an SQL statement.',
+    ('operation',)
+)
+redis_command_seconds = Histogram(
+    'redis_command_duration_seconds',
+    'Time spent on a Redis command or pipeline.',
+    ('command',)
+)
+compression_bytes_in = Counter(
+    'compression_bytes_in_total',
+    'Bytes of files put into archives.',
+    ('compression_type',)
+)
+compression_bytes_out = Counter(
+    'compression_bytes_out_total',
+    'Bytes of archives sent.',
+    ('compression_type',)
+)
+compression_seconds = Histogram(
+    'compression_duration_seconds',
+    'Time spent building an archive.',
+    ('compression_type',),
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
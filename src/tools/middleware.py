@@ -0,0 +1,55 @@
+import time
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import http_request_seconds, http_requests_in_flight
+
+UNMATCHED_ROUTE = 'unmatched'
+
+
+class MetricsMiddleware:
+    """
+    Records the latency and the number of in-flight HTTP requests per
+    route template, so paths with ids do not multiply the label values.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def get_route(self, scope: Scope) -> str:
+        partial = None
+        for route in scope['app'].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or UNMATCHED_ROUTE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        method = scope['method']
+        route = self.get_route(scope)
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        http_requests_in_flight.inc(method=method, route=route)
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec(method=method, route=route)
+            http_request_seconds.observe(
+                time.perf_counter() - started_at,
+                method=method,
+                route=route,
+                status=status
+            )
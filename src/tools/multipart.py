@@ -0,0 +1,347 @@
+import asyncio
+import logging.config
+import os
+import time
+import uuid
+from typing import BinaryIO, Iterable, Optional
+
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import app_settings
+from src.core.logger import LOGGING
+from src.db.db import async_session
+from src.models.models import MultipartUpload
+from src.services.base import multipart_crud
+
+from .backends import BackendUpload, get_storage
+from .checksum import Checksum, checksum_range
+from .storage import remove, remove_file, run_io
+
+logging.config.dictConfig(LOGGING)
+logger = logging.getLogger('tools-multipart')
+
+_cleaner: Optional[asyncio.Task] = None
+
+
+def get_staging_path(upload_obj: MultipartUpload) -> str:
+    return os.path.join(app_settings.multipart_folder_path, str(upload_obj.id))
+
+
+def write_at(
+        src: BinaryIO,
+        staging_path: str,
+        offset: int,
+        limit: int,
+        checksums: Iterable[Checksum]
+) -> bool:
+    """
+    Writes at most ``limit`` bytes of ``src`` into ``staging_path`` starting
+    at ``offset``, feeding them to ``checksums``. Returns whether ``src``
+    had more.
+    """
+    checksums = list(checksums)
+    os.makedirs(os.path.dirname(staging_path), exist_ok=True)
+    fd = os.open(staging_path, os.O_WRONLY | os.O_CREAT, 0o644)
+    written = 0
+    try:
+        while written < limit:
+            data = src.read(min(app_settings.blob_read_size, limit - written))
+            if not data:
+                return False
+            for checksum in checksums:
+                checksum.update(data)
+            view = memoryview(data)
+            while view:
+                count = os.pwrite(fd, view, offset + written)
+                written += count
+                view = view[count:]
+    finally:
+        os.close(fd)
+    return bool(src.read(1))
+
+
+def read_at_most(
+        src: BinaryIO,
+        limit: int,
+        checksums: Iterable[Checksum]
+) -> tuple[bytes, bool]:
+    """
+    Reads at most ``limit`` bytes of ``src``, feeding them to
+    ``checksums``. Returns them and whether ``src`` had more.
+    """
+    checksums = list(checksums)
+    parts = []
+    while limit > 0 and (data := src.read(min(app_settings.blob_read_size, limit))):
+        for checksum in checksums:
+            checksum.update(data)
+        parts.append(data)
+        limit -= len(data)
+    return b''.join(parts), bool(src.read(1))
+
+
+class UploadChecksum:
+    """
+    Checksum of the leading parts of an upload written by this process,
+    fed while the next part in order streams in, with the SHA-256 of
+    every part it covers. Parts written ahead of it wait in ``pending``.
+    """
+
+    def __init__(self):
+        self.checksum = Checksum()
+        self.digests: list[str] = []
+        self.pending: set[int] = set()
+        self.hashing = False
+        self.started = time.monotonic()
+
+    @property
+    def next_part(self) -> int:
+        return len(self.digests) + 1
+
+
+_checksums: dict[uuid.UUID, UploadChecksum] = {}
+
+
+def get_part_range(upload_obj: MultipartUpload, part_number: int) -> tuple[int, int]:
+    offset = (part_number - 1) * upload_obj.part_size
+    return offset, min(upload_obj.part_size, upload_obj.size - offset)
+
+
+async def catch_up(state: UploadChecksum, upload_obj: MultipartUpload) -> None:
+    """
+    Extends the checksum with pending parts that directly follow it,
+    reading them back while the rest of the upload is still arriving.
+    Parts held by the storage backend are read back only once the
+    upload is completed.
+    """
+    if upload_obj.storage_upload_id:
+        return
+    while state.next_part in state.pending:
+        part_number = state.next_part
+        state.pending.discard(part_number)
+        part_checksum = Checksum()
+        checksum = state.checksum.copy()
+        offset, limit = get_part_range(upload_obj, part_number)
+        await run_io(
+            checksum_range,
+            get_staging_path(upload_obj),
+            offset,
+            limit,
+            (checksum, part_checksum)
+        )
+        state.checksum = checksum
+        state.digests.append(part_checksum.sha256)
+
+
+async def write_part(
+        file_obj: UploadFile,
+        upload_obj: MultipartUpload,
+        part_number: int
+) -> tuple[Checksum, Optional[str]]:
+    """
+    Parts go straight to their offset in one sparse staging file,
+    so they can arrive concurrently and in any order. Nothing is written
+    past the declared size of the upload. Parts of uploads the storage
+    backend takes itself go there instead. Returns the checksum of the
+    part, which extends the upload checksum if it is next in order, and
+    the tag the backend gave it.
+    """
+    offset, limit = get_part_range(upload_obj, part_number)
+    if limit <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Part is beyond the declared size of the upload.'
+        )
+    state = _checksums.setdefault(upload_obj.id, UploadChecksum())
+    in_order = part_number == state.next_part and not state.hashing
+    part_checksum = Checksum()
+    checksums = [part_checksum]
+    if in_order:
+        state.hashing = True
+        checksum = state.checksum.copy()
+        checksums.append(checksum)
+    etag = None
+    try:
+        if upload_obj.storage_upload_id:
+            data, has_more = await run_io(read_at_most, file_obj.file, limit, checksums)
+        else:
+            has_more = await run_io(
+                write_at,
+                file_obj.file,
+                get_staging_path(upload_obj),
+                offset,
+                limit,
+                checksums
+            )
+        if has_more:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='Part is larger than part size of the upload.'
+            )
+        if upload_obj.storage_upload_id:
+            etag = await get_storage().write_part(
+                upload_obj.path,
+                upload_obj.storage_upload_id,
+                part_number,
+                data,
+                part_checksum.sha256
+            )
+        if in_order:
+            state.checksum = checksum
+            state.digests.append(part_checksum.sha256)
+        elif part_number >= state.next_part:
+            state.pending.add(part_number)
+            in_order = part_number == state.next_part and not state.hashing
+            state.hashing = state.hashing or in_order
+        if in_order:
+            await catch_up(state, upload_obj)
+    finally:
+        if in_order:
+            state.hashing = False
+    return part_checksum, etag
+
+
+async def get_upload_checksum(upload_obj: MultipartUpload) -> Checksum:
+    """
+    Checksum of the assembled upload. Only the parts not hashed in order
+    by this process, as recorded by their digests, are read back; the
+    storage backend reads its own parts back when completing the upload.
+    """
+    state = _checksums.pop(upload_obj.id, None)
+    digests = [part.sha256 for part in upload_obj.parts]
+    if state is not None and state.digests == digests[:len(state.digests)]:
+        checksum, offset = state.checksum, state.checksum.size
+    else:
+        checksum, offset = Checksum(), 0
+    if offset < upload_obj.size and not upload_obj.storage_upload_id:
+        await run_io(
+            checksum_range,
+            get_staging_path(upload_obj),
+            offset,
+            upload_obj.size - offset,
+            (checksum,)
+        )
+    return checksum
+
+
+def drop_checksum(upload_id: uuid.UUID) -> None:
+    _checksums.pop(upload_id, None)
+
+
+async def create_parts(path: str, part_size: int, size: int) -> Optional[str]:
+    """
+    Lets the storage backend take the parts of a new upload if it can.
+    Returns the id of its upload, None when parts are staged locally.
+    """
+    if app_settings.dedup_storage:
+        # Chunking reads the assembled file from the local disk.
+        return None
+    return await get_storage().create_upload(path, part_size, size)
+
+
+def get_backend_upload(upload_obj: MultipartUpload) -> Optional[BackendUpload]:
+    if not upload_obj.storage_upload_id:
+        return None
+    return BackendUpload(
+        upload_id=upload_obj.storage_upload_id,
+        etags=[part.etag for part in upload_obj.parts],
+        size=upload_obj.size
+    )
+
+
+def get_upload_size(upload_obj: MultipartUpload) -> int:
+    part_numbers = [part.part_number for part in upload_obj.parts]
+    if not part_numbers or part_numbers != list(range(1, len(part_numbers) + 1)):
+        missing = sorted(
+            set(range(1, max(part_numbers, default=0) + 1)) - set(part_numbers)
+        )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Upload is not complete, missing parts: {missing or [1]}.'
+        )
+    for part in upload_obj.parts[:-1]:
+        if part.size != upload_obj.part_size:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f'Part {part.part_number} is smaller than part size.'
+            )
+    size = sum(part.size for part in upload_obj.parts)
+    if size != upload_obj.size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Upload has {size} of {upload_obj.size} declared bytes.'
+        )
+    return size
+
+
+async def discard_parts(upload_obj: MultipartUpload) -> None:
+    drop_checksum(upload_obj.id)
+    if upload_obj.storage_upload_id:
+        await get_storage().abort_upload(upload_obj.path, upload_obj.storage_upload_id)
+    await remove(get_staging_path(upload_obj))
+
+
+def remove_stale_files(folder_path: str, max_age: int) -> int:
+    """
+    Removes staging files left untouched for ``max_age`` seconds, such as
+    those of uploads whose rows are already gone.
+    """
+    removed = 0
+    deadline = time.time() - max_age
+    try:
+        entries = list(os.scandir(folder_path))
+    except FileNotFoundError:
+        return removed
+    for entry in entries:
+        if entry.is_file() and entry.stat().st_mtime < deadline:
+            remove_file(entry.path)
+            removed += 1
+    return removed
+
+
+async def remove_expired_uploads(db: AsyncSession) -> int:
+    """
+    Drops uploads not completed within ``multipart_upload_ttl`` seconds
+    and their parts. Returns the number of dropped uploads.
+    """
+    uploads = await multipart_crud.delete_expired_uploads(db=db)
+    for upload_obj in uploads:
+        try:
+            await discard_parts(upload_obj)
+        except Exception:
+            logger.exception('Discarding parts of upload %s failed', upload_obj.id)
+    # Uploads expired on rows deleted by another process.
+    deadline = time.monotonic() - app_settings.multipart_upload_ttl
+    for upload_id, state in list(_checksums.items()):
+        if state.started < deadline:
+            drop_checksum(upload_id)
+    await run_io(
+        remove_stale_files,
+        app_settings.multipart_folder_path,
+        app_settings.multipart_upload_ttl
+    )
+    return len(uploads)
+
+
+async def run_cleaner():
+    while True:
+        try:
+            async with async_session() as db:
+                removed = await remove_expired_uploads(db)
+            if removed:
+                logger.info('Removed %s expired multipart uploads', removed)
+        except Exception:
+            logger.exception('Removing expired multipart uploads failed')
+        await asyncio.sleep(app_settings.multipart_cleanup_interval)
+
+
+def start_multipart_cleaner():
+    global _cleaner
+    _cleaner = asyncio.create_task(run_cleaner())
+
+
+async def stop_multipart_cleaner():
+    global _cleaner
+    if _cleaner is not None:
+        _cleaner.cancel()
+        _cleaner = None
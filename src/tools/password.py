@@ -1,8 +1,26 @@
+import asyncio
+import logging.config
+import time
+from typing import Callable
+
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
+from src.core.config import app_settings
+from src.core.logger import LOGGING
+
+from .metrics import password_hash_seconds, password_rejected
+from .workers import get_password_pool
+
+logging.config.dictConfig(LOGGING)
+logger = logging.getLogger('tools-password')
+
+PASSWORD_RETRY_AFTER = 1
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+_pending_jobs = 0
+
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -10,3 +28,47 @@ def verify_password(plain_password, hashed_password):
 
 def get_password_hash(password):
     return pwd_context.hash(password)
+
+
+def timed(operation: str, func: Callable, *args):
+    started_at = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        password_hash_seconds.observe(
+            time.perf_counter() - started_at,
+            operation=operation
+        )
+
+
+async def run_in_password_pool(operation: str, func: Callable, *args):
+    """
+    Runs a bcrypt operation on the password pool. When too many are
+    already waiting the request is shed with 503 instead of queueing.
+    """
+    global _pending_jobs
+    if _pending_jobs >= app_settings.password_max_pending:
+        password_rejected.inc()
+        logger.warning('Password queue is full (%s jobs)', _pending_jobs)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Too many login attempts are being processed, try again later.',
+            headers={'Retry-After': str(PASSWORD_RETRY_AFTER)}
+        )
+    _pending_jobs += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            get_password_pool(), timed, operation, func, *args
+        )
+    finally:
+        _pending_jobs -= 1
+
+
+async def check_password(plain_password, hashed_password) -> bool:
+    return await run_in_password_pool(
+        'verify', verify_password, plain_password, hashed_password
+    )
+
+
+async def hash_password(password) -> str:
+    return await run_in_password_pool('hash', get_password_hash, password)
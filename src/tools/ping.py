@@ -0,0 +1,113 @@
+import asyncio
+import logging.config
+import math
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import text
+
+from src.core.config import app_settings
+from src.core.logger import LOGGING
+from src.db.db import engine
+
+from .cache import get_redis_client
+
+logging.config.dictConfig(LOGGING)
+logger = logging.getLogger('tools-ping')
+
+PERCENTILES = (50, 95, 99)
+
+
+class ServiceSamples:
+    """
+    Latencies of the last ``ping_window`` successful probes of a
+    service and its last error.
+    """
+
+    def __init__(self):
+        self.latencies: deque[float] = deque(maxlen=app_settings.ping_window)
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[datetime] = None
+
+
+async def probe_db() -> float:
+    async with engine.connect() as conn:
+        started_at = time.perf_counter()
+        await conn.execute(text('SELECT 1'))
+        return time.perf_counter() - started_at
+
+
+async def probe_redis() -> float:
+    started_at = time.perf_counter()
+    await get_redis_client().ping()
+    return time.perf_counter() - started_at
+
+
+PROBES = {
+    'db': probe_db,
+    'redis': probe_redis
+}
+
+samples: defaultdict[str, ServiceSamples] = defaultdict(ServiceSamples)
+_sampler: Optional[asyncio.Task] = None
+
+
+async def sample(name: str) -> None:
+    service = samples[name]
+    try:
+        latency = await asyncio.wait_for(PROBES[name](), app_settings.ping_timeout)
+    except Exception as error:
+        service.last_error = f'{type(error).__name__}: {error}'
+        service.last_error_at = datetime.utcnow()
+        logger.warning('Ping of %s failed: %s', name, service.last_error)
+    else:
+        service.latencies.append(latency)
+
+
+async def run_sampler():
+    while True:
+        await asyncio.gather(*(sample(name) for name in PROBES))
+        await asyncio.sleep(app_settings.ping_interval)
+
+
+def start_ping_sampler():
+    global _sampler
+    _sampler = asyncio.create_task(run_sampler())
+
+
+async def stop_ping_sampler():
+    global _sampler
+    if _sampler is not None:
+        _sampler.cancel()
+        _sampler = None
+
+
+def get_percentile(latencies: list[float], percentile: float) -> float:
+    """
+    Nearest-rank percentile of sorted ``latencies``.
+    """
+    rank = math.ceil(percentile / 100 * len(latencies))
+    return latencies[max(rank, 1) - 1]
+
+
+def get_ping_stats() -> dict:
+    """
+    Rolling latency percentiles of every service, without any I/O.
+    """
+    stats = {}
+    for name in PROBES:
+        service = samples[name]
+        latencies = sorted(service.latencies)
+        stats[name] = {
+            'last': service.latencies[-1] if latencies else None,
+            'samples': len(latencies),
+            'last_error': service.last_error,
+            'last_error_at': service.last_error_at
+        }
+        stats[name].update(
+            (f'p{percentile}', get_percentile(latencies, percentile) if latencies else None)
+            for percentile in PERCENTILES
+        )
+    return stats
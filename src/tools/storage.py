@@ -0,0 +1,141 @@
+"""
+Filesystem operations of the storage. Every call runs on the dedicated
+I/O thread pool, so a slow or network-backed volume stalls one of its
+threads instead of the event loop.
+"""
+import asyncio
+import os
+import shutil
+import uuid
+from typing import AsyncIterator, BinaryIO, Callable, Iterable, Optional, TypeVar
+
+from src.core.config import app_settings
+
+from .base import check_quota
+from .checksum import Checksum, read_chunk
+from .workers import get_io_pool
+
+T = TypeVar('T')
+
+
+async def run_io(func: Callable[..., T], *args) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_pool(), func, *args)
+
+
+def get_size(path: str) -> Optional[int]:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return None
+
+
+def get_sizes(paths: list[str]) -> list[Optional[int]]:
+    return [get_size(path) for path in paths]
+
+
+def make_dirs(paths: Iterable[str]) -> None:
+    for path in paths:
+        os.makedirs(path, exist_ok=True)
+
+
+def remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def move_file(source_path: str, target_path: str) -> None:
+    try:
+        os.replace(source_path, target_path)
+    except OSError:
+        # Source and target are on different filesystems.
+        shutil.move(source_path, target_path)
+
+
+def open_file(path: str, mode: str = 'rb') -> BinaryIO:
+    return open(path, mode, buffering=app_settings.io_buffer_size)
+
+
+def copy_to_file(
+        src: BinaryIO,
+        path: str,
+        limit: Optional[int] = None
+) -> Checksum:
+    """
+    Copies ``src`` into a temporary file that replaces ``path`` once
+    complete, so an aborted copy leaves the previous content in place.
+    Aborts as soon as more than ``limit`` bytes have been written.
+    """
+    temp_path = f'{path}.{uuid.uuid4().hex}.part'
+    checksum = Checksum()
+    try:
+        with open_file(temp_path, 'wb') as target:
+            while data := read_chunk(src, app_settings.upload_chunk_size, checksum):
+                check_quota(checksum.size, limit)
+                target.write(data)
+        os.replace(temp_path, path)
+    finally:
+        remove_file(temp_path)
+    return checksum
+
+
+async def stat_sizes(paths: Iterable[str]) -> list[Optional[int]]:
+    """
+    Sizes of ``paths``, None for missing ones, stated in one pool call.
+    """
+    return await run_io(get_sizes, list(paths))
+
+
+async def getsize(path: str) -> int:
+    return await run_io(os.path.getsize, path)
+
+
+async def exists(path: str) -> bool:
+    return await run_io(os.path.exists, path)
+
+
+async def makedirs(paths: Iterable[str]) -> None:
+    await run_io(make_dirs, list(paths))
+
+
+async def remove(path: str) -> None:
+    await run_io(remove_file, path)
+
+
+async def move(source_path: str, target_path: str) -> None:
+    await run_io(move_file, source_path, target_path)
+
+
+async def rmtree(path: str) -> None:
+    await run_io(shutil.rmtree, path, True)
+
+
+async def open_async(path: str, mode: str = 'rb') -> BinaryIO:
+    return await run_io(open_file, path, mode)
+
+
+async def write_file(
+        src: BinaryIO,
+        path: str,
+        limit: Optional[int] = None
+) -> Checksum:
+    return await run_io(copy_to_file, src, path, limit)
+
+
+async def iter_file(path: str, start: int, length: int) -> AsyncIterator[bytes]:
+    file_obj = await open_async(path)
+    try:
+        await run_io(file_obj.seek, start)
+        while length > 0:
+            data = await run_io(
+                file_obj.read,
+                min(length, app_settings.download_chunk_size)
+            )
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file_obj.close()
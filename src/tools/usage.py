@@ -0,0 +1,51 @@
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from src.core.config import app_settings
+from src.models.models import User
+
+
+def get_quota(quota_bytes: Optional[int]) -> Optional[int]:
+    """
+    Quota of a user, falling back to the ``user_quota`` setting.
+    None means unlimited.
+    """
+    if quota_bytes is None:
+        quota_bytes = app_settings.user_quota
+    return quota_bytes or None
+
+
+async def get_remaining_bytes(
+        db: AsyncSession,
+        user_id: UUID
+) -> Optional[int]:
+    statement = select(User.used_bytes, User.quota_bytes).where(User.id == user_id)
+    used_bytes, quota_bytes = (await db.execute(statement=statement)).one()
+    quota = get_quota(quota_bytes)
+    if quota is None:
+        return None
+    return max(quota - used_bytes, 0)
+
+
+async def add_usage(
+        db: AsyncSession,
+        user_id: UUID,
+        size_delta: int,
+        count_delta: int = 0
+) -> None:
+    """
+    Adjusts the usage counters of a user in the caller's transaction.
+    The increment is done by the database so concurrent uploads
+    do not lose updates.
+    """
+    if not size_delta and not count_delta:
+        return
+    statement = update(User).where(User.id == user_id).values(
+        used_bytes=User.used_bytes + size_delta,
+        files_count=User.files_count + count_delta
+    ).execution_options(synchronize_session=False)
+    await db.execute(statement)
@@ -0,0 +1,95 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.managers import SyncManager
+from queue import Queue
+from threading import Event
+from typing import Optional
+
+from src.core.config import app_settings
+
+# Workers are spawned rather than forked: the parent runs an event loop
+# and thread pools whose locks must not leak into the children.
+mp_context = multiprocessing.get_context('spawn')
+
+_lock = threading.Lock()
+_compression_pool: Optional[ProcessPoolExecutor] = None
+_manager: Optional[SyncManager] = None
+_password_pool: Optional[ThreadPoolExecutor] = None
+_io_pool: Optional[ThreadPoolExecutor] = None
+
+
+def get_compression_pool() -> ProcessPoolExecutor:
+    global _compression_pool
+    with _lock:
+        if _compression_pool is None:
+            _compression_pool = ProcessPoolExecutor(
+                max_workers=app_settings.compression_workers,
+                mp_context=mp_context
+            )
+        return _compression_pool
+
+
+def get_manager() -> SyncManager:
+    global _manager
+    with _lock:
+        if _manager is None:
+            _manager = mp_context.Manager()
+        return _manager
+
+
+def create_job_channels(queue_size: int) -> tuple[Queue, Event]:
+    """
+    Chunk queue and cancel event shared with a compression job. Each is
+    a round-trip to the manager process, so callers run this off the
+    event loop.
+    """
+    manager = get_manager()
+    return manager.Queue(maxsize=queue_size), manager.Event()
+
+
+def get_password_pool() -> ThreadPoolExecutor:
+    """
+    bcrypt releases the GIL while hashing, so threads are enough to keep
+    it off the event loop.
+    """
+    global _password_pool
+    with _lock:
+        if _password_pool is None:
+            _password_pool = ThreadPoolExecutor(
+                max_workers=app_settings.password_workers,
+                thread_name_prefix='password'
+            )
+        return _password_pool
+
+
+def get_io_pool() -> ThreadPoolExecutor:
+    """
+    Filesystem calls get their own threads, so a slow volume cannot
+    starve the default executor or stall the event loop.
+    """
+    global _io_pool
+    with _lock:
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(
+                max_workers=app_settings.io_workers,
+                thread_name_prefix='io'
+            )
+        return _io_pool
+
+
+def shutdown_workers() -> None:
+    global _compression_pool, _manager, _password_pool, _io_pool
+    with _lock:
+        if _io_pool is not None:
+            _io_pool.shutdown(wait=False, cancel_futures=True)
+            _io_pool = None
+        if _password_pool is not None:
+            _password_pool.shutdown(wait=False, cancel_futures=True)
+            _password_pool = None
+        if _compression_pool is not None:
+            _compression_pool.shutdown(wait=False, cancel_futures=True)
+            _compression_pool = None
+        if _manager is not None:
+            _manager.shutdown()
+            _manager = None
@@ -1,5 +1,6 @@
 import asyncio
 import shutil
+import socket
 from pathlib import Path
 
 import pytest
@@ -13,8 +14,11 @@ from sqlalchemy.orm import sessionmaker
 from src.core.config import app_settings
 from src.main import app
 from src.db.db import Base, get_session
+from src.tools import backends
 from src.tools.cache import redis_cache
 
+from tests.fake_s3 import FakeS3, FakeS3Server
+
 DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
 
@@ -112,3 +116,28 @@ async def auth_async_client_with_file(auth_async_client):
     )
     yield auth_async_client
     shutil.rmtree(app_settings.files_folder_path + '/test')
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest_asyncio.fixture
+async def s3_storage(monkeypatch):
+    fake_s3 = FakeS3(access_key='test', secret_key='test-secret', region='us-east-1')
+    port = get_free_port()
+    for name, value in (
+            ('storage_backend', 's3'),
+            ('s3_endpoint_url', f'http://127.0.0.1:{port}'),
+            ('s3_bucket', 'files'),
+            ('s3_access_key', fake_s3.access_key),
+            ('s3_secret_key', fake_s3.secret_key),
+            ('s3_region', fake_s3.region),
+    ):
+        monkeypatch.setattr(app_settings, name, value)
+    monkeypatch.setattr(backends, '_storage', None)
+    with FakeS3Server(fake_s3, port):
+        yield fake_s3
+        await backends.close_storage()
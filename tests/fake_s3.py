@@ -0,0 +1,154 @@
+"""
+In-memory stand-in for an S3-compatible server such as MinIO. It checks
+SigV4 signatures of signed and presigned requests and implements the
+object and multipart upload calls used by the S3 storage backend.
+"""
+import hmac
+import threading
+import uuid
+from typing import Optional
+from urllib.parse import parse_qsl
+from xml.etree import ElementTree
+
+import uvicorn
+from starlette.requests import Request
+from starlette.responses import Response
+
+from src.tools.s3 import (
+    UNSIGNED_PAYLOAD,
+    XML_NAMESPACE,
+    get_canonical_query,
+    get_canonical_request,
+    get_signature,
+    sha256_hex
+)
+
+
+class FakeS3:
+    def __init__(self, access_key: str, secret_key: str, region: str):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.objects: dict[tuple[str, str], bytes] = {}
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        # Code of an error document to answer the next completion with.
+        self.complete_error: Optional[str] = None
+
+    def is_signed(self, request: Request, params: dict, body: bytes) -> bool:
+        path = request.scope['raw_path'].decode()
+        host = request.headers['host']
+        if 'X-Amz-Signature' in params:
+            signature = params.pop('X-Amz-Signature')
+            amz_date = params['X-Amz-Date']
+            headers = {'host': host}
+            payload_hash = UNSIGNED_PAYLOAD
+        else:
+            authorization = dict(
+                item.strip().split('=', 1)
+                for item in request.headers.get('authorization', '').split(' ', 1)[-1].split(',')
+            )
+            signature = authorization['Signature']
+            amz_date = request.headers['x-amz-date']
+            headers = {
+                name: request.headers[name]
+                for name in authorization['SignedHeaders'].split(';')
+            }
+            payload_hash = request.headers['x-amz-content-sha256']
+            if payload_hash != sha256_hex(body):
+                return False
+        canonical_request, _ = get_canonical_request(
+            request.method,
+            path,
+            get_canonical_query(params),
+            headers,
+            payload_hash
+        )
+        expected = get_signature(self.secret_key, self.region, amz_date, canonical_request)
+        return hmac.compare_digest(signature, expected)
+
+    async def __call__(self, scope, receive, send) -> None:
+        request = Request(scope, receive)
+        response = await self.handle(request)
+        await response(scope, receive, send)
+
+    async def handle(self, request: Request) -> Response:
+        params = dict(parse_qsl(request.scope['query_string'].decode(), keep_blank_values=True))
+        body = await request.body()
+        if not self.is_signed(request, dict(params), body):
+            return Response(status_code=403)
+        bucket, key = request.url.path.lstrip('/').split('/', 1)
+        if request.method == 'POST' and 'uploads' in params:
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {}
+            return Response(
+                '<InitiateMultipartUploadResult xmlns="'
+                f'{XML_NAMESPACE.strip("{}")}"><UploadId>{upload_id}'
+                '</UploadId></InitiateMultipartUploadResult>',
+                media_type='application/xml'
+            )
+        if request.method == 'PUT' and 'uploadId' in params:
+            part_number = int(params['partNumber'])
+            self.uploads[params['uploadId']][part_number] = body
+            return Response(headers={'ETag': f'"{sha256_hex(body)}"'})
+        if request.method == 'POST' and 'uploadId' in params:
+            if self.complete_error:
+                code, self.complete_error = self.complete_error, None
+                return Response(
+                    f'<Error><Code>{code}</Code><Message>Failed</Message></Error>'
+                )
+            parts = self.uploads.pop(params['uploadId'])
+            numbers = [
+                int(number.text)
+                for number in ElementTree.fromstring(body).iter('PartNumber')
+            ]
+            self.objects[bucket, key] = b''.join(parts[number] for number in numbers)
+            return Response(
+                '<CompleteMultipartUploadResult xmlns="'
+                f'{XML_NAMESPACE.strip("{}")}"><Key>{key}</Key>'
+                '</CompleteMultipartUploadResult>'
+            )
+        if request.method == 'DELETE' and 'uploadId' in params:
+            self.uploads.pop(params['uploadId'], None)
+            return Response(status_code=204)
+        if request.method == 'PUT':
+            self.objects[bucket, key] = body
+            return Response()
+        if request.method == 'DELETE':
+            self.objects.pop((bucket, key), None)
+            return Response(status_code=204)
+        if request.method == 'GET':
+            data = self.objects.get((bucket, key))
+            if data is None:
+                return Response(status_code=404)
+            byte_range = request.headers.get('range')
+            if byte_range is None:
+                return Response(data)
+            first, last = byte_range.removeprefix('bytes=').split('-')
+            end = int(last) if last else len(data) - 1
+            return Response(data[int(first):end + 1], status_code=206)
+        return Response(status_code=405)
+
+
+class FakeS3Server:
+    """
+    Serves a ``FakeS3`` over HTTP from a thread, so that compression
+    workers in other processes can reach it too.
+    """
+
+    def __init__(self, fake_s3: FakeS3, port: int):
+        self.server = uvicorn.Server(
+            uvicorn.Config(fake_s3, host='127.0.0.1', port=port, log_level='warning')
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> 'FakeS3Server':
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError('Fake S3 server failed to start.')
+            threading.Event().wait(0.01)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.should_exit = True
+        self.thread.join()
@@ -1,12 +1,39 @@
+import asyncio
+import hashlib
+import io
 import os.path
+import random
+import tarfile
+import threading
+import uuid
+import zlib
 from http import HTTPStatus
 from datetime import datetime
 from pathlib import Path
 
 import aiofile
+import anyio
+import py7zr
 import pytest
+from fastapi_cache import caches
+from fastapi import HTTPException, UploadFile
 from httpx import AsyncClient
+from sqlalchemy import select, text
 from src.core.config import app_settings
+from src.models.models import Directory
+from src.schemas.file import FilesListQuery
+from src.services import auth
+from src.tools import archive_cache
+from src.tools import blobs
+from src.tools import cache as cache_tools
+from src.tools import directory as directory_tools
+from src.tools import file_create
+from src.tools import files as files_tools
+from src.tools import multipart as multipart_tools
+from src.tools import ping as ping_tools
+from src.tools import storage
+from src.tools.files import get_files_list_key
+from src.tools.s3 import S3Error
 
 
 @pytest.mark.asyncio
@@ -65,6 +92,21 @@ async def test_auth(test_app):
 
         assert response_failed.status_code == HTTPStatus.UNAUTHORIZED
 
+@pytest.mark.asyncio
+async def test_auth_overload(test_app, monkeypatch):
+    monkeypatch.setattr(app_settings, 'password_max_pending', 0)
+    async with AsyncClient(app=test_app, base_url='http://127.0.0.1:8080/api/v1') as ac:
+        response = await ac.post(
+            '/authorization/auth',
+            json={
+                'username': 'test1',
+                'password': 'test1'
+            }
+        )
+        assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+        assert 'Retry-After' in response.headers
+
+
 @pytest.mark.asyncio
 async def test_ping(test_app):
     async with AsyncClient(app=test_app, base_url='http://127.0.0.1:8080/api/v1') as ac:
@@ -76,6 +118,30 @@ async def test_ping(test_app):
         assert 'redis' in response.json()
 
 
+@pytest.mark.asyncio
+async def test_ping_sampler(test_app, monkeypatch):
+    latencies = iter([0.003, 0.001, 0.002])
+
+    async def probe_db():
+        return next(latencies)
+
+    async def probe_redis():
+        raise ConnectionError('refused')
+
+    monkeypatch.setattr(ping_tools, 'PROBES', {'db': probe_db, 'redis': probe_redis})
+    monkeypatch.setattr(ping_tools, 'samples', ping_tools.defaultdict(ping_tools.ServiceSamples))
+    for _ in range(3):
+        await asyncio.gather(ping_tools.sample('db'), ping_tools.sample('redis'))
+    async with AsyncClient(app=test_app, base_url='http://127.0.0.1:8080/api/v1') as ac:
+        response = await ac.get('/ping/')
+    assert response.status_code == HTTPStatus.OK
+    db, redis = response.json()['db'], response.json()['redis']
+    assert (db['last'], db['p50'], db['p99'], db['samples']) == (0.002, 0.002, 0.003, 3)
+    assert db['last_error'] is None
+    assert redis['samples'] == 0
+    assert redis['last_error'] == 'ConnectionError: refused'
+
+
 @pytest.mark.asyncio
 async def test_upload_file(auth_async_client):
     path_of_upload_file = Path('file_for_test.txt')
@@ -91,6 +157,381 @@ async def test_upload_file(auth_async_client):
     assert 'id' in response.json()
 
 
+@pytest.mark.asyncio
+async def test_list_files_pages(auth_async_client_with_file):
+    for name in ('c.txt', 'a.txt', 'b.log'):
+        await auth_async_client_with_file.post(
+            '/files/upload',
+            params={
+                'path': '/test/pages'
+            },
+            files={'file': (name, b'data')},
+        )
+    params = {
+        'path_prefix': '/test/pages/',
+        'sort_by': 'name',
+        'limit': 2
+    }
+    response = await auth_async_client_with_file.get('/files/list', params=params)
+    assert response.status_code == HTTPStatus.OK
+    assert [file['name'] for file in response.json()['files']] == ['a.txt', 'b.log']
+
+    response_next = await auth_async_client_with_file.get(
+        '/files/list',
+        params={**params, 'cursor': response.json()['next_cursor']}
+    )
+    assert [file['name'] for file in response_next.json()['files']] == ['c.txt']
+    assert response_next.json()['next_cursor'] is None
+
+    response_filtered = await auth_async_client_with_file.get(
+        '/files/list',
+        params={**params, 'name': '*.txt', 'order': 'desc'}
+    )
+    assert [file['name'] for file in response_filtered.json()['files']] == ['c.txt', 'a.txt']
+
+
+@pytest.mark.asyncio
+async def test_list_files_after_upload(auth_async_client_with_file):
+    params = {'path_prefix': '/test/fresh/'}
+    response = await auth_async_client_with_file.get('/files/list', params=params)
+    assert response.json()['files'] == []
+
+    await auth_async_client_with_file.post(
+        '/files/upload',
+        params={
+            'path': '/test/fresh'
+        },
+        files={'file': ('new.txt', b'data')},
+    )
+    response_fresh = await auth_async_client_with_file.get('/files/list', params=params)
+    assert [file['name'] for file in response_fresh.json()['files']] == ['new.txt']
+
+
+@pytest.mark.asyncio
+async def test_upload_batch(test_app, auth_async_client_with_file):
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w:gz') as tar:
+        for name, data in (('docs/a.txt', b'aaa'), ('docs/deep/b.txt', b'bb')):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    response = await auth_async_client_with_file.post(
+        '/files/upload/batch',
+        params={
+            'path': '/test/batch'
+        },
+        files=[
+            ('files', ('one.txt', b'1')),
+            ('files', ('sub/two.txt', b'22')),
+            ('archive', ('batch.tar.gz', archive.getvalue())),
+        ],
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    sizes = {file['path']: file['size'] for file in response.json()}
+    assert sizes == {
+        '/test/batch/one.txt': 1,
+        '/test/batch/sub/two.txt': 2,
+        '/test/batch/docs/a.txt': 3,
+        '/test/batch/docs/deep/b.txt': 2
+    }
+    checksums = {file['path']: file['sha256'] for file in response.json()}
+    assert checksums['/test/batch/docs/a.txt'] == hashlib.sha256(b'aaa').hexdigest()
+    async with aiofile.async_open(
+            app_settings.files_folder_path + '/test/batch/docs/deep/b.txt', 'rb'
+    ) as afp:
+        assert await afp.read() == b'bb'
+
+    params = {'path_prefix': '/test/batch/', 'name': 'one.txt'}
+    response = await auth_async_client_with_file.get('/files/list', params=params)
+    assert [file['size'] for file in response.json()['files']] == [1]
+    async with AsyncClient(app=test_app, base_url='http://127.0.0.1:8080/api/v1') as ac:
+        await ac.post('/register/', json={'username': 'batch', 'password': 'batch'})
+        response = await ac.post('/authorization/auth', json={'username': 'batch', 'password': 'batch'})
+        ac.headers = {'Authorization': 'Bearer ' + response.json()['access_token']}
+        response = await ac.post(
+            '/files/upload/batch',
+            params={
+                'path': '/test/batch'
+            },
+            files=[('files', ('one.txt', b'111'))],
+        )
+        assert response.status_code == HTTPStatus.CREATED
+    response = await auth_async_client_with_file.get('/files/list', params=params)
+    assert [file['size'] for file in response.json()['files']] == [3]
+
+
+@pytest.mark.asyncio
+async def test_search_files(auth_async_client_with_file):
+    response = await auth_async_client_with_file.post(
+        '/files/upload/batch',
+        params={
+            'path': '/test/search'
+        },
+        files=[
+            ('files', ('app.log', b'1')),
+            ('files', ('x/app.log', b'1')),
+            ('files', ('x/y/db.log', b'1')),
+            ('files', ('x/notes_1%.txt', b'1')),
+        ],
+    )
+    assert response.status_code == HTTPStatus.CREATED
+
+    async def search(**params):
+        response = await auth_async_client_with_file.get(
+            '/files/search',
+            params=params
+        )
+        assert response.status_code == HTTPStatus.OK
+        return [file['path'] for file in response.json()['files']]
+
+    assert await search(path_prefix='/test/search/x/', name='*.log') == [
+        '/test/search/x/app.log',
+        '/test/search/x/y/db.log'
+    ]
+    assert await search(path='/test/search/*/app.log') == ['/test/search/x/app.log']
+    assert await search(contains='_1%') == ['/test/search/x/notes_1%.txt']
+    first = (await auth_async_client_with_file.get(
+        '/files/search',
+        params={'contains': 'search/', 'limit': 3}
+    )).json()
+    second = await search(contains='search/', cursor=first['next_cursor'])
+    assert [file['path'] for file in first['files']] + second == [
+        '/test/search/app.log',
+        '/test/search/x/app.log',
+        '/test/search/x/notes_1%.txt',
+        '/test/search/x/y/db.log'
+    ]
+
+
+@pytest.mark.asyncio
+async def test_directory_tree(test_app, auth_async_client_with_file):
+    await auth_async_client_with_file.post(
+        '/files/upload/batch',
+        params={
+            'path': '/test/tree'
+        },
+        files=[
+            ('files', ('a.txt', b'1')),
+            ('files', ('sub/b.txt', b'22')),
+            ('files', ('sub/deep/c.txt', b'333')),
+        ],
+    )
+    await auth_async_client_with_file.post(
+        '/files/upload',
+        params={
+            'path': '/test/tree/sub'
+        },
+        files={'file': ('b.txt', b'2222')},
+    )
+    await auth_async_client_with_file.post(
+        '/files/upload',
+        params={
+            'path': '/test/tree/sub/deep'
+        },
+        files={'file': ('d.txt', b'4')},
+    )
+    response = await auth_async_client_with_file.get(
+        '/files/tree',
+        params={
+            'path': '/test/tree'
+        }
+    )
+    assert response.status_code == HTTPStatus.OK
+    tree = response.json()
+    assert (tree['size'], tree['files_count']) == (9, 4)
+    assert [file['name'] for file in tree['files']] == ['a.txt']
+    assert [
+        (directory['path'], directory['size'], directory['files_count'])
+        for directory in tree['directories']
+    ] == [('/test/tree/sub', 8, 3)]
+
+    response = await auth_async_client_with_file.get(
+        '/files/tree',
+        params={
+            'path': '/test/tree/sub/deep'
+        }
+    )
+    assert [file['name'] for file in response.json()['files']] == ['c.txt', 'd.txt']
+    response = await auth_async_client_with_file.get(
+        '/files/tree',
+        params={
+            'path': '/test/missing'
+        }
+    )
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+    async with AsyncClient(app=test_app, base_url='http://127.0.0.1:8080/api/v1') as ac:
+        await ac.post('/register/', json={'username': 'tree', 'password': 'tree'})
+        response = await ac.post('/authorization/auth', json={'username': 'tree', 'password': 'tree'})
+        ac.headers = {'Authorization': 'Bearer ' + response.json()['access_token']}
+        await ac.post(
+            '/files/upload',
+            params={
+                'path': '/test/tree/other'
+            },
+            files={'file': ('e.txt', b'55555')},
+        )
+        response = await ac.get('/files/tree', params={'path': '/test/tree'})
+        tree = response.json()
+        assert (tree['size'], tree['files_count'], tree['files']) == (5, 1, [])
+        assert [directory['path'] for directory in tree['directories']] == ['/test/tree/other']
+        response = await ac.get('/files/tree', params={'path': '/test/tree/sub'})
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        response = await ac.get('/files/tree', params={'path': '/'})
+        tree = response.json()
+        assert (tree['size'], tree['files_count']) == (5, 1)
+        assert [
+            (directory['path'], directory['size'], directory['files_count'])
+            for directory in tree['directories']
+        ] == [('/test', 5, 1)]
+    response = await auth_async_client_with_file.get('/files/tree', params={'path': '/test/tree'})
+    assert (response.json()['size'], response.json()['files_count']) == (9, 4)
+    assert [
+        directory['path'] for directory in response.json()['directories']
+    ] == ['/test/tree/sub']
+
+
+@pytest.mark.asyncio
+async def test_usage_and_quota(auth_async_client_with_file, monkeypatch):
+    usage = (await auth_async_client_with_file.get('/files/usage')).json()
+    response = await auth_async_client_with_file.post(
+        '/files/upload',
+        params={
+            'path': '/test/quota'
+        },
+        files={'file': ('quota.txt', b'12345')},
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    response = await auth_async_client_with_file.post(
+        '/files/upload',
+        params={
+            'path': '/test/quota'
+        },
+        files={'file': ('quota.txt', b'123')},
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    response = await auth_async_client_with_file.get('/files/usage')
+    assert response.json()['used_bytes'] == usage['used_bytes'] + 3
+    assert response.json()['files_count'] == usage['files_count'] + 1
+    assert response.json()['quota_bytes'] is None
+
+    monkeypatch.setattr(
+        app_settings, 'user_quota', usage['used_bytes'] + 3 + 4
+    )
+    monkeypatch.setattr(app_settings, 'upload_chunk_size', 2)
+    response = await auth_async_client_with_file.post(
+        '/files/upload',
+        params={
+            'path': '/test/quota'
+        },
+        files={'file': ('big.txt', b'12345')},
+    )
+    assert response.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    assert os.listdir(app_settings.files_folder_path + '/test/quota') == ['quota.txt']
+    response = await auth_async_client_with_file.post(
+        '/files/upload',
+        params={
+            'path': '/test/quota'
+        },
+        files={'file': ('quota.txt', b'1234567')},
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    response = await auth_async_client_with_file.get('/files/usage')
+    assert response.json()['used_bytes'] == usage['used_bytes'] + 7
+    assert response.json()['quota_bytes'] == usage['used_bytes'] + 7
+
+
+@pytest.mark.asyncio
+async def test_failed_upload_discards_file(auth_async_client_with_file, monkeypatch):
+    async def add_usage(*args, **kwargs):
+        raise RuntimeError('insert failed')
+
+    monkeypatch.setattr(file_create, 'add_usage', add_usage)
+    with pytest.raises(RuntimeError):
+        await auth_async_client_with_file.post(
+            '/files/upload',
+            params={
+                'path': '/test/failed'
+            },
+            files={'file': ('failed.txt', b'never recorded')},
+        )
+    assert not os.path.exists(app_settings.files_folder_path + '/test/failed/failed.txt')
+
+
+@pytest.mark.asyncio
+async def test_blob_chunks_after_insertion(monkeypatch):
+    monkeypatch.setattr(app_settings, 'chunk_min_size', 256)
+    monkeypatch.setattr(app_settings, 'chunk_avg_size', 1024)
+    monkeypatch.setattr(app_settings, 'chunk_max_size', 4096)
+    words = random.Random(0).choices([f'word{number}' for number in range(500)], k=20000)
+    text = ' '.join(words).encode()
+    chunks = []
+    for data in (text, text[:100] + b'inserted ' + text[100:]):
+        _, manifest = await blobs.write_blob(UploadFile(filename='text.txt', file=io.BytesIO(data)))
+        chunks.append({digest for digest, _ in blobs.load_manifest(manifest)})
+    assert len(chunks[0]) > 50
+    assert len(chunks[0] & chunks[1]) >= 0.9 * len(chunks[1])
+
+
+@pytest.mark.asyncio
+async def test_storage_io_pool(auth_async_client_with_file, monkeypatch):
+    threads = []
+    copy_to_file = storage.copy_to_file
+
+    def copy_on_thread(*args):
+        threads.append(threading.current_thread().name)
+        return copy_to_file(*args)
+
+    monkeypatch.setattr(storage, 'copy_to_file', copy_on_thread)
+    response = await auth_async_client_with_file.post(
+        '/files/upload',
+        params={
+            'path': '/test/io'
+        },
+        files={'file': ('io.txt', b'io pool')},
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    assert len(threads) == 1 and threads[0].startswith('io')
+    assert await storage.stat_sizes([
+        app_settings.files_folder_path + '/test/io/io.txt',
+        app_settings.files_folder_path + '/test/io/missing.txt'
+    ]) == [7, None]
+
+
+@pytest.mark.asyncio
+async def test_verify_file(auth_async_client_with_file):
+    content = b'checksum me'
+    response = await auth_async_client_with_file.post(
+        '/files/upload',
+        params={
+            'path': '/test/verify'
+        },
+        files={'file': ('verify.txt', content)},
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json()['sha256'] == hashlib.sha256(content).hexdigest()
+    assert response.json()['crc32'] == zlib.crc32(content)
+
+    response = await auth_async_client_with_file.post(
+        '/files/verify',
+        params={
+            'path': '/test/verify/verify.txt'
+        }
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['valid'] is True
+
+    Path(app_settings.files_folder_path + '/test/verify/verify.txt').write_bytes(b'corrupt me!')
+    response = await auth_async_client_with_file.post(
+        '/files/verify',
+        params={
+            'path': '/test/verify/verify.txt'
+        }
+    )
+    assert response.json()['valid'] is False
+    assert response.json()['sha256'] == hashlib.sha256(b'corrupt me!').hexdigest()
+
+
 @pytest.mark.asyncio
 async def test_download_file(auth_async_client_with_file):
     req = auth_async_client_with_file.build_request(
@@ -108,7 +549,74 @@ async def test_download_file(auth_async_client_with_file):
 
 
 @pytest.mark.asyncio
-async def test_download_compressed_file(auth_async_client_with_file):
+async def test_download_file_range(auth_async_client_with_file):
+    content = Path('file_for_test.txt').read_bytes()
+    response = await auth_async_client_with_file.get(
+        '/files/download',
+        params={
+            'path': '/test/file_for_test.txt'
+        },
+        headers={'Range': 'bytes=1-4'}
+    )
+    assert response.status_code == HTTPStatus.PARTIAL_CONTENT
+    assert response.content == content[1:5]
+    assert response.headers['Content-Range'] == f'bytes 1-4/{len(content)}'
+
+    response_not_modified = await auth_async_client_with_file.get(
+        '/files/download',
+        params={
+            'path': '/test/file_for_test.txt'
+        },
+        headers={'If-None-Match': response.headers['ETag']}
+    )
+    assert response_not_modified.status_code == HTTPStatus.NOT_MODIFIED
+
+
+@pytest.mark.asyncio
+async def test_download_file_name(auth_async_client_with_file, monkeypatch):
+    monkeypatch.setattr(app_settings, 'download_redirect', False)
+    response = await auth_async_client_with_file.post(
+        '/files/upload',
+        params={
+            'path': '/test/names'
+        },
+        files={'file': ('отчёт;1,.txt', b'report')},
+    )
+    response = await auth_async_client_with_file.get(
+        '/files/download',
+        params={
+            'path': response.json()['id']
+        }
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['Content-Disposition'] == (
+        'attachment; filename="_____;1,.txt"; '
+        "filename*=UTF-8''%D0%BE%D1%82%D1%87%D1%91%D1%82%3B1%2C.txt"
+    )
+
+
+@pytest.mark.asyncio
+async def test_compression_slots(monkeypatch):
+    monkeypatch.setattr(app_settings, 'compression_max_jobs', 1)
+    chunks = files_tools.start_compression('/test', 'zip')
+    with pytest.raises(HTTPException) as error:
+        files_tools.start_compression('/test', 'zip')
+    assert error.value.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    del chunks
+    chunks = files_tools.start_compression('/test', 'zip')
+    del chunks
+
+
+@pytest.mark.asyncio
+async def test_download_compressed_file(auth_async_client_with_file, monkeypatch):
+    threads = []
+    create_job_channels = files_tools.create_job_channels
+
+    def create_channels(queue_size):
+        threads.append(threading.current_thread())
+        return create_job_channels(queue_size)
+
+    monkeypatch.setattr(files_tools, 'create_job_channels', create_channels)
     req = auth_async_client_with_file.build_request(
         'GET',
         '/files/download',
@@ -127,3 +635,440 @@ async def test_download_compressed_file(auth_async_client_with_file):
     assert os.path.exists(result_path)
     assert os.path.getsize(result_path) > 5
     os.remove(result_path)
+    assert threads and threading.main_thread() not in threads
+
+
+@pytest.mark.asyncio
+async def test_download_compressed_directory(auth_async_client_with_file):
+    path_of_upload_file = Path('file_for_test.txt')
+    file = {'file': path_of_upload_file.open('rb')}
+    await auth_async_client_with_file.post(
+        '/files/upload',
+        params={
+            'path': '/test/nested'
+        },
+        files=file,
+    )
+    response = await auth_async_client_with_file.get(
+        '/files/download',
+        params={
+            'path': '/test',
+            'compression_type': 'tar'
+        }
+    )
+    assert response.status_code == HTTPStatus.OK
+    with tarfile.open(fileobj=io.BytesIO(response.content)) as tar:
+        names = tar.getnames()
+    assert 'file_for_test.txt' in names
+    assert 'nested/file_for_test.txt' in names
+
+
+@pytest.mark.asyncio
+async def test_download_cached_archive(auth_async_client_with_file, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_settings, 'archive_cache_folder_path', str(tmp_path))
+    params = {
+        'path': '/test/file_for_test.txt',
+        'compression_type': '7z'
+    }
+    response = await auth_async_client_with_file.get('/files/download', params=params)
+    assert response.status_code == HTTPStatus.OK
+    cached = [
+        name for name in os.listdir(tmp_path)
+        if name.endswith('.7z')
+    ]
+    assert len(cached) == 1
+
+    response_cached = await auth_async_client_with_file.get('/files/download', params=params)
+    assert response_cached.status_code == HTTPStatus.OK
+    assert response_cached.content == response.content
+
+
+@pytest.mark.asyncio
+async def test_archive_cache_fill_cancelled(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_settings, 'archive_cache_folder_path', str(tmp_path))
+
+    async def chunks():
+        while True:
+            await asyncio.sleep(0.01)
+            yield b'chunk'
+
+    async def download():
+        fill = archive_cache.fill_archive_cache(chunks(), str(tmp_path / 'abc.zip'))
+        async for _ in fill:
+            pass
+
+    async with anyio.create_task_group() as task_group:
+        task_group.start_soon(download)
+        await asyncio.sleep(0.1)
+        task_group.cancel_scope.cancel()
+    assert os.listdir(tmp_path) == []
+
+    stale_path = tmp_path / 'abc.zip.0.tmp'
+    stale_path.write_bytes(b'partial')
+    os.utime(stale_path, (0, 0))
+    archive_cache.evict_archives()
+    assert not stale_path.exists()
+
+
+@pytest.mark.asyncio
+async def test_s3_storage(auth_async_client_with_file, s3_storage, monkeypatch):
+    monkeypatch.setattr(app_settings, 's3_part_size', 4)
+    content = b'0123456789'
+    response = await auth_async_client_with_file.post(
+        '/files/upload',
+        params={
+            'path': '/s3'
+        },
+        files={'file': ('data.bin', content)},
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    assert s3_storage.objects['files', 's3/data.bin'] == content
+    assert not s3_storage.uploads
+    assert not os.path.exists(app_settings.files_folder_path + '/s3')
+
+    s3_storage.complete_error = 'InternalError'
+    with pytest.raises(S3Error):
+        await auth_async_client_with_file.post(
+            '/files/upload',
+            params={
+                'path': '/s3'
+            },
+            files={'file': ('failed.bin', content)},
+        )
+    assert ('files', 's3/failed.bin') not in s3_storage.objects
+    assert not s3_storage.uploads
+
+    response = await auth_async_client_with_file.get(
+        '/files/download',
+        params={
+            'path': '/s3/data.bin'
+        }
+    )
+    assert response.status_code == HTTPStatus.TEMPORARY_REDIRECT
+    async with AsyncClient() as client:
+        presigned = await client.get(response.headers['location'])
+        assert presigned.content == content
+        tampered = await client.get(response.headers['location'].replace('data', 'date'))
+        assert tampered.status_code == HTTPStatus.FORBIDDEN
+
+    response = await auth_async_client_with_file.get(
+        '/files/download',
+        params={
+            'path': '/s3/data.bin'
+        },
+        headers={'Range': 'bytes=2-5'}
+    )
+    assert response.status_code == HTTPStatus.PARTIAL_CONTENT
+    assert response.content == content[2:6]
+
+    response = await auth_async_client_with_file.get(
+        '/files/download',
+        params={
+            'path': '/s3',
+            'compression_type': '7z'
+        }
+    )
+    assert response.status_code == HTTPStatus.OK
+    with py7zr.SevenZipFile(io.BytesIO(response.content)) as seven_zip:
+        assert seven_zip.readall()['data.bin'].read() == content
+
+    part_size = app_settings.multipart_min_part_size
+    params = {'path': '/s3/multipart.bin', 'part_size': part_size, 'size': part_size + 10}
+    response = await auth_async_client_with_file.post('/files/multipart/initiate', params=params)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    monkeypatch.setattr(app_settings, 's3_min_part_size', part_size)
+    response = await auth_async_client_with_file.post('/files/multipart/initiate', params=params)
+    upload_id = response.json()['id']
+    parts = {1: b'a' * part_size, 2: b'b' * 10}
+    for part_number in (2, 1):
+        await auth_async_client_with_file.put(
+            f'/files/multipart/{upload_id}/parts/{part_number}',
+            files={'file': ('multipart.bin', parts[part_number])}
+        )
+    assert len(s3_storage.uploads) == 1
+    assert not os.path.exists(os.path.join(app_settings.multipart_folder_path, upload_id))
+    response = await auth_async_client_with_file.post(f'/files/multipart/{upload_id}/complete')
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json()['sha256'] == hashlib.sha256(parts[1] + parts[2]).hexdigest()
+    assert s3_storage.objects['files', 's3/multipart.bin'] == parts[1] + parts[2]
+    assert not s3_storage.uploads
+
+    response = await auth_async_client_with_file.post('/files/multipart/initiate', params=params)
+    upload_id = response.json()['id']
+    await auth_async_client_with_file.put(
+        f'/files/multipart/{upload_id}/parts/1',
+        files={'file': ('multipart.bin', parts[1])}
+    )
+    await auth_async_client_with_file.delete(f'/files/multipart/{upload_id}')
+    assert not s3_storage.uploads
+
+
+@pytest.mark.asyncio
+async def test_metrics(auth_async_client_with_file):
+    await auth_async_client_with_file.get('/files/list')
+    await auth_async_client_with_file.get(
+        '/files/download',
+        params={
+            'path': '/test/file_for_test.txt',
+            'compression_type': 'zip'
+        }
+    )
+    response = await auth_async_client_with_file.get('/metrics/')
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    lines = response.text.splitlines()
+    assert '# TYPE http_request_duration_seconds histogram' in lines
+    assert any(
+        line.startswith(
+            'http_request_duration_seconds_count{method="GET",'
+            'route="/api/v1/files/list",status="200"}'
+        )
+        for line in lines
+    )
+    assert 'http_requests_in_flight{method="GET",route="/api/v1/metrics/"} 1.0' in lines
+    for prefix in (
+            'db_statement_duration_seconds_count{operation="SELECT"}',
+            'redis_command_duration_seconds_count{command="get"}',
+            'cache_misses_total{tier="redis",family="files_list"}',
+            'compression_bytes_out_total{compression_type="zip"}',
+    ):
+        assert any(line.startswith(prefix) for line in lines), prefix
+
+
+@pytest.mark.asyncio
+async def test_multipart_upload(auth_async_client_with_file, monkeypatch):
+    part_size = app_settings.multipart_min_part_size
+    response_initiate = await auth_async_client_with_file.post(
+        '/files/multipart/initiate',
+        params={
+            'path': '/test/multipart/data.bin',
+            'part_size': part_size,
+            'size': part_size + 10
+        }
+    )
+    assert response_initiate.status_code == HTTPStatus.CREATED
+    upload_id = response_initiate.json()['id']
+
+    response_beyond = await auth_async_client_with_file.put(
+        f'/files/multipart/{upload_id}/parts/3',
+        files={'file': ('data.bin', b'c')}
+    )
+    assert response_beyond.status_code == HTTPStatus.BAD_REQUEST
+
+    parts = {1: b'a' * part_size, 2: b'b' * 10}
+    for part_number in (2, 1):
+        response_part = await auth_async_client_with_file.put(
+            f'/files/multipart/{upload_id}/parts/{part_number}',
+            files={'file': ('data.bin', parts[part_number])}
+        )
+        assert response_part.status_code == HTTPStatus.OK
+
+    response_upload = await auth_async_client_with_file.get(
+        f'/files/multipart/{upload_id}'
+    )
+    assert [part['part_number'] for part in response_upload.json()['parts']] == [1, 2]
+    assert [part['sha256'] for part in response_upload.json()['parts']] == [
+        hashlib.sha256(parts[part_number]).hexdigest() for part_number in (1, 2)
+    ]
+
+    def read_staging_file(*args):
+        raise AssertionError('Completion read the staging file back.')
+
+    monkeypatch.setattr(multipart_tools, 'checksum_range', read_staging_file)
+    response_complete = await auth_async_client_with_file.post(
+        f'/files/multipart/{upload_id}/complete'
+    )
+    assert response_complete.status_code == HTTPStatus.CREATED
+    assert response_complete.json()['size'] == part_size + 10
+    assert response_complete.json()['sha256'] == hashlib.sha256(parts[1] + parts[2]).hexdigest()
+    async with aiofile.async_open(
+            app_settings.files_folder_path + '/test/multipart/data.bin', 'rb'
+    ) as afp:
+        assert await afp.read() == parts[1] + parts[2]
+    monkeypatch.undo()
+
+    response_initiate = await auth_async_client_with_file.post(
+        '/files/multipart/initiate',
+        params={
+            'path': '/test/multipart/restarted.bin',
+            'part_size': part_size,
+            'size': 10
+        }
+    )
+    upload_id = response_initiate.json()['id']
+    await auth_async_client_with_file.put(
+        f'/files/multipart/{upload_id}/parts/1',
+        files={'file': ('restarted.bin', parts[2])}
+    )
+    # Another process completes the upload without the running checksum.
+    multipart_tools.drop_checksum(uuid.UUID(upload_id))
+    response_complete = await auth_async_client_with_file.post(
+        f'/files/multipart/{upload_id}/complete'
+    )
+    assert response_complete.json()['sha256'] == hashlib.sha256(parts[2]).hexdigest()
+
+    response_initiate = await auth_async_client_with_file.post(
+        '/files/multipart/initiate',
+        params={
+            'path': '/test/multipart/aborted.bin',
+            'part_size': part_size,
+            'size': part_size
+        }
+    )
+    response_abort = await auth_async_client_with_file.delete(
+        f'/files/multipart/{response_initiate.json()["id"]}'
+    )
+    assert response_abort.status_code == HTTPStatus.NO_CONTENT
+
+
+@pytest.mark.asyncio
+async def test_multipart_quota_and_expiry(auth_async_client_with_file, async_session, monkeypatch):
+    part_size = app_settings.multipart_min_part_size
+    usage = (await auth_async_client_with_file.get('/files/usage')).json()
+    monkeypatch.setattr(app_settings, 'user_quota', usage['used_bytes'] + part_size)
+    params = {'path': '/test/multipart/quota.bin', 'part_size': part_size}
+    response_too_large = await auth_async_client_with_file.post(
+        '/files/multipart/initiate',
+        params={**params, 'size': part_size + 1}
+    )
+    assert response_too_large.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+    response_initiate = await auth_async_client_with_file.post(
+        '/files/multipart/initiate',
+        params={**params, 'size': part_size}
+    )
+    assert response_initiate.status_code == HTTPStatus.CREATED
+    upload_id = response_initiate.json()['id']
+    response_pending = await auth_async_client_with_file.post(
+        '/files/multipart/initiate',
+        params={**params, 'size': 1}
+    )
+    assert response_pending.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+    await auth_async_client_with_file.put(
+        f'/files/multipart/{upload_id}/parts/1',
+        files={'file': ('quota.bin', b'a' * 10)}
+    )
+    staging_path = os.path.join(app_settings.multipart_folder_path, upload_id)
+    assert os.path.exists(staging_path)
+    monkeypatch.setattr(app_settings, 'multipart_upload_ttl', -1)
+    async with async_session() as db:
+        assert await multipart_tools.remove_expired_uploads(db) >= 1
+    assert not os.path.exists(staging_path)
+    response_expired = await auth_async_client_with_file.get(
+        f'/files/multipart/{upload_id}'
+    )
+    assert response_expired.status_code == HTTPStatus.NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_local_cache_invalidation(auth_async_client_with_file):
+    response = await auth_async_client_with_file.get('/files/list')
+    assert response.status_code == HTTPStatus.OK
+    redis_key = await get_files_list_key(
+        response.json()['account_id'],
+        FilesListQuery()
+    )
+    assert cache_tools.local_cache.get(redis_key) == response.json()
+    await files_tools.invalidate_files_cache(response.json()['account_id'], [])
+    assert await get_files_list_key(response.json()['account_id'], FilesListQuery()) != redis_key
+
+    cache_tools.start_invalidation_listener()
+    try:
+        await asyncio.sleep(0.1)
+        cache_tools.local_cache.set(redis_key, response.json())
+        await cache_tools.get_redis_client().publish(
+            app_settings.cache_invalidation_channel,
+            f'other-instance ["{redis_key}"]'
+        )
+        await asyncio.sleep(0.1)
+        assert cache_tools.local_cache.get(redis_key) is None
+    finally:
+        await cache_tools.stop_invalidation_listener()
+
+
+@pytest.mark.asyncio
+async def test_cache_single_flight(test_app):
+    calls = 0
+
+    async def load_data():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return {'calls': calls}
+
+    redis_key = f'single_flight_test_{uuid.uuid4().hex}'
+    cache = caches.get('TEST_REDIS')
+    try:
+        results = await asyncio.gather(*(
+            cache_tools.get_cache_or_data(
+                redis_key=redis_key,
+                cache=cache,
+                db_func_obj=load_data
+            )
+            for _ in range(10)
+        ))
+    finally:
+        await cache_tools.delete_cache(cache, redis_key)
+    assert calls == 1
+    assert all(result == {'calls': 1} for result in results)
+
+
+@pytest.mark.asyncio
+async def test_cache_load_own_session(test_app, async_session):
+    sessions = []
+
+    async def load_data(db):
+        sessions.append(db)
+        await asyncio.sleep(0.1)
+        await db.execute(text('SELECT 1'))
+        return {'loaded': True}
+
+    redis_key = f'own_session_test_{uuid.uuid4().hex}'
+    cache = caches.get('TEST_REDIS')
+    try:
+        async with async_session() as db:
+            loads = [
+                asyncio.create_task(cache_tools.get_cache_or_data(
+                    redis_key=redis_key,
+                    cache=cache,
+                    db_func_obj=load_data,
+                    db_func_args=(db,)
+                ))
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0.05)
+            loads[0].cancel()
+        assert await loads[1] == {'loaded': True}
+    finally:
+        await cache_tools.delete_cache(cache, redis_key)
+    assert len(sessions) == 1 and sessions[0] is not db
+
+
+@pytest.mark.asyncio
+async def test_cached_principal(auth_async_client, monkeypatch):
+    response = await auth_async_client.get('/files/list')
+    assert response.status_code == HTTPStatus.OK
+
+    async def get_user(*args, **kwargs):
+        raise AssertionError('User must be served from the cache.')
+
+    monkeypatch.setattr(auth, 'get_user', get_user)
+    response_cached = await auth_async_client.get('/files/list')
+    assert response_cached.status_code == HTTPStatus.OK
+    assert response_cached.json()['account_id'] == response.json()['account_id']
+
+
+@pytest.mark.asyncio
+async def test_create_dirs_info(test_app, async_session):
+    paths = ['/test/dirs', '/test/dirs/a', '/test/dirs/a/b']
+    async with async_session() as db:
+        await directory_tools.create_dirs_info(db=db, paths=paths[:2])
+        assert not db.in_transaction()
+        await directory_tools.create_dirs_info(db=db, paths=paths)
+    async with async_session() as db:
+        results = await db.execute(select(Directory).where(Directory.path.in_(paths)))
+        dirs = {directory.path: directory for directory in results.scalars()}
+    assert sorted(dirs) == paths
+    assert dirs['/test/dirs/a/b'].parent_id == dirs['/test/dirs/a'].id
+    assert dirs['/test/dirs/a'].parent_id == dirs['/test/dirs'].id